@@ -0,0 +1,167 @@
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from organizations.models import Organization
+from users.models import User
+from properties.models import Property, Unit
+from tenants.models import Tenant
+from maintenance.models import Ticket
+from payments.models import RentPayment
+from sms.models import SMSMessage
+from analytics.summaries import dashboard_summary
+
+
+def legacy_dashboard_summary(org):
+    """The per-figure COUNT/SUM implementation summary_data used to run"""
+    property_count = Property.objects.filter(organization=org).count()
+    units = Unit.objects.filter(property__organization=org)
+    unit_count = units.count()
+    occupied_count = units.filter(is_occupied=True).count()
+    tenant_count = Tenant.objects.filter(unit__property__organization=org).count()
+    tickets = Ticket.objects.filter(property__organization=org)
+    open_tickets = tickets.exclude(status__in=['resolved', 'closed']).count()
+    today = timezone.now().date()
+    recent_payments = RentPayment.objects.filter(
+        unit__property__organization=org,
+        status='completed',
+        payment_date__gte=today - timezone.timedelta(days=30)
+    )
+    payment_sum = recent_payments.aggregate(total=Sum('amount'))['total'] or 0
+    recent_sms = SMSMessage.objects.filter(
+        tenant__unit__property__organization=org,
+        sent_at__gte=today - timezone.timedelta(days=30)
+    )
+    sms_count = recent_sms.count()
+    delivered_count = recent_sms.filter(delivery_status='delivered').count()
+    return {
+        'property_count': property_count,
+        'unit_count': unit_count,
+        'occupied_count': occupied_count,
+        'tenant_count': tenant_count,
+        'open_tickets': open_tickets,
+        'recent_payment_sum': payment_sum,
+        'recent_sms_count': sms_count,
+        'sms_delivered_count': delivered_count,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark DashboardViewSet.summary_data aggregation (p50/p95 latency before and after)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--organization',
+            type=int,
+            help='Benchmark an existing organization by id'
+        )
+        parser.add_argument(
+            '--units',
+            type=int,
+            default=50000,
+            help='Units to seed in a throwaway organization when --organization is not given (default: 50000)'
+        )
+        parser.add_argument(
+            '--properties',
+            type=int,
+            default=100,
+            help='Properties to spread the seeded units over (default: 100)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=30,
+            help='Timed runs per implementation (default: 30)'
+        )
+
+    def handle(self, *args, **options):
+        if options['organization']:
+            try:
+                organization = Organization.objects.get(pk=options['organization'])
+            except Organization.DoesNotExist:
+                raise CommandError(f"Organization {options['organization']} does not exist")
+            self.run_benchmark(organization, options['iterations'])
+            return
+
+        # Seed a throwaway dataset and roll it back afterwards
+        with transaction.atomic():
+            organization = self.seed(options['units'], options['properties'])
+            self.run_benchmark(organization, options['iterations'])
+            transaction.set_rollback(True)
+
+    def seed(self, unit_total, property_total):
+        """Create an organization with unit_total units, tenants, payments, SMS and tickets"""
+        self.stdout.write(f'Seeding {unit_total} units across {property_total} properties...')
+        organization = Organization.objects.create(name='Dashboard Benchmark Org')
+        owner = User.objects.create_user(
+            username=f'dashboard-benchmark-{organization.pk}',
+            password=None,
+            organization=organization
+        )
+        properties = Property.objects.bulk_create([
+            Property(owner=owner, organization=organization, name=f'Benchmark Property {i}',
+                     address='Benchmark', property_type='residential')
+            for i in range(property_total)
+        ])
+
+        units = Unit.objects.bulk_create([
+            Unit(property=properties[i % property_total], unit_number=f'B{i}',
+                 monthly_rent=Decimal('15000.00'), is_occupied=i % 5 != 0)
+            for i in range(unit_total)
+        ], batch_size=2000)
+        occupied = [unit for unit in units if unit.is_occupied]
+
+        today = timezone.now().date()
+        tenants = Tenant.objects.bulk_create([
+            Tenant(name=f'Benchmark Tenant {unit.pk}', phone_number='0700000000',
+                   unit=unit, organization=organization, move_in_date=today - timedelta(days=365))
+            for unit in occupied
+        ], batch_size=2000)
+
+        now = timezone.now()
+        RentPayment.objects.bulk_create([
+            RentPayment(unit=tenant.unit, tenant=tenant, organization=organization, amount=Decimal('15000.00'),
+                        due_date=today, payment_date=now - timedelta(days=i % 60),
+                        status='completed' if i % 4 else 'pending')
+            for i, tenant in enumerate(tenants)
+        ], batch_size=2000)
+        SMSMessage.objects.bulk_create([
+            SMSMessage(tenant=tenant, organization=organization, phone_number=tenant.phone_number, message_content='Rent reminder',
+                       sent_at=now - timedelta(days=i % 45),
+                       status='sent', delivery_status='delivered' if i % 3 else 'failed')
+            for i, tenant in enumerate(tenants)
+        ], batch_size=2000)
+        Ticket.objects.bulk_create([
+            Ticket(property=tenant.unit.property, unit=tenant.unit, tenant=tenant,
+                   title='Leak', description='Benchmark ticket',
+                   status=['new', 'in_progress', 'resolved', 'closed'][i % 4])
+            for i, tenant in enumerate(tenants[::10])
+        ], batch_size=2000)
+        return organization
+
+    def run_benchmark(self, organization, iterations):
+        """Time both implementations and print p50/p95 latency and query counts"""
+        for label, func in (('before', legacy_dashboard_summary), ('after', dashboard_summary)):
+            func(organization)  # warm up
+            with CaptureQueriesContext(connection) as queries:
+                func(organization)
+
+            timings = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                func(organization)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            timings.sort()
+            p50 = statistics.median(timings)
+            p95 = timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))]
+            self.stdout.write(
+                f'{label:>6}: {len(queries)} queries, p50 {p50:.1f} ms, p95 {p95:.1f} ms '
+                f'({iterations} runs, {connection.vendor})'
+            )
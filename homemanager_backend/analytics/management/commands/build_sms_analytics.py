@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.rollups import build_sms_analytics
+
+
+class Command(BaseCommand):
+    help = (
+        'Build monthly SMSAnalytics rows (message count, delivery rate, segment-based cost) for '
+        'every organization. Recomputes recent months by default; schedule it from cron (e.g. nightly).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=2,
+            help='Recent months to recompute, including the current one (default: 2)'
+        )
+        parser.add_argument(
+            '--start',
+            help='Backfill every month from YYYY-MM onwards instead'
+        )
+        parser.add_argument(
+            '--chunk-months',
+            type=int,
+            default=6,
+            help='Months computed per query batch (default: 6)'
+        )
+
+    def handle(self, *args, **options):
+        start_month = None
+        if options['start']:
+            try:
+                start_month = datetime.strptime(options['start'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--start must be in YYYY-MM format')
+        if options['months'] < 1 or options['chunk_months'] < 1:
+            raise CommandError('--months and --chunk-months must be at least 1')
+
+        written = build_sms_analytics(
+            months=options['months'],
+            start_month=start_month,
+            chunk_months=options['chunk_months'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} SMS analytics rows'))
@@ -80,6 +80,14 @@ class PropertyMetric(models.Model):
     def __str__(self):
         return f"{self.property.name} metrics ({self.period_start} to {self.period_end})"
 
+class RollupCheckpoint(models.Model):
+    """Records when an analytics rollup job last ran, for incremental rebuilds"""
+    name = models.CharField(max_length=50, unique=True)
+    last_run_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.name} (last run {self.last_run_at})"
+
 class PaymentAnalytics(OrganizationModel):
     """Aggregates payment data for trend analysis"""
     period = models.CharField(max_length=20)  # e.g., '2023-06' for June 2023
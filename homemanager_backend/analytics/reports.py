@@ -0,0 +1,311 @@
+"""
+Report engine behind ReportViewSet.generate.
+
+Every report type is a single grouped query that returns a ReportTable:
+an ordered list of columns plus the rows, so JSON, CSV and Excel output
+can share one representation. Reports honor Report.parameters:
+
+    start_date, end_date: YYYY-MM-DD, inclusive (default: the current month)
+    property_ids: list of property ids to restrict to (default: all)
+    source: for 'custom' reports, the report type or dataset to build on
+    columns: for 'custom' reports, the subset of column keys to keep
+"""
+from django.db.models import Count, Sum, Avg, Q, F, Value, Case, When, FloatField, DecimalField
+from django.db.models.functions import Cast, Coalesce, Round
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from dateutil.relativedelta import relativedelta
+
+from properties.models import Property
+from tenants.models import Tenant
+from payments.models import RentPayment
+from .summaries import OUTSTANDING_PAYMENT_STATUSES
+
+ZERO = Value(0, output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+class ReportParameterError(ValueError):
+    """Raised when Report.parameters cannot be applied"""
+
+
+class ReportTable:
+    """Columns and rows of a generated report"""
+
+    def __init__(self, columns, queryset, transform=None):
+        self.columns = columns
+        self.queryset = queryset
+        self.transform = transform
+
+    @property
+    def keys(self):
+        return [key for key, _ in self.columns]
+
+    def select(self, keys):
+        """Keep only the given column keys, in the given order"""
+        labels = dict(self.columns)
+        unknown = [key for key in keys if key not in labels]
+        if unknown:
+            raise ReportParameterError(f"Unknown columns: {', '.join(unknown)}")
+        return ReportTable([(key, labels[key]) for key in keys], self.queryset, self.transform)
+
+    def rows(self, chunk_size=None):
+        """
+        Yield each row as a dict of column key to value.
+
+        With chunk_size the rows are streamed from the database cursor
+        instead of being loaded all at once.
+        """
+        rows = self.queryset.iterator(chunk_size=chunk_size) if chunk_size else self.queryset
+        keys = self.keys
+        for row in rows:
+            if self.transform:
+                row = self.transform(row)
+            yield {key: row[key] for key in keys}
+
+
+def report_period(parameters):
+    """Return the (start_date, end_date) a report covers"""
+    today = timezone.now().date()
+    try:
+        start_date = parse_date(parameters.get('start_date') or '') or today.replace(day=1)
+        end_date = (
+            parse_date(parameters.get('end_date') or '')
+            or start_date.replace(day=1) + relativedelta(months=1, days=-1)
+        )
+    except (TypeError, ValueError):
+        raise ReportParameterError('start_date and end_date must be valid YYYY-MM-DD dates')
+    if start_date > end_date:
+        raise ReportParameterError('start_date must be before end_date')
+    return start_date, end_date
+
+
+def report_property_ids(parameters):
+    """Return the property ids a report is restricted to, or None for all"""
+    property_ids = parameters.get('property_ids')
+    if property_ids in (None, []):
+        return None
+    try:
+        return [int(pk) for pk in property_ids]
+    except (TypeError, ValueError):
+        raise ReportParameterError('property_ids must be a list of property ids')
+
+
+def rate(numerator, denominator):
+    """Percentage of two aggregates, rounded to 2 places and 0 when empty"""
+    return Case(
+        When(**{denominator: 0}, then=Value(0.0)),
+        default=Round(Cast(F(numerator), FloatField()) * 100.0 / Cast(F(denominator), FloatField()), 2),
+        output_field=FloatField(),
+    )
+
+
+def properties_for(organization, property_ids):
+    properties = Property.objects.filter(organization=organization)
+    if property_ids is not None:
+        properties = properties.filter(id__in=property_ids)
+    return properties.order_by('name', 'id')
+
+
+def occupancy_report(organization, start_date, end_date, property_ids):
+    """Current unit occupancy per property"""
+    queryset = properties_for(organization, property_ids).annotate(
+        total_units=Count('units'),
+        occupied_units=Count('units', filter=Q(units__is_occupied=True)),
+    ).annotate(
+        vacant_units=F('total_units') - F('occupied_units'),
+        occupancy_rate=rate('occupied_units', 'total_units'),
+    ).values('name', 'total_units', 'occupied_units', 'vacant_units', 'occupancy_rate')
+    return ReportTable([
+        ('name', 'Property'),
+        ('total_units', 'Total Units'),
+        ('occupied_units', 'Occupied Units'),
+        ('vacant_units', 'Vacant Units'),
+        ('occupancy_rate', 'Occupancy Rate (%)'),
+    ], queryset)
+
+
+def financials_report(organization, start_date, end_date, property_ids):
+    """Rent collected per property in the period; expenses are not tracked yet"""
+    collected = Q(
+        units__rent_payments__status='completed',
+        units__rent_payments__payment_date__date__gte=start_date,
+        units__rent_payments__payment_date__date__lte=end_date,
+    )
+    queryset = properties_for(organization, property_ids).annotate(
+        revenue=Coalesce(Sum('units__rent_payments__amount', filter=collected), ZERO),
+        expenses=ZERO,
+    ).annotate(
+        profit=F('revenue') - F('expenses'),
+    ).values('name', 'revenue', 'expenses', 'profit')
+    return ReportTable([
+        ('name', 'Property'),
+        ('revenue', 'Revenue'),
+        ('expenses', 'Expenses'),
+        ('profit', 'Profit'),
+    ], queryset)
+
+
+def rent_collection_report(organization, start_date, end_date, property_ids):
+    """Rent due in the period per property, split by what has been collected"""
+    due = Q(
+        units__rent_payments__due_date__gte=start_date,
+        units__rent_payments__due_date__lte=end_date,
+    )
+    amount = 'units__rent_payments__amount'
+    outstanding = due & Q(units__rent_payments__status__in=OUTSTANDING_PAYMENT_STATUSES)
+    queryset = properties_for(organization, property_ids).annotate(
+        expected=Coalesce(Sum(amount, filter=due & ~Q(units__rent_payments__status='failed')), ZERO),
+        collected=Coalesce(Sum(amount, filter=due & Q(units__rent_payments__status='completed')), ZERO),
+        outstanding=Coalesce(Sum(amount, filter=outstanding), ZERO),
+        overdue=Coalesce(Sum(amount, filter=outstanding & Q(
+            units__rent_payments__due_date__lt=timezone.now().date()
+        )), ZERO),
+    ).annotate(
+        collection_rate=rate('collected', 'expected'),
+    ).values('name', 'expected', 'collected', 'outstanding', 'overdue', 'collection_rate')
+    return ReportTable([
+        ('name', 'Property'),
+        ('expected', 'Expected'),
+        ('collected', 'Collected'),
+        ('outstanding', 'Outstanding'),
+        ('overdue', 'Overdue'),
+        ('collection_rate', 'Collection Rate (%)'),
+    ], queryset)
+
+
+def maintenance_report(organization, start_date, end_date, property_ids):
+    """Tickets opened in the period per property"""
+    opened = Q(tickets__created_at__date__gte=start_date, tickets__created_at__date__lte=end_date)
+    queryset = properties_for(organization, property_ids).annotate(
+        total_tickets=Count('tickets', filter=opened),
+        open_tickets=Count('tickets', filter=opened & ~Q(tickets__status__in=['resolved', 'closed'])),
+        resolved_tickets=Count('tickets', filter=opened & Q(tickets__status__in=['resolved', 'closed'])),
+        urgent_tickets=Count('tickets', filter=opened & Q(tickets__priority__in=['high', 'urgent'])),
+        average_resolution=Avg(
+            F('tickets__resolved_at') - F('tickets__created_at'),
+            filter=opened & Q(tickets__resolved_at__isnull=False),
+        ),
+        average_rating=Round(Avg('tickets__satisfaction_rating', filter=opened), 2),
+    ).values('name', 'total_tickets', 'open_tickets', 'resolved_tickets', 'urgent_tickets',
+             'average_resolution', 'average_rating')
+
+    def transform(row):
+        duration = row.pop('average_resolution')
+        row['average_resolution_hours'] = round(duration.total_seconds() / 3600, 2) if duration else None
+        return row
+
+    return ReportTable([
+        ('name', 'Property'),
+        ('total_tickets', 'Tickets Opened'),
+        ('open_tickets', 'Open'),
+        ('resolved_tickets', 'Resolved'),
+        ('urgent_tickets', 'High/Urgent'),
+        ('average_resolution_hours', 'Avg Resolution (hours)'),
+        ('average_rating', 'Avg Satisfaction'),
+    ], queryset, transform)
+
+
+def tenant_report(organization, start_date, end_date, property_ids):
+    """One row per tenant with rent paid and owed for the period"""
+    tenants = Tenant.objects.for_organization(organization)
+    if property_ids is not None:
+        tenants = tenants.filter(unit__property_id__in=property_ids)
+    due = Q(rent_payments__due_date__gte=start_date, rent_payments__due_date__lte=end_date)
+    queryset = tenants.annotate(
+        paid=Coalesce(Sum('rent_payments__amount', filter=due & Q(rent_payments__status='completed')), ZERO),
+        outstanding=Coalesce(Sum(
+            'rent_payments__amount',
+            filter=due & Q(rent_payments__status__in=OUTSTANDING_PAYMENT_STATUSES)
+        ), ZERO),
+    ).order_by('unit__property__name', 'unit__unit_number', 'id').values(
+        'name', 'phone_number', 'email', 'unit__property__name', 'unit__unit_number',
+        'move_in_date', 'move_out_date', 'paid', 'outstanding',
+    )
+    return ReportTable([
+        ('name', 'Tenant'),
+        ('phone_number', 'Phone'),
+        ('email', 'Email'),
+        ('unit__property__name', 'Property'),
+        ('unit__unit_number', 'Unit'),
+        ('move_in_date', 'Move In'),
+        ('move_out_date', 'Move Out'),
+        ('paid', 'Paid'),
+        ('outstanding', 'Outstanding'),
+    ], queryset)
+
+
+def payments_dataset(organization, start_date, end_date, property_ids):
+    """Every rent payment due in the period, one row each"""
+    payments = RentPayment.objects.filter(
+        organization=organization,
+        due_date__gte=start_date,
+        due_date__lte=end_date,
+    )
+    if property_ids is not None:
+        payments = payments.filter(unit__property_id__in=property_ids)
+    queryset = payments.order_by('due_date', 'id').values(
+        'id', 'unit__property__name', 'unit__unit_number', 'tenant__name', 'amount',
+        'due_date', 'payment_date', 'status', 'payment_method', 'transaction_id',
+    )
+    return ReportTable([
+        ('id', 'Payment ID'),
+        ('unit__property__name', 'Property'),
+        ('unit__unit_number', 'Unit'),
+        ('tenant__name', 'Tenant'),
+        ('amount', 'Amount'),
+        ('due_date', 'Due Date'),
+        ('payment_date', 'Payment Date'),
+        ('status', 'Status'),
+        ('payment_method', 'Method'),
+        ('transaction_id', 'Transaction ID'),
+    ], queryset)
+
+
+REPORT_BUILDERS = {
+    'occupancy': occupancy_report,
+    'financials': financials_report,
+    'rent_collection': rent_collection_report,
+    'maintenance': maintenance_report,
+    'tenant': tenant_report,
+}
+
+# Datasets available to custom reports in addition to the report types
+CUSTOM_SOURCES = dict(REPORT_BUILDERS, payments=payments_dataset)
+
+
+def build_report(report):
+    """
+    Build the ReportTable for a Report from its type and parameters.
+
+    Raises:
+        ReportParameterError: If the parameters are invalid
+    """
+    parameters = report.parameters or {}
+    if not isinstance(parameters, dict):
+        raise ReportParameterError('parameters must be an object')
+    start_date, end_date = report_period(parameters)
+    property_ids = report_property_ids(parameters)
+
+    if report.report_type == 'custom':
+        source = parameters.get('source')
+        if source not in CUSTOM_SOURCES:
+            raise ReportParameterError(f"Custom reports need a source: one of {', '.join(CUSTOM_SOURCES)}")
+        table = CUSTOM_SOURCES[source](report.organization_id, start_date, end_date, property_ids)
+        if parameters.get('columns'):
+            table = table.select(parameters['columns'])
+        return table
+
+    return REPORT_BUILDERS[report.report_type](report.organization_id, start_date, end_date, property_ids)
+
+
+def report_data(report):
+    """Build a report and return it in the common JSON tabular format"""
+    table = build_report(report)
+    start_date, end_date = report_period(report.parameters or {})
+    return {
+        'title': report.name,
+        'type': report.report_type,
+        'period': {'start_date': start_date, 'end_date': end_date},
+        'columns': [{'key': key, 'label': label} for key, label in table.columns],
+        'data': list(table.rows()),
+    }
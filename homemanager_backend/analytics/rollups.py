@@ -0,0 +1,454 @@
+"""
+Rollup builders that precompute analytics tables from the raw models.
+
+Each builder computes every (property or organization, period) row with a
+handful of grouped queries, then upserts the results with a single
+bulk_create(update_conflicts=True). PropertyMetric rows cover closed months
+only; PaymentAnalytics and SMSAnalytics also keep the current month's row
+up to date.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum, Avg, Q, F, Min, DateField, DurationField, ExpressionWrapper
+from django.db.models.functions import TruncMonth, TruncDate
+from django.utils import timezone
+
+from properties.models import Unit
+from tenants.models import Lease
+from maintenance.models import Ticket
+from payments.models import RentPayment
+from sms.models import SMSMessage
+from sms.utils import sms_segment_count
+from .models import PropertyMetric, PaymentAnalytics, SMSAnalytics, RollupCheckpoint
+
+PROPERTY_METRICS_CHECKPOINT = 'property_metrics'
+PROPERTY_METRICS_FULL_CHECKPOINT = 'property_metrics_full'
+PAYMENT_ANALYTICS_CHECKPOINT = 'payment_analytics'
+
+
+def month_bounds(month_start):
+    """Return (first day, last day) of the month starting at month_start"""
+    return month_start, month_start + relativedelta(months=1) - timedelta(days=1)
+
+
+def closed_months(start, end=None):
+    """
+    List the first day of every closed month from start's month onwards.
+
+    A month is closed once it has fully elapsed; the current month is never
+    included.
+    """
+    current_month = (end or timezone.now().date()).replace(day=1)
+    month = start.replace(day=1)
+    months = []
+    while month < current_month:
+        months.append(month)
+        month += relativedelta(months=1)
+    return months
+
+
+def changed_property_months(since):
+    """
+    Find the (property_id, month) pairs affected by changes since a checkpoint.
+
+    Payments touch the months of their payment and due dates, tickets the
+    month they were opened in. A changed unit affects occupancy in every
+    period, so its property is returned with month None.
+    """
+    month = lambda field: TruncMonth(field, output_field=DateField())
+    dirty = set()
+
+    payments = RentPayment.objects.filter(updated_at__gte=since)
+    for field in ('payment_date', 'due_date'):
+        dirty.update(
+            payments.exclude(**{f'{field}__isnull': True})
+            .annotate(month=month(field))
+            .values_list('unit__property_id', 'month')
+            .distinct()
+        )
+
+    dirty.update(
+        Ticket.objects.filter(updated_at__gte=since)
+        .annotate(month=month('created_at'))
+        .values_list('property_id', 'month')
+        .distinct()
+    )
+
+    dirty.update(
+        (property_id, None)
+        for property_id in Unit.objects.filter(updated_at__gte=since)
+        .values_list('property_id', flat=True).distinct()
+    )
+    return dirty
+
+
+def compute_property_metrics(months, property_ids=None):
+    """
+    Compute PropertyMetric values for the given months.
+
+    Revenue and maintenance counts come from one grouped query each;
+    occupancy is one grouped query per month over leases overlapping it.
+    Expenses are not tracked yet and are recorded as zero.
+
+    Returns:
+        dict: {(property_id, month_start): {field: value}}
+    """
+    if not months:
+        return {}
+    first_day = min(months)
+    last_day = month_bounds(max(months))[1]
+
+    units = Unit.objects.all()
+    if property_ids is not None:
+        units = units.filter(property_id__in=property_ids)
+    unit_totals = dict(
+        units.values('property_id').annotate(total=Count('id')).values_list('property_id', 'total')
+    )
+    scope = list(unit_totals) if property_ids is None else property_ids
+
+    revenue = {
+        (row['unit__property_id'], row['month']): row['total']
+        for row in RentPayment.objects.filter(
+            unit__property_id__in=scope,
+            status='completed',
+            payment_date__date__gte=first_day,
+            payment_date__date__lte=last_day,
+        ).annotate(month=TruncMonth('payment_date', output_field=DateField()))
+        .values('unit__property_id', 'month').annotate(total=Sum('amount')).order_by()
+    }
+
+    maintenance = {
+        (row['property_id'], row['month']): row['total']
+        for row in Ticket.objects.filter(
+            property_id__in=scope,
+            created_at__date__gte=first_day,
+            created_at__date__lte=last_day,
+        ).annotate(month=TruncMonth('created_at', output_field=DateField()))
+        .values('property_id', 'month').annotate(total=Count('id')).order_by()
+    }
+
+    metrics = {}
+    for month_start in months:
+        period_start, period_end = month_bounds(month_start)
+        occupied = dict(
+            Lease.objects.filter(
+                unit__property_id__in=scope,
+                start_date__lte=period_end,
+                end_date__gte=period_start,
+            ).values('unit__property_id').annotate(total=Count('unit', distinct=True))
+            .values_list('unit__property_id', 'total').order_by()
+        )
+        for property_id in scope:
+            total_units = unit_totals.get(property_id, 0)
+            occupancy_rate = Decimal('0')
+            if total_units:
+                occupancy_rate = round(Decimal(occupied.get(property_id, 0) * 100) / total_units, 2)
+            metrics[(property_id, month_start)] = {
+                'occupancy_rate': occupancy_rate,
+                'revenue': revenue.get((property_id, month_start)) or Decimal('0'),
+                'expenses': Decimal('0'),
+                'maintenance_count': maintenance.get((property_id, month_start), 0),
+            }
+    return metrics
+
+
+def upsert_property_metrics(metrics):
+    """Insert or update PropertyMetric rows in bulk; returns the row count"""
+    rows = []
+    for (property_id, month_start), values in metrics.items():
+        period_start, period_end = month_bounds(month_start)
+        rows.append(PropertyMetric(
+            property_id=property_id,
+            period_start=period_start,
+            period_end=period_end,
+            **values
+        ))
+    PropertyMetric.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['property', 'period_start', 'period_end'],
+        update_fields=['occupancy_rate', 'revenue', 'expenses', 'maintenance_count'],
+    )
+    return len(rows)
+
+
+def build_property_metrics(full=False, backfill_months=12, property_ids=None):
+    """
+    Rebuild monthly PropertyMetric rows for closed periods.
+
+    Incremental by default: only (property, month) pairs touched by payments,
+    tickets or units changed since the last run are recomputed. A full run,
+    or the first run, recomputes the last `backfill_months` closed months.
+
+    Deleted payments and tickets, and payments moved to another month, leave
+    no changed row behind to mark the month they left. So an unrestricted run
+    is made full once PROPERTY_METRICS_FULL_REBUILD_HOURS (default 24) have
+    passed since the last full run, which bounds how long such a month can
+    stay stale.
+
+    Returns:
+        int: Number of PropertyMetric rows written
+    """
+    started_at = timezone.now()
+    today = started_at.date()
+    window = closed_months(today.replace(day=1) - relativedelta(months=backfill_months), today)
+    checkpoints = dict(RollupCheckpoint.objects.filter(
+        name__in=[PROPERTY_METRICS_CHECKPOINT, PROPERTY_METRICS_FULL_CHECKPOINT]
+    ).values_list('name', 'last_run_at'))
+    last_run_at = checkpoints.get(PROPERTY_METRICS_CHECKPOINT)
+
+    if property_ids is None:
+        last_full_run_at = checkpoints.get(PROPERTY_METRICS_FULL_CHECKPOINT)
+        rebuild_after = timedelta(hours=getattr(settings, 'PROPERTY_METRICS_FULL_REBUILD_HOURS', 24))
+        full = full or last_full_run_at is None or last_full_run_at <= started_at - rebuild_after
+
+    if full or last_run_at is None:
+        metrics = compute_property_metrics(window, property_ids)
+    else:
+        dirty = changed_property_months(last_run_at)
+        if property_ids is not None:
+            dirty = {(pk, month) for pk, month in dirty if pk in set(property_ids)}
+
+        current_month = today.replace(day=1)
+        # Group dirty properties by month so each month is computed once
+        by_month = {}
+        for property_id, month in dirty:
+            targets = window if month is None else [month]
+            for target in targets:
+                if target < current_month:
+                    by_month.setdefault(target, set()).add(property_id)
+
+        # Months sharing the same property set are computed together
+        by_properties = {}
+        for month, pks in by_month.items():
+            by_properties.setdefault(frozenset(pks), []).append(month)
+
+        metrics = {}
+        for pks, months in by_properties.items():
+            metrics.update(compute_property_metrics(sorted(months), list(pks)))
+
+    with transaction.atomic():
+        written = upsert_property_metrics(metrics)
+        if property_ids is None:
+            RollupCheckpoint.objects.update_or_create(
+                name=PROPERTY_METRICS_CHECKPOINT,
+                defaults={'last_run_at': started_at}
+            )
+            if full:
+                RollupCheckpoint.objects.update_or_create(
+                    name=PROPERTY_METRICS_FULL_CHECKPOINT,
+                    defaults={'last_run_at': started_at}
+                )
+    return written
+
+
+def compute_payment_analytics(start_month, end_month, organization_ids=None):
+    """
+    Compute PaymentAnalytics values per organization for a range of months.
+
+    Completed payments are bucketed by the month of payment_date. Lateness is
+    payment_date's date minus due_date, evaluated in the database; on-time
+    means paid on or before the due date and average_days_late is averaged
+    over late payments only. The method breakdown is each method's share of
+    the amount collected, from a single GROUP BY.
+
+    Args:
+        start_month, end_month: First days of the first and last months (inclusive)
+        organization_ids: Optional iterable of organization ids to restrict to
+
+    Returns:
+        dict: {(organization_id, 'YYYY-MM'): {field: value}}
+    """
+    payments = RentPayment.objects.filter(
+        status='completed',
+        payment_date__date__gte=start_month,
+        payment_date__date__lte=month_bounds(end_month)[1],
+        organization__isnull=False,
+    )
+    if organization_ids is not None:
+        payments = payments.filter(organization_id__in=organization_ids)
+    payments = payments.annotate(month=TruncMonth('payment_date', output_field=DateField()))
+
+    late = Q(payment_date__date__gt=F('due_date'))
+    days_late = ExpressionWrapper(TruncDate('payment_date') - F('due_date'), output_field=DurationField())
+    totals = payments.values('organization_id', 'month').annotate(
+        total=Sum('amount'),
+        count=Count('id'),
+        late_count=Count('id', filter=late),
+        average_late=Avg(days_late, filter=late),
+    ).order_by()
+
+    metrics = {}
+    for row in totals:
+        average_late = row['average_late']
+        metrics[(row['organization_id'], row['month'].strftime('%Y-%m'))] = {
+            'total_collected': row['total'],
+            'on_time_percentage': round(Decimal((row['count'] - row['late_count']) * 100) / row['count'], 2),
+            'average_days_late': round(Decimal(average_late.total_seconds()) / 86400, 2) if average_late else Decimal('0'),
+            'payment_method_breakdown': {},
+        }
+
+    methods = payments.values('organization_id', 'month', 'payment_method').annotate(
+        total=Sum('amount')
+    ).order_by()
+    for row in methods:
+        entry = metrics[(row['organization_id'], row['month'].strftime('%Y-%m'))]
+        share = float(row['total'] * 100 / entry['total_collected']) if entry['total_collected'] else 0.0
+        entry['payment_method_breakdown'][row['payment_method'] or 'unknown'] = round(share, 2)
+    return metrics
+
+
+def upsert_payment_analytics(metrics):
+    """Insert or update PaymentAnalytics rows in bulk; returns the row count"""
+    rows = [
+        PaymentAnalytics(organization_id=organization_id, period=period, **values)
+        for (organization_id, period), values in metrics.items()
+    ]
+    PaymentAnalytics.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['organization', 'period'],
+        update_fields=['total_collected', 'on_time_percentage', 'payment_method_breakdown', 'average_days_late'],
+    )
+    return len(rows)
+
+
+def build_payment_analytics(backfill=False, start_month=None, chunk_months=6):
+    """
+    Rebuild monthly PaymentAnalytics rows for every organization.
+
+    Incremental by default: only the (organization, month) pairs of completed
+    payments changed since the last run are recomputed. The first run, or a
+    backfill, walks the history from start_month (default: the earliest
+    payment) to the current month in chunks of chunk_months, so each chunk is
+    two grouped queries and one bulk upsert.
+
+    Returns:
+        int: Number of PaymentAnalytics rows written
+    """
+    started_at = timezone.now()
+    current_month = started_at.date().replace(day=1)
+    checkpoint = RollupCheckpoint.objects.filter(name=PAYMENT_ANALYTICS_CHECKPOINT).first()
+    written = 0
+
+    if backfill or checkpoint is None:
+        if start_month is None:
+            earliest = RentPayment.objects.filter(status='completed').aggregate(
+                first=Min('payment_date')
+            )['first']
+            start_month = timezone.localtime(earliest).date() if earliest else current_month
+        month = start_month.replace(day=1)
+        while month <= current_month:
+            chunk_end = min(month + relativedelta(months=chunk_months - 1), current_month)
+            with transaction.atomic():
+                written += upsert_payment_analytics(compute_payment_analytics(month, chunk_end))
+            month = chunk_end + relativedelta(months=1)
+    else:
+        changed = RentPayment.objects.filter(
+            updated_at__gte=checkpoint.last_run_at,
+            payment_date__isnull=False,
+        ).annotate(
+            month=TruncMonth('payment_date', output_field=DateField())
+        ).values_list('organization_id', 'month').distinct().order_by()
+
+        by_month = {}
+        for organization_id, month in changed:
+            if organization_id is not None:
+                by_month.setdefault(month, set()).add(organization_id)
+        for month, organization_ids in by_month.items():
+            metrics = compute_payment_analytics(month, month, organization_ids)
+            # Months left without completed payments no longer have analytics
+            emptied = organization_ids - {organization_id for organization_id, _ in metrics}
+            with transaction.atomic():
+                PaymentAnalytics.objects.filter(
+                    organization_id__in=emptied, period=month.strftime('%Y-%m')
+                ).delete()
+                written += upsert_payment_analytics(metrics)
+
+    RollupCheckpoint.objects.update_or_create(
+        name=PAYMENT_ANALYTICS_CHECKPOINT,
+        defaults={'last_run_at': started_at}
+    )
+    return written
+
+
+def compute_sms_analytics(start_month, end_month):
+    """
+    Compute SMSAnalytics values per organization for a range of months.
+
+    Messages are bucketed by the month of sent_at. Cost is billed per segment:
+    messages are grouped by content in the database, so each distinct text is
+    measured once however many tenants it was sent to. Inbound replies are not
+    recorded anywhere, so tenant_response_rate is always zero.
+
+    Returns:
+        dict: {(organization_id, 'YYYY-MM'): {field: value}}
+    """
+    cost_per_segment = Decimal(str(getattr(settings, 'SMS_COST_PER_SEGMENT', 0)))
+    messages = SMSMessage.objects.filter(
+        sent_at__date__gte=start_month,
+        sent_at__date__lte=month_bounds(end_month)[1],
+        organization__isnull=False,
+    ).annotate(month=TruncMonth('sent_at', output_field=DateField()))
+
+    metrics = {}
+    for row in messages.values('organization_id', 'month').annotate(
+        total=Count('id'),
+        delivered=Count('id', filter=Q(delivery_status='delivered')),
+    ).order_by():
+        metrics[(row['organization_id'], row['month'].strftime('%Y-%m'))] = {
+            'sms_count': row['total'],
+            'delivery_rate': round(Decimal(row['delivered'] * 100) / row['total'], 2),
+            'tenant_response_rate': Decimal('0'),
+            'cost': Decimal('0'),
+        }
+
+    segments = {}
+    for row in messages.values('organization_id', 'month', 'message_content').annotate(
+        total=Count('id')
+    ).order_by():
+        content = row['message_content']
+        if content not in segments:
+            segments[content] = sms_segment_count(content)
+        entry = metrics[(row['organization_id'], row['month'].strftime('%Y-%m'))]
+        entry['cost'] += segments[content] * row['total'] * cost_per_segment
+    return metrics
+
+
+def build_sms_analytics(months=2, start_month=None, chunk_months=6):
+    """
+    Rebuild monthly SMSAnalytics rows for every organization.
+
+    SMS delivery reports keep arriving after a message is sent, so by default
+    the current and previous month are recomputed. Pass start_month to
+    backfill from that month onwards in chunks of chunk_months.
+
+    Returns:
+        int: Number of SMSAnalytics rows written
+    """
+    current_month = timezone.now().date().replace(day=1)
+    month = start_month.replace(day=1) if start_month else current_month - relativedelta(months=months - 1)
+    written = 0
+    while month <= current_month:
+        chunk_end = min(month + relativedelta(months=chunk_months - 1), current_month)
+        metrics = compute_sms_analytics(month, chunk_end)
+        rows = [
+            SMSAnalytics(organization_id=organization_id, period=period, **values)
+            for (organization_id, period), values in metrics.items()
+        ]
+        SMSAnalytics.objects.bulk_create(
+            rows,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['organization', 'period'],
+            update_fields=['sms_count', 'delivery_rate', 'tenant_response_rate', 'cost'],
+        )
+        written += len(rows)
+        month = chunk_end + relativedelta(months=1)
+    return written
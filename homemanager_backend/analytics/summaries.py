@@ -0,0 +1,207 @@
+"""
+Aggregation helpers for the analytics dashboard endpoints.
+
+Each helper issues one aggregate query per base table using conditional
+aggregation (``Count(..., filter=Q(...))``) instead of one COUNT/SUM query
+per figure.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum, Q, DateField
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+from django.utils import timezone
+
+from properties.models import Property
+from tenants.models import Tenant
+from maintenance.models import Ticket
+from payments.models import RentPayment
+from sms.models import SMSMessage
+
+DASHBOARD_SUMMARY_CACHE_KEY = 'analytics:dashboard_summary:{organization_id}'
+
+# Rent payments that are still owed
+OUTSTANDING_PAYMENT_STATUSES = ['pending', 'initiated', 'processing', 'overdue']
+
+TIME_SERIES_GRANULARITIES = {
+    'day': (TruncDay, relativedelta(days=1)),
+    'week': (TruncWeek, relativedelta(weeks=1)),
+    'month': (TruncMonth, relativedelta(months=1)),
+}
+
+
+def dashboard_summary(organization):
+    """
+    Compute the dashboard summary for an organization.
+
+    Returns the same figures as DashboardViewSet.summary_data in five
+    queries: properties/units, tenants, tickets, payments and SMS.
+
+    Like the payment sum, SMS figures cover the last 30 days and are counted
+    live from the organization's messages (indexed on organization and
+    sent_at), so they don't wait for build_sms_analytics to run. The monthly
+    SMSAnalytics rows serve the SMS analytics endpoints.
+    """
+    today = timezone.now().date()
+    since = today - timezone.timedelta(days=30)
+
+    # Properties and units in one pass over the property -> unit join
+    unit_stats = Property.objects.filter(organization=organization).aggregate(
+        property_count=Count('id', distinct=True),
+        unit_count=Count('units'),
+        occupied_count=Count('units', filter=Q(units__is_occupied=True)),
+    )
+
+    tenant_count = Tenant.objects.for_organization(organization).count()
+
+    ticket_stats = Ticket.objects.filter(property__organization=organization).aggregate(
+        open_tickets=Count('id', filter=~Q(status__in=['resolved', 'closed'])),
+    )
+
+    payment_stats = RentPayment.objects.filter(
+        organization=organization,
+        status='completed',
+        payment_date__gte=since
+    ).aggregate(total=Sum('amount'))
+
+    sms_stats = SMSMessage.objects.filter(
+        organization=organization,
+        sent_at__gte=since
+    ).aggregate(
+        total_sms=Count('id'),
+        delivered=Count('id', filter=Q(delivery_status='delivered')),
+    )
+
+    unit_count = unit_stats['unit_count']
+    occupied_count = unit_stats['occupied_count']
+    vacancy_rate = 0
+    if unit_count > 0:
+        vacancy_rate = round(((unit_count - occupied_count) / unit_count) * 100, 2)
+
+    sms_count = sms_stats['total_sms']
+    delivery_rate = 0
+    if sms_count > 0:
+        delivery_rate = round((sms_stats['delivered'] / sms_count) * 100, 2)
+
+    return {
+        'property_count': unit_stats['property_count'],
+        'unit_count': unit_count,
+        'occupied_count': occupied_count,
+        'vacancy_rate': vacancy_rate,
+        'tenant_count': tenant_count,
+        'open_tickets': ticket_stats['open_tickets'],
+        'recent_payment_sum': payment_stats['total'] or 0,
+        'recent_sms_count': sms_count,
+        'sms_delivery_rate': delivery_rate
+    }
+
+
+def cached_dashboard_summary(organization, refresh=False):
+    """
+    Return the dashboard summary from the per-organization cache.
+
+    The cache lifetime is DASHBOARD_SUMMARY_CACHE_TIMEOUT seconds; a timeout
+    of 0 disables caching. Pass refresh=True to recompute and re-cache.
+    """
+    timeout = getattr(settings, 'DASHBOARD_SUMMARY_CACHE_TIMEOUT', 0)
+    if not timeout:
+        return dashboard_summary(organization)
+
+    key = DASHBOARD_SUMMARY_CACHE_KEY.format(organization_id=organization.pk)
+    data = None if refresh else cache.get(key)
+    if data is None:
+        data = dashboard_summary(organization)
+        cache.set(key, data, timeout)
+    return data
+
+
+def payment_totals(organization):
+    """
+    Compute expected, collected, pending and overdue rent for an organization
+    in a single conditional aggregate.
+    """
+    today = timezone.now().date()
+    outstanding = Q(status__in=OUTSTANDING_PAYMENT_STATUSES)
+    totals = RentPayment.objects.for_organization(organization).aggregate(
+        total_expected=Sum('amount', filter=~Q(status='failed')),
+        total_collected=Sum('amount', filter=Q(status='completed')),
+        total_pending=Sum('amount', filter=outstanding),
+        total_overdue=Sum('amount', filter=outstanding & Q(due_date__lt=today)),
+    )
+    return {key: value or Decimal('0') for key, value in totals.items()}
+
+
+def period_start(value, granularity):
+    """Truncate a date to the start of its day, week (Monday) or month"""
+    if granularity == 'month':
+        return value.replace(day=1)
+    if granularity == 'week':
+        return value - timedelta(days=value.weekday())
+    return value
+
+
+def revenue_time_series(organization, start_date, end_date, granularity='month', property_ids=None):
+    """
+    Compute collected, expected, pending and overdue rent per period.
+
+    Expected, pending and overdue amounts are bucketed by due_date; collected
+    amounts are bucketed by payment_date. Both buckets come from a single
+    grouped query over RentPayment, so the cost does not depend on how many
+    periods are requested.
+
+    Args:
+        organization: Organization whose payments are summarised
+        start_date, end_date: Inclusive date range
+        granularity: 'day', 'week' or 'month'
+        property_ids: Optional iterable of property ids to restrict to
+
+    Returns:
+        list: One dict per period in chronological order, including empty periods
+    """
+    trunc, step = TIME_SERIES_GRANULARITIES[granularity]
+    today = timezone.now().date()
+
+    payments = RentPayment.objects.for_organization(organization)
+    if property_ids:
+        payments = payments.filter(unit__property_id__in=property_ids)
+    due_in_range = Q(due_date__gte=start_date, due_date__lte=end_date)
+    paid_in_range = Q(status='completed', payment_date__date__gte=start_date,
+                      payment_date__date__lte=end_date)
+    outstanding = Q(status__in=OUTSTANDING_PAYMENT_STATUSES)
+
+    rows = payments.filter(due_in_range | paid_in_range).annotate(
+        due_period=trunc('due_date'),
+        paid_period=trunc('payment_date', output_field=DateField()),
+    ).values('due_period', 'paid_period').annotate(
+        collected=Sum('amount', filter=paid_in_range),
+        expected=Sum('amount', filter=due_in_range & ~Q(status='failed')),
+        pending=Sum('amount', filter=due_in_range & outstanding),
+        overdue=Sum('amount', filter=due_in_range & outstanding & Q(due_date__lt=today)),
+    ).order_by()
+
+    series = {}
+    period = period_start(start_date, granularity)
+    while period <= end_date:
+        series[period] = {
+            'period': period,
+            'collected': Decimal('0'),
+            'expected': Decimal('0'),
+            'pending': Decimal('0'),
+            'overdue': Decimal('0'),
+        }
+        period += step
+
+    for row in rows:
+        # Fold the (due period, paid period) groups into their buckets
+        due_bucket = series.get(row['due_period'])
+        if due_bucket is not None:
+            for field in ('expected', 'pending', 'overdue'):
+                due_bucket[field] += row[field] or 0
+        paid_bucket = series.get(row['paid_period'])
+        if paid_bucket is not None:
+            paid_bucket['collected'] += row['collected'] or 0
+
+    return list(series.values())
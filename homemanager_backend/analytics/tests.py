@@ -1,3 +1,551 @@
-from django.test import TestCase
+from datetime import date, datetime
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from decimal import Decimal
+from dateutil.relativedelta import relativedelta
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from users.models import User
+from organizations.models import Organization
+from organizations.quotas import get_throttle_rates
+from properties.models import Property, Unit
+from tenants.models import Tenant, Lease
+from maintenance.models import Ticket
+from payments.models import RentPayment
+from sms.models import SMSMessage
+from .models import Report, PropertyMetric, PaymentAnalytics, SMSAnalytics, RollupCheckpoint
+from .rollups import (
+    build_property_metrics, build_payment_analytics, build_sms_analytics, PROPERTY_METRICS_FULL_CHECKPOINT
+)
+from .exports import sheet_title
 
-# Create your tests here.
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+class AnalyticsTestMixin:
+    """Seed an organization with a property, four units and three tenants"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.organization = Organization.objects.create(
+            name='Test Organization',
+            email='test@example.com'
+        )
+        self.user = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='securepassword',
+            organization=self.organization
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.property = Property.objects.create(
+            owner=self.user,
+            organization=self.organization,
+            name='Tower',
+            address='Nairobi',
+            property_type='residential'
+        )
+        self.units = [
+            Unit.objects.create(
+                property=self.property,
+                unit_number=str(n),
+                monthly_rent=Decimal('10000.00'),
+                is_occupied=n < 3
+            )
+            for n in range(4)
+        ]
+        self.tenants = [
+            Tenant.objects.create(
+                name=f'Tenant {unit.unit_number}',
+                phone_number='0700000000',
+                unit=unit,
+                move_in_date=date(2024, 1, 1)
+            )
+            for unit in self.units[:3]
+        ]
+        # Resolve the plan's API rate limits up front so query counts cover the view only
+        get_throttle_rates(self.organization.pk)
+
+
+class DashboardSummaryTests(AnalyticsTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        get_throttle_rates(self.organization.pk)
+        now = timezone.now()
+        for tenant, status_value in zip(self.tenants, ['completed', 'completed', 'pending']):
+            RentPayment.objects.create(
+                unit=tenant.unit,
+                tenant=tenant,
+                amount=Decimal('10000.00'),
+                due_date=now.date(),
+                payment_date=now,
+                status=status_value
+            )
+        Ticket.objects.create(property=self.property, unit=self.units[0], tenant=self.tenants[0],
+                              title='Leak', description='Leak', status='new')
+        Ticket.objects.create(property=self.property, unit=self.units[1], tenant=self.tenants[1],
+                              title='Door', description='Door', status='closed')
+        for delivery_status in ['delivered', 'delivered', 'failed', None]:
+            SMSMessage.objects.create(tenant=self.tenants[0], phone_number='0700000000',
+                                      message_content='Hello', delivery_status=delivery_status)
+        # Outside the 30-day window
+        SMSMessage.objects.create(tenant=self.tenants[0], phone_number='0700000000', message_content='Old',
+                                  delivery_status='failed', sent_at=now - timezone.timedelta(days=31))
+
+    def test_summary_data(self):
+        """Summary figures come from conditional aggregates, without waiting for rollups"""
+        url = reverse('dashboard-summary-data')
+
+        # Context (membership + organization), then one aggregate per base table
+        with self.assertNumQueries(7):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['property_count'], 1)
+        self.assertEqual(response.data['unit_count'], 4)
+        self.assertEqual(response.data['occupied_count'], 3)
+        self.assertEqual(response.data['vacancy_rate'], 25.0)
+        self.assertEqual(response.data['tenant_count'], 3)
+        self.assertEqual(response.data['open_tickets'], 1)
+        self.assertEqual(response.data['recent_payment_sum'], Decimal('20000.00'))
+        self.assertEqual(response.data['recent_sms_count'], 4)
+        self.assertEqual(response.data['sms_delivery_rate'], 50.0)
+
+    @override_settings(DASHBOARD_SUMMARY_CACHE_TIMEOUT=60)
+    def test_summary_data_cache(self):
+        """The cached summary is reused until refreshed"""
+        url = reverse('dashboard-summary-data')
+        self.client.get(url)
+
+        Unit.objects.create(property=self.property, unit_number='new', monthly_rent=Decimal('5000.00'))
+
+        # Only the organization context is resolved
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.data['unit_count'], 4)
+
+        response = self.client.get(url, {'refresh': 'true'})
+        self.assertEqual(response.data['unit_count'], 5)
+
+
+class PaymentTimeSeriesTests(AnalyticsTestMixin, TestCase):
+    def add_payment(self, tenant, due_date, status_value, payment_date=None, amount='10000.00'):
+        return RentPayment.objects.create(
+            unit=tenant.unit,
+            tenant=tenant,
+            amount=Decimal(amount),
+            due_date=due_date,
+            payment_date=payment_date,
+            status=status_value
+        )
+
+    def paid_at(self, day):
+        return timezone.make_aware(datetime(day.year, day.month, day.day, 12))
+
+    def test_monthly_buckets(self):
+        """Expected amounts follow due_date, collected amounts follow payment_date"""
+        tenant = self.tenants[0]
+        # Due in January, paid in early February
+        self.add_payment(tenant, date(2024, 1, 1), 'completed', self.paid_at(date(2024, 2, 3)))
+        self.add_payment(tenant, date(2024, 2, 1), 'completed', self.paid_at(date(2024, 2, 1)))
+        self.add_payment(tenant, date(2024, 3, 1), 'pending')
+        self.add_payment(tenant, date(2024, 3, 1), 'failed')
+
+        response = self.client.get(reverse('paymentanalytics-time-series'), {
+            'start_date': '2024-01-01',
+            'end_date': '2024-04-30',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([row['period'] for row in results],
+                         [date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1), date(2024, 4, 1)])
+        self.assertEqual([row['expected'] for row in results], [10000.0, 10000.0, 10000.0, 0.0])
+        self.assertEqual([row['collected'] for row in results], [0.0, 20000.0, 0.0, 0.0])
+        self.assertEqual([row['pending'] for row in results], [0.0, 0.0, 10000.0, 0.0])
+        self.assertEqual([row['overdue'] for row in results], [0.0, 0.0, 10000.0, 0.0])
+
+    def test_property_filter_and_granularity(self):
+        """Series can be restricted to properties and bucketed by week"""
+        other = Property.objects.create(owner=self.user, organization=self.organization,
+                                        name='Annex', address='Nairobi', property_type='residential')
+        other_unit = Unit.objects.create(property=other, unit_number='A1', monthly_rent=Decimal('5000.00'))
+        other_tenant = Tenant.objects.create(name='Annex Tenant', phone_number='0700000000',
+                                             unit=other_unit, move_in_date=date(2024, 1, 1))
+        self.add_payment(self.tenants[0], date(2024, 1, 3), 'pending')
+        self.add_payment(other_tenant, date(2024, 1, 10), 'pending', amount='5000.00')
+
+        response = self.client.get(reverse('paymentanalytics-time-series'), {
+            'granularity': 'week',
+            'start_date': '2024-01-01',
+            'end_date': '2024-01-14',
+            'property': other.pk,
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([row['period'] for row in results], [date(2024, 1, 1), date(2024, 1, 8)])
+        self.assertEqual([row['expected'] for row in results], [0.0, 5000.0])
+
+    def test_query_count_independent_of_range(self):
+        """A 36-month series costs the same as a 6-month one"""
+        for month in range(1, 13):
+            self.add_payment(self.tenants[0], date(2023, month, 1), 'completed',
+                             self.paid_at(date(2023, month, 2)))
+        url = reverse('paymentanalytics-time-series')
+
+        # Context (membership + organization) plus the series query
+        with self.assertNumQueries(3):
+            self.client.get(url, {'start_date': '2023-07-01', 'end_date': '2023-12-31'})
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'start_date': '2021-01-01', 'end_date': '2023-12-31'})
+        self.assertEqual(len(response.data['results']), 36)
+        self.assertEqual(sum(row['collected'] for row in response.data['results']), 120000.0)
+
+    def test_invalid_parameters(self):
+        """Unknown granularities and malformed dates are rejected"""
+        url = reverse('paymentanalytics-time-series')
+        self.assertEqual(self.client.get(url, {'granularity': 'year'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'start_date': '2024-13-01'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_summary_data(self):
+        """summary_data totals and the six-month series come from grouped queries"""
+        today = timezone.now().date()
+        self.add_payment(self.tenants[0], today.replace(day=1), 'completed', timezone.now())
+        self.add_payment(self.tenants[1], today - timezone.timedelta(days=40), 'pending')
+
+        # Context (membership + organization) plus totals and series
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('paymentanalytics-summary-data'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_expected'], 20000.0)
+        self.assertEqual(response.data['total_collected'], 10000.0)
+        self.assertEqual(response.data['total_pending'], 10000.0)
+        self.assertEqual(response.data['total_overdue'], 10000.0)
+        self.assertEqual(response.data['collection_rate'], 50.0)
+        self.assertEqual(len(response.data['monthly_revenue']), 6)
+        self.assertEqual(response.data['monthly_revenue'][-1],
+                         {'month': today.strftime('%b'), 'amount': 10000.0})
+
+
+class PropertyMetricRollupTests(AnalyticsTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.current_month = timezone.now().date().replace(day=1)
+        self.last_month = self.current_month - relativedelta(months=1)
+        for tenant in self.tenants[:2]:
+            Lease.objects.create(unit=tenant.unit, tenant=tenant, start_date=date(2020, 1, 1),
+                                 end_date=self.current_month + relativedelta(years=1))
+        self.payment = self.add_payment(self.tenants[0], self.last_month)
+        self.add_payment(self.tenants[1], self.current_month)
+        ticket = Ticket.objects.create(property=self.property, unit=self.units[0], tenant=self.tenants[0],
+                                       title='Leak', description='Leak', status='new')
+        Ticket.objects.filter(pk=ticket.pk).update(
+            created_at=timezone.make_aware(datetime.combine(self.last_month, datetime.min.time()))
+        )
+
+    def add_payment(self, tenant, day, amount='10000.00'):
+        return RentPayment.objects.create(
+            unit=tenant.unit,
+            tenant=tenant,
+            amount=Decimal(amount),
+            due_date=day,
+            payment_date=timezone.make_aware(datetime(day.year, day.month, day.day, 12)),
+            status='completed'
+        )
+
+    def test_full_build(self):
+        """The first run backfills closed months only"""
+        written = build_property_metrics(backfill_months=3)
+        self.assertEqual(written, 3)
+        self.assertFalse(PropertyMetric.objects.filter(period_start=self.current_month).exists())
+
+        metric = PropertyMetric.objects.get(property=self.property, period_start=self.last_month)
+        self.assertEqual(metric.period_end, self.current_month - relativedelta(days=1))
+        self.assertEqual(metric.revenue, Decimal('10000.00'))
+        self.assertEqual(metric.maintenance_count, 1)
+        self.assertEqual(metric.occupancy_rate, Decimal('50.00'))
+        self.assertEqual(metric.expenses, Decimal('0'))
+
+    def test_incremental_build(self):
+        """Later runs only recompute periods touched by changed rows"""
+        build_property_metrics(backfill_months=3)
+        self.assertEqual(build_property_metrics(backfill_months=3), 0)
+
+        self.payment.amount = Decimal('12000.00')
+        self.payment.save()
+        self.assertEqual(build_property_metrics(backfill_months=3), 1)
+        metric = PropertyMetric.objects.get(property=self.property, period_start=self.last_month)
+        self.assertEqual(metric.revenue, Decimal('12000.00'))
+
+        # A changed unit affects occupancy in every period of the window
+        self.units[3].save()
+        self.assertEqual(build_property_metrics(backfill_months=3), 3)
+
+    def test_periodic_full_rebuild(self):
+        """Deleted and moved payments are caught by the next full rebuild"""
+        build_property_metrics(backfill_months=3)
+        moved = self.add_payment(self.tenants[1], self.last_month, amount='5000.00')
+        build_property_metrics(backfill_months=3)
+        self.payment.delete()
+        moved.due_date = self.current_month
+        moved.payment_date = timezone.make_aware(datetime.combine(self.current_month, datetime.min.time()))
+        moved.save()
+
+        # Nothing changed is left in last month, so an incremental run misses it
+        build_property_metrics(backfill_months=3)
+        metric = PropertyMetric.objects.get(property=self.property, period_start=self.last_month)
+        self.assertEqual(metric.revenue, Decimal('15000.00'))
+
+        RollupCheckpoint.objects.filter(name=PROPERTY_METRICS_FULL_CHECKPOINT).update(
+            last_run_at=timezone.now() - relativedelta(hours=25)
+        )
+        self.assertEqual(build_property_metrics(backfill_months=3), 3)
+        metric.refresh_from_db()
+        self.assertEqual(metric.revenue, Decimal('0'))
+
+    def test_management_command(self):
+        """The command wraps the builder for scheduled runs"""
+        call_command('build_property_metrics', '--months', '2', stdout=StringIO())
+        self.assertEqual(PropertyMetric.objects.filter(property=self.property).count(), 2)
+
+
+class PaymentAnalyticsBuilderTests(AnalyticsTestMixin, TestCase):
+    def add_payment(self, tenant, due_date, paid_on, method, amount='10000.00'):
+        return RentPayment.objects.create(
+            unit=tenant.unit,
+            tenant=tenant,
+            amount=Decimal(amount),
+            due_date=due_date,
+            payment_date=timezone.make_aware(datetime(paid_on.year, paid_on.month, paid_on.day, 12)),
+            payment_method=method,
+            status='completed'
+        )
+
+    def test_backfill(self):
+        """On-time share, days late and method breakdown are derived per month"""
+        self.add_payment(self.tenants[0], date(2023, 1, 5), date(2023, 1, 5), 'm_pesa')
+        self.add_payment(self.tenants[1], date(2023, 1, 5), date(2023, 1, 9), 'm_pesa')
+        self.add_payment(self.tenants[2], date(2023, 1, 5), date(2023, 1, 15), 'cash', amount='20000.00')
+        self.add_payment(self.tenants[0], date(2023, 8, 5), date(2023, 8, 1), 'bank')
+        RentPayment.objects.create(unit=self.units[0], tenant=self.tenants[0], amount=Decimal('10000.00'),
+                                   due_date=date(2023, 1, 5), status='pending')
+
+        written = build_payment_analytics(backfill=True, chunk_months=3)
+        self.assertEqual(written, 2)
+
+        january = PaymentAnalytics.objects.get(organization=self.organization, period='2023-01')
+        self.assertEqual(january.total_collected, Decimal('40000.00'))
+        self.assertEqual(january.on_time_percentage, Decimal('33.33'))
+        self.assertEqual(january.average_days_late, Decimal('7.00'))
+        self.assertEqual(january.payment_method_breakdown, {'m_pesa': 50.0, 'cash': 50.0})
+
+        august = PaymentAnalytics.objects.get(organization=self.organization, period='2023-08')
+        self.assertEqual(august.on_time_percentage, Decimal('100.00'))
+        self.assertEqual(august.average_days_late, Decimal('0'))
+
+    def test_incremental_build(self):
+        """Later runs recompute only months with changed payments"""
+        payment = self.add_payment(self.tenants[0], date(2023, 1, 5), date(2023, 1, 5), 'm_pesa')
+        self.add_payment(self.tenants[0], date(2023, 2, 5), date(2023, 2, 5), 'm_pesa')
+        build_payment_analytics()
+        self.assertEqual(build_payment_analytics(), 0)
+
+        payment.status = 'failed'
+        payment.save()
+        self.assertEqual(build_payment_analytics(), 0)
+        self.assertEqual(
+            list(PaymentAnalytics.objects.values_list('period', flat=True)), ['2023-02']
+        )
+
+    def test_list_without_period(self):
+        """The list endpoint returns the organization's rows when no period is given"""
+        self.add_payment(self.tenants[0], date(2023, 1, 5), date(2023, 1, 5), 'm_pesa')
+        call_command('build_payment_analytics', '--backfill', '--start', '2023-01', stdout=StringIO())
+
+        response = self.client.get(reverse('paymentanalytics-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['period'] for row in response.data['results']], ['2023-01'])
+
+
+@override_settings(SMS_COST_PER_SEGMENT=0.80)
+class SMSAnalyticsBuilderTests(AnalyticsTestMixin, TestCase):
+    def test_build(self):
+        """Counts, delivery rate and per-segment cost are rolled up per month"""
+        now = timezone.now()
+        for tenant in self.tenants:
+            SMSMessage.objects.create(tenant=tenant, phone_number='0700000000', sent_at=now,
+                                      message_content='Rent is due', delivery_status='delivered')
+        SMSMessage.objects.create(tenant=self.tenants[0], phone_number='0700000000', sent_at=now,
+                                  message_content='x' * 200, delivery_status='failed')
+        SMSMessage.objects.create(phone_number='0700000000', sent_at=now, message_content='No tenant')
+
+        self.assertEqual(build_sms_analytics(), 1)
+        analytics = SMSAnalytics.objects.get(organization=self.organization)
+        self.assertEqual(analytics.period, now.strftime('%Y-%m'))
+        self.assertEqual(analytics.sms_count, 4)
+        self.assertEqual(analytics.delivery_rate, Decimal('75.00'))
+        # Three single-segment messages and one two-segment message
+        self.assertEqual(analytics.cost, Decimal('4.00'))
+
+        SMSMessage.objects.create(tenant=self.tenants[0], phone_number='0700000000', sent_at=now,
+                                  message_content='Asante 🙏', delivery_status='delivered')
+        build_sms_analytics()
+        analytics.refresh_from_db()
+        self.assertEqual(analytics.sms_count, 5)
+        self.assertEqual(analytics.cost, Decimal('4.80'))
+
+
+class ReportGenerateTests(AnalyticsTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.annex = Property.objects.create(owner=self.user, organization=self.organization,
+                                             name='Annex', address='Nairobi', property_type='residential')
+        annex_unit = Unit.objects.create(property=self.annex, unit_number='A1',
+                                         monthly_rent=Decimal('5000.00'), is_occupied=True)
+        self.annex_tenant = Tenant.objects.create(name='Annex Tenant', phone_number='0700000000',
+                                                  unit=annex_unit, move_in_date=date(2024, 1, 1))
+        paid_at = timezone.make_aware(datetime(2024, 3, 5, 12))
+        for tenant, status_value in zip(self.tenants, ['completed', 'completed', 'pending']):
+            RentPayment.objects.create(unit=tenant.unit, tenant=tenant, amount=Decimal('10000.00'),
+                                       due_date=date(2024, 3, 1), status=status_value,
+                                       payment_date=paid_at if status_value == 'completed' else None)
+        RentPayment.objects.create(unit=annex_unit, tenant=self.annex_tenant, amount=Decimal('5000.00'),
+                                   due_date=date(2024, 3, 1), status='completed', payment_date=paid_at)
+        RentPayment.objects.create(unit=annex_unit, tenant=self.annex_tenant, amount=Decimal('5000.00'),
+                                   due_date=date(2024, 4, 1), status='completed',
+                                   payment_date=timezone.make_aware(datetime(2024, 4, 2, 12)))
+        self.march = {'start_date': '2024-03-01', 'end_date': '2024-03-31'}
+
+    def generate(self, report_type, parameters):
+        report = Report.objects.create(organization=self.organization, name=report_type,
+                                       report_type=report_type, parameters=parameters)
+        return self.client.get(reverse('report-generate', kwargs={'pk': report.pk}))
+
+    def test_occupancy(self):
+        """Occupancy rows share the tabular format"""
+        response = self.generate('occupancy', {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['columns'][0], {'key': 'name', 'label': 'Property'})
+        self.assertEqual(response.data['data'], [
+            {'name': 'Annex', 'total_units': 1, 'occupied_units': 1, 'vacant_units': 0, 'occupancy_rate': 100.0},
+            {'name': 'Tower', 'total_units': 4, 'occupied_units': 3, 'vacant_units': 1, 'occupancy_rate': 75.0},
+        ])
+
+    def test_financials_and_rent_collection(self):
+        """Money reports honor the date range and property subset"""
+        data = self.generate('financials', self.march).data['data']
+        self.assertEqual([(row['name'], row['revenue']) for row in data],
+                         [('Annex', Decimal('5000.00')), ('Tower', Decimal('20000.00'))])
+
+        response = self.generate('rent_collection', dict(self.march, property_ids=[self.property.pk]))
+        self.assertEqual(len(response.data['data']), 1)
+        row = response.data['data'][0]
+        self.assertEqual(row['expected'], Decimal('30000.00'))
+        self.assertEqual(row['collected'], Decimal('20000.00'))
+        self.assertEqual(row['outstanding'], Decimal('10000.00'))
+        self.assertEqual(row['collection_rate'], 66.67)
+
+    def test_maintenance_and_tenant(self):
+        """Maintenance counts tickets per property; the tenant report has a row per tenant"""
+        ticket = Ticket.objects.create(property=self.property, unit=self.units[0], tenant=self.tenants[0],
+                                       title='Leak', description='Leak', status='resolved', priority='urgent')
+        Ticket.objects.filter(pk=ticket.pk).update(resolved_at=ticket.created_at + timezone.timedelta(hours=6))
+        today = timezone.now().date().isoformat()
+
+        data = self.generate('maintenance', {'start_date': today, 'end_date': today}).data['data']
+        tower = data[1]
+        self.assertEqual((tower['total_tickets'], tower['resolved_tickets'], tower['urgent_tickets']), (1, 1, 1))
+        self.assertEqual(tower['average_resolution_hours'], 6.0)
+
+        data = self.generate('tenant', self.march).data['data']
+        self.assertEqual(len(data), 4)
+        self.assertEqual(data[0]['name'], 'Annex Tenant')
+        self.assertEqual(data[0]['paid'], Decimal('5000.00'))
+        self.assertEqual(data[-1]['outstanding'], Decimal('10000.00'))
+
+    def test_custom_report(self):
+        """Custom reports pick a source and a subset of its columns"""
+        data = self.generate('custom', dict(self.march, source='payments', columns=['tenant__name', 'status'])).data
+        self.assertEqual([column['key'] for column in data['columns']], ['tenant__name', 'status'])
+        self.assertEqual(len(data['data']), 4)
+
+    def test_invalid_parameters(self):
+        """Bad parameters are reported instead of failing the request"""
+        for report_type, parameters in [('occupancy', {'start_date': '2024-02-30'}),
+                                        ('tenant', {'property_ids': 'all'}),
+                                        ('custom', {'source': 'everything'})]:
+            response = self.generate(report_type, parameters)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_is_constant(self):
+        """Each report is one grouped query however many properties there are"""
+        for n in range(20):
+            Property.objects.create(owner=self.user, organization=self.organization,
+                                    name=f'Extra {n}', address='Nairobi', property_type='residential')
+        for report_type, _ in Report.REPORT_TYPES:
+            parameters = {'source': 'occupancy'} if report_type == 'custom' else {}
+            report = Report.objects.create(organization=self.organization, name=report_type,
+                                           report_type=report_type, parameters=parameters)
+            # Context (membership + organization), report lookup + report query
+            with self.assertNumQueries(4):
+                self.client.get(reverse('report-generate', kwargs={'pk': report.pk}))
+
+
+class ReportExportTests(AnalyticsTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for tenant in self.tenants:
+            RentPayment.objects.create(unit=tenant.unit, tenant=tenant, amount=Decimal('10000.00'),
+                                       due_date=date(2024, 3, 1), status='pending')
+        self.report = Report.objects.create(
+            organization=self.organization, name='March Payments', report_type='custom', format='csv',
+            parameters={'source': 'payments', 'start_date': '2024-03-01', 'end_date': '2024-03-31',
+                        'columns': ['tenant__name', 'amount', 'payment_date']}
+        )
+        self.url = reverse('report-export', kwargs={'pk': self.report.pk})
+
+    def test_csv_export_streams_rows(self):
+        """CSV exports are streamed line by line"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="march-payments-', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Tenant,Amount,Payment Date')
+        self.assertEqual(lines[1:], [f'Tenant {n},10000.00,' for n in range(3)])
+
+    def test_invalid_export_format(self):
+        """PDF and unknown formats are rejected"""
+        response = self.client.get(self.url, {'file_format': 'pdf'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(openpyxl, 'openpyxl is not installed')
+    def test_excel_export(self):
+        """Excel exports come from a write-only workbook"""
+        response = self.client.get(self.url, {'file_format': 'excel'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        workbook = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+        rows = list(workbook.active.values)
+        self.assertEqual(rows[0], ('Tenant', 'Amount', 'Payment Date'))
+        self.assertEqual(len(rows), 4)
+
+    def test_sheet_title(self):
+        """Characters Excel rejects in sheet titles are replaced"""
+        self.report.name = 'Rent 01/2025 [all]: what? *really* \\ long name'
+        self.report.save()
+        self.assertEqual(sheet_title(self.report), 'Rent 01-2025 -all-- what- -real')
+        if openpyxl:
+            response = self.client.get(self.url, {'file_format': 'excel'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            workbook = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+            self.assertEqual(workbook.active.title, sheet_title(self.report))
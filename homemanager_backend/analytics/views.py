@@ -2,17 +2,31 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
-from django.db.models import Sum, Avg, Count
+from django.utils.dateparse import parse_date
+from dateutil.relativedelta import relativedelta
 from .models import Dashboard, Report, PropertyMetric, PaymentAnalytics, SMSAnalytics
 from .serializers import (
     DashboardSerializer, ReportSerializer, PropertyMetricSerializer,
     PaymentAnalyticsSerializer, SMSAnalyticsSerializer
 )
 from properties.models import Property
-from payments.models import RentPayment
-from sms.models import SMSMessage
+from .summaries import (
+    cached_dashboard_summary, payment_totals, revenue_time_series, TIME_SERIES_GRANULARITIES
+)
+from .reports import build_report, report_data, ReportParameterError
+from organizations.context import OrganizationContextMixin
+from .exports import export_response, EXPORT_FORMATS
+
+def parse_date_param(value):
+    """Parse an optional YYYY-MM-DD query parameter, raising ValueError if malformed"""
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f"Invalid date: {value}")
+    return parsed
 
-class DashboardViewSet(viewsets.ModelViewSet):
+class DashboardViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing Dashboard instances"""
     queryset = Dashboard.objects.all()
     serializer_class = DashboardSerializer
@@ -30,8 +44,9 @@ class DashboardViewSet(viewsets.ModelViewSet):
         
         queryset = Dashboard.objects.all()
         
-        if user.organization:
-            queryset = queryset.filter(organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            queryset = queryset.filter(organization=organization)
         else:
             return Dashboard.objects.none()
         
@@ -48,78 +63,30 @@ class DashboardViewSet(viewsets.ModelViewSet):
         """Set owner and organization when creating a dashboard"""
         serializer.save(
             owner=self.request.user,
-            organization=self.request.user.organization
+            organization=self.organization_context.organization
         )
         
     @action(detail=False, methods=['get'])
     def summary_data(self, request):
-        """Get summary data for the dashboard"""
-        user = request.user
-        if not user.organization:
+        """
+        Get summary data for the dashboard.
+        
+        Served from the per-organization cache when
+        DASHBOARD_SUMMARY_CACHE_TIMEOUT is set; ?refresh=true recomputes it.
+        """
+        organization = self.organization_context.organization
+        if not organization:
             return Response({'error': 'No organization found'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get counts of properties, units, tenants, and maintenance tickets
-        org = user.organization
-        property_count = Property.objects.filter(organization=org).count()
-        
-        # Get units data - total and occupied
-        from properties.models import Unit
-        units = Unit.objects.filter(property__organization=org)
-        unit_count = units.count()
-        occupied_count = units.filter(is_occupied=True).count()
-        
-        # Vacancy rate
-        vacancy_rate = 0
-        if unit_count > 0:
-            vacancy_rate = round(((unit_count - occupied_count) / unit_count) * 100, 2)
-        
-        # Get tenant count
-        from tenants.models import Tenant
-        tenant_count = Tenant.objects.filter(unit__property__organization=org).count()
-        
-        # Get maintenance tickets
-        from maintenance.models import Ticket
-        tickets = Ticket.objects.filter(property__organization=org)
-        open_tickets = tickets.exclude(status__in=['resolved', 'closed']).count()
-        
-        # Get recent payment data
-        today = timezone.now().date()
-        recent_payments = RentPayment.objects.filter(
-            unit__property__organization=org,
-            status='completed',
-            payment_date__gte=today - timezone.timedelta(days=30)
-        )
-        payment_sum = recent_payments.aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Get SMS stats
-        recent_sms = SMSMessage.objects.filter(
-            tenant__unit__property__organization=org,
-            sent_at__gte=today - timezone.timedelta(days=30)
-        )
-        sms_count = recent_sms.count()
-        delivered_count = recent_sms.filter(delivery_status='delivered').count()
-        delivery_rate = 0
-        if sms_count > 0:
-            delivery_rate = round((delivered_count / sms_count) * 100, 2)
-            
-        # Return all stats
-        return Response({
-            'property_count': property_count,
-            'unit_count': unit_count,
-            'occupied_count': occupied_count,
-            'vacancy_rate': vacancy_rate,
-            'tenant_count': tenant_count,
-            'open_tickets': open_tickets,
-            'recent_payment_sum': payment_sum,
-            'recent_sms_count': sms_count,
-            'sms_delivery_rate': delivery_rate
-        })
+        refresh = request.query_params.get('refresh', '').lower() == 'true'
+        return Response(cached_dashboard_summary(organization, refresh=refresh))
 
-class ReportViewSet(viewsets.ModelViewSet):
+class ReportViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing Report instances"""
     queryset = Report.objects.all()
     serializer_class = ReportSerializer
     permission_classes = [permissions.IsAuthenticated]
+    organization_throttle_scopes = {'export': 'export'}
     
     def get_queryset(self):
         """Filter reports to only show those for the user's organization"""
@@ -133,8 +100,9 @@ class ReportViewSet(viewsets.ModelViewSet):
         
         queryset = Report.objects.all()
         
-        if user.organization:
-            queryset = queryset.filter(organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            queryset = queryset.filter(organization=organization)
         else:
             return Report.objects.none()
         
@@ -148,91 +116,47 @@ class ReportViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         """Set organization when creating a report"""
-        serializer.save(organization=self.request.user.organization)
+        serializer.save(organization=self.organization_context.organization)
     
     @action(detail=True, methods=['get'])
     def generate(self, request, pk=None):
-        """Generate the report data"""
+        """Generate the report data in the common tabular format"""
         report = self.get_object()
+        try:
+            data = report_data(report)
+        except ReportParameterError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+    
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """
+        Download the report as a streamed file.
         
-        # In a real implementation, we would generate the report here
-        # For now, just return some sample data based on the report type
-        
-        if report.report_type == 'occupancy':
-            # Get properties and calculate occupancy rate
-            properties = Property.objects.filter(organization=request.user.organization)
-            
-            from properties.models import Unit
-            data = []
-            for prop in properties:
-                units = Unit.objects.filter(property=prop)
-                total = units.count()
-                occupied = units.filter(is_occupied=True).count()
-                
-                if total > 0:
-                    occupancy_rate = round((occupied / total) * 100, 2)
-                else:
-                    occupancy_rate = 0
-                    
-                data.append({
-                    'property_name': prop.name,
-                    'total_units': total,
-                    'occupied_units': occupied,
-                    'occupancy_rate': occupancy_rate
-                })
-            
-            return Response({
-                'title': report.name,
-                'type': 'occupancy',
-                'data': data
-            })
-            
-        elif report.report_type == 'financials':
-            # Get financial data by property
-            properties = Property.objects.filter(organization=request.user.organization)
-            
-            today = timezone.now().date()
-            start_date = today.replace(day=1)  # First day of current month
-            end_date = (today.replace(day=1) + timezone.timedelta(days=32)).replace(day=1) - timezone.timedelta(days=1)  # Last day of current month
-            
-            data = []
-            for prop in properties:
-                payments = RentPayment.objects.filter(
-                    unit__property=prop,
-                    status='completed',
-                    payment_date__date__gte=start_date,
-                    payment_date__date__lte=end_date
-                )
-                
-                revenue = payments.aggregate(total=Sum('amount'))['total'] or 0
-                
-                # In a real implementation, we would get expenses from expense tracking
-                # For now, use a placeholder
-                expenses = 0
-                
-                data.append({
-                    'property_name': prop.name,
-                    'revenue': revenue,
-                    'expenses': expenses,
-                    'profit': revenue - expenses
-                })
-            
-            return Response({
-                'title': report.name,
-                'type': 'financials',
-                'period': f"{start_date.strftime('%b %d, %Y')} to {end_date.strftime('%b %d, %Y')}",
-                'data': data
-            })
-            
-        else:
-            # For other report types, return a placeholder
-            return Response({
-                'title': report.name,
-                'type': report.report_type,
-                'message': f"{report.get_report_type_display()} report generation not implemented yet"
-            })
+        Query parameters:
+            file_format: 'csv' or 'excel' (default: the report's format, else csv)
+        """
+        report = self.get_object()
+        default_format = report.format if report.format in EXPORT_FORMATS else 'csv'
+        file_format = request.query_params.get('file_format', default_format)
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"file_format must be one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            table = build_report(report)
+            return export_response(report, table, file_format)
+        except ReportParameterError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ImportError:
+            return Response(
+                {'error': 'Excel export is not available on this server'},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
 
-class PropertyMetricViewSet(viewsets.ModelViewSet):
+class PropertyMetricViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing PropertyMetric instances"""
     queryset = PropertyMetric.objects.all()
     serializer_class = PropertyMetricSerializer
@@ -242,17 +166,18 @@ class PropertyMetricViewSet(viewsets.ModelViewSet):
         """Filter property metrics to only show those for the user's organization"""
         user = self.request.user
         if user.is_superuser:
-            return PropertyMetric.objects.all()
+            return PropertyMetric.objects.select_related('property')
         
         # Filter by property and date range if provided
         property_id = self.request.query_params.get('property', None)
         start_date = self.request.query_params.get('start_date', None)
         end_date = self.request.query_params.get('end_date', None)
         
-        queryset = PropertyMetric.objects.all()
+        queryset = PropertyMetric.objects.select_related('property')
         
-        if user.organization:
-            queryset = queryset.filter(property__organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            queryset = queryset.filter(property__organization=organization)
         else:
             return PropertyMetric.objects.none()
         if property_id:
@@ -269,15 +194,14 @@ class PropertyMetricViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def summary_data(self, request):
         """Get aggregated property metrics summary for mobile dashboard"""
-        user = request.user
-        if not user.organization:
+        org = self.organization_context.organization
+        if not org:
             return Response({'error': 'No organization found'}, status=status.HTTP_400_BAD_REQUEST)
         
         # Get all properties for the organization
         from properties.models import Unit
         from maintenance.models import Ticket
         
-        org = user.organization
         properties = Property.objects.filter(organization=org)
         
         # Calculate unit statistics
@@ -310,7 +234,7 @@ class PropertyMetricViewSet(viewsets.ModelViewSet):
             'closed_tickets': closed_tickets,
         })
 
-class PaymentAnalyticsViewSet(viewsets.ModelViewSet):
+class PaymentAnalyticsViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing PaymentAnalytics instances"""
     queryset = PaymentAnalytics.objects.all()
     serializer_class = PaymentAnalyticsSerializer
@@ -327,68 +251,106 @@ class PaymentAnalyticsViewSet(viewsets.ModelViewSet):
         
         queryset = PaymentAnalytics.objects.all()
         
-        if user.organization:
-            queryset = queryset.filter(organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            queryset = queryset.filter(organization=organization)
         else:
             return PaymentAnalytics.objects.none()
         
         if period:
             queryset = queryset.filter(period=period)
-            return queryset.order_by('-period')
+            
+        return queryset.order_by('-period')
     
     @action(detail=False, methods=['get'])
     def summary_data(self, request):
         """Get aggregated payment analytics summary for mobile dashboard"""
-        user = request.user
-        if not user.organization:
+        org = self.organization_context.organization
+        if not org:
             return Response({'error': 'No organization found'}, status=status.HTTP_400_BAD_REQUEST)
         
-        org = user.organization
         today = timezone.now().date()
         
-        # Get all payments for the organization
-        all_payments = RentPayment.objects.filter(unit__property__organization=org)
-        
-        # Calculate payment statistics
-        total_expected = all_payments.filter(status__in=['pending', 'completed', 'overdue']).aggregate(
-            total=Sum('amount'))['total'] or 0
-        total_collected = all_payments.filter(status='completed').aggregate(
-            total=Sum('amount'))['total'] or 0
-        total_pending = all_payments.filter(status='pending').aggregate(
-            total=Sum('amount'))['total'] or 0
-        total_overdue = all_payments.filter(status='overdue').aggregate(
-            total=Sum('amount'))['total'] or 0
-        
-        # Calculate monthly revenue for the last 6 months
-        monthly_revenue = []
-        for i in range(6):
-            month_start = (today.replace(day=1) - timezone.timedelta(days=31*i)).replace(day=1)
-            month_end = (month_start + timezone.timedelta(days=31)).replace(day=1) - timezone.timedelta(days=1)
-            
-            month_total = all_payments.filter(
-                status='completed',
-                payment_date__gte=month_start,
-                payment_date__lte=month_end
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            monthly_revenue.append({
-                'month': month_start.strftime('%b'),
-                'amount': float(month_total)
-            })
+        totals = payment_totals(org)
+        total_expected = totals['total_expected']
+        total_collected = totals['total_collected']
         
-        # Reverse to get chronological order
-        monthly_revenue.reverse()
+        # Monthly revenue for the last 6 calendar months, in chronological order
+        start_date = today.replace(day=1) - relativedelta(months=5)
+        series = revenue_time_series(org, start_date, today, granularity='month')
+        monthly_revenue = [
+            {'month': row['period'].strftime('%b'), 'amount': float(row['collected'])}
+            for row in series
+        ]
         
         return Response({
             'total_expected': float(total_expected),
             'total_collected': float(total_collected),
-            'total_pending': float(total_pending),
-            'total_overdue': float(total_overdue),
+            'total_pending': float(totals['total_pending']),
+            'total_overdue': float(totals['total_overdue']),
             'collection_rate': round((total_collected / total_expected * 100) if total_expected > 0 else 0, 2),
             'monthly_revenue': monthly_revenue,
         })
+    
+    @action(detail=False, methods=['get'])
+    def time_series(self, request):
+        """
+        Collected, expected, pending and overdue rent per period.
+        
+        Query parameters:
+            granularity: 'day', 'week' or 'month' (default 'month')
+            start_date, end_date: YYYY-MM-DD (default: the last 6 months)
+            property: optional property id, may be repeated
+        """
+        organization = self.organization_context.organization
+        if not organization:
+            return Response({'error': 'No organization found'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        granularity = request.query_params.get('granularity', 'month')
+        if granularity not in TIME_SERIES_GRANULARITIES:
+            return Response(
+                {'error': f"granularity must be one of: {', '.join(TIME_SERIES_GRANULARITIES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        today = timezone.now().date()
+        try:
+            end_date = parse_date_param(request.query_params.get('end_date')) or today
+            start_date = (
+                parse_date_param(request.query_params.get('start_date'))
+                or end_date.replace(day=1) - relativedelta(months=5)
+            )
+            property_ids = [int(pk) for pk in request.query_params.getlist('property')]
+        except ValueError:
+            return Response(
+                {'error': 'Invalid start_date, end_date or property parameter'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if start_date > end_date:
+            return Response({'error': 'start_date must be before end_date'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        series = revenue_time_series(
+            organization, start_date, end_date,
+            granularity=granularity, property_ids=property_ids
+        )
+        return Response({
+            'granularity': granularity,
+            'start_date': start_date,
+            'end_date': end_date,
+            'results': [
+                {
+                    'period': row['period'],
+                    'collected': float(row['collected']),
+                    'expected': float(row['expected']),
+                    'pending': float(row['pending']),
+                    'overdue': float(row['overdue']),
+                }
+                for row in series
+            ],
+        })
 
-class SMSAnalyticsViewSet(viewsets.ModelViewSet):
+class SMSAnalyticsViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing SMSAnalytics instances"""
     queryset = SMSAnalytics.objects.all()
     serializer_class = SMSAnalyticsSerializer
@@ -405,8 +367,9 @@ class SMSAnalyticsViewSet(viewsets.ModelViewSet):
         
         queryset = SMSAnalytics.objects.all()
         
-        if user.organization:
-            queryset = queryset.filter(organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            queryset = queryset.filter(organization=organization)
         else:
             return SMSAnalytics.objects.none()
         
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -64,6 +65,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'organizations.middleware.OrganizationContextMiddleware',
+    'organizations.middleware.ThrottleHeadersMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'homemanager_backend.middleware.SuppressNaiveDatetimeWarningMiddleware',
@@ -105,6 +108,16 @@ DATABASES = {
     }
 }
 
+# Cache
+# Permission stamps, quota counters and throttle buckets must be shared by
+# every worker process, so the default cache is Redis
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    }
+}
+
 # Custom user model
 AUTH_USER_MODEL = 'users.User'
 
@@ -158,15 +171,71 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.OrganizationJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'organizations.throttling.OrganizationRateThrottle',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
 
+# Analytics settings
+# Seconds to cache the per-organization dashboard summary (0 disables caching)
+DASHBOARD_SUMMARY_CACHE_TIMEOUT = 0
+# Gateway price of one SMS segment, used for SMSAnalytics cost rollups
+SMS_COST_PER_SEGMENT = 0.80
+
+# Payment settings
+# Day of the month generated rent charges are due
+RENT_DUE_DAY = 5
+# Leases billed per transaction by generate_rent_charges
+BILLING_CHUNK_SIZE = 1000
+# Payments assessed per batch by assess_late_fees
+LATE_FEE_BATCH_SIZE = 2000
+# Statement lines matched per batch by reconcile_mpesa_statement
+RECONCILIATION_BATCH_SIZE = 1000
+
+# M-Pesa (Daraja) client settings
+# Overrides the sandbox/production API URL of every config, e.g. to use run_mpesa_simulator
+MPESA_BASE_URL = None
+# STK push result callback URL for configs without their own
+MPESA_CALLBACK_URL = None
+# (connect, read) timeouts in seconds
+MPESA_TIMEOUT = (3.05, 15)
+# Retries of failed requests that are safe to repeat, with exponential backoff from MPESA_RETRY_BACKOFF seconds
+MPESA_MAX_RETRIES = 2
+MPESA_RETRY_BACKOFF = 0.5
+# Kept-alive connections pooled per M-Pesa config
+MPESA_POOL_SIZE = 10
+# Only store STK callbacks on receipt and leave applying them to process_mpesa_callbacks --loop
+MPESA_CALLBACK_BATCHING = False
+# Callbacks applied per transaction by process_mpesa_callbacks
+MPESA_CALLBACK_BATCH_SIZE = 500
+# Confirm successful STK callbacks with Daraja's STK query before completing payments
+MPESA_VERIFY_CALLBACKS = True
+
+# Organization settings
+# Seconds resolved role permission matrices stay in the shared cache
+ROLE_PERMISSIONS_CACHE_TIMEOUT = 3600
+# Seconds plan limits and usage counters stay in the cache
+QUOTA_CACHE_TIMEOUT = 300
+# Invitations delivered per transaction by process_invitation_jobs
+INVITATION_BATCH_SIZE = 50
+# Rows deleted per transaction by process_organization_deletions
+ORGANIZATION_DELETION_BATCH_SIZE = 1000
+# Default API rate limits per organization and throttle scope, in requests
+# per minute; SubscriptionPlan rate limit fields override them (0 = unthrottled)
+ORGANIZATION_THROTTLE_RATES = {
+    'read': 600,
+    'write': 120,
+    'bulk': 10,
+    'export': 20,
+}
+
 # JWT Authentication settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
@@ -186,7 +255,7 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
 
-    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'AUTH_TOKEN_CLASSES': ('users.tokens.OrganizationAccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
 
     'JTI_CLAIM': 'jti',
@@ -194,8 +263,20 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
+
+    # Embed organization, role and permission stamp claims in access tokens
+    'TOKEN_OBTAIN_SERIALIZER': 'users.tokens.OrganizationTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.tokens.OrganizationTokenRefreshSerializer',
 }
 
+# Seconds a worker trusts a cached token user before re-checking its permission stamp
+AUTH_USER_CACHE_TTL = 5
+# Reuse token users between requests: None enables it only when the default
+# cache is shared between processes (not local memory or dummy)
+AUTH_USER_CACHE = None
+# Seconds the per-user startup payload (/api/users/bootstrap/) stays cached (0 disables caching)
+BOOTSTRAP_CACHE_TIMEOUT = 60
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
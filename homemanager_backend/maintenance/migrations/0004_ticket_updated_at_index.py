@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenance', '0003_serviceprovider_organization'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticket',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenance', '0004_ticket_updated_at_index'),
+        ('organizations', '0006_make_base_role_required'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketcomment',
+            name='organization',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)ss', to='organizations.organization'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketcomment',
+            index=models.Index(fields=['organization'], name='maintenance_organiz_657633_idx'),
+        ),
+    ]
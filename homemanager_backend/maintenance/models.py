@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from properties.models import Property, Unit
 from tenants.models import Tenant
+from organizations.models import OrganizationModel
 
 class ServiceProvider(models.Model):
     """Model representing a service provider (plumber, electrician, etc.)"""
@@ -60,7 +61,7 @@ class Ticket(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='new')
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='medium')
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     assigned_to = models.ForeignKey(ServiceProvider, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_tickets')
     resolved_at = models.DateTimeField(blank=True, null=True)
     satisfaction_rating = models.PositiveSmallIntegerField(blank=True, null=True)
@@ -68,8 +69,10 @@ class Ticket(models.Model):
     def __str__(self):
         return f"{self.title} - {self.unit}"
 
-class TicketComment(models.Model):
+class TicketComment(OrganizationModel):
     """Model representing comments/updates on a ticket"""
+    organization_source = 'ticket__property__organization'
+    
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='comments')
     author_name = models.CharField(max_length=200)
     is_owner = models.BooleanField(default=False)  # To distinguish between tenant and owner comments
@@ -4,8 +4,9 @@ from rest_framework.response import Response
 from django.utils import timezone
 from .models import ServiceProvider, Ticket, TicketComment
 from .serializers import ServiceProviderSerializer, TicketSerializer, TicketDetailSerializer, TicketCommentSerializer
+from organizations.context import OrganizationContextMixin
 
-class ServiceProviderViewSet(viewsets.ModelViewSet):
+class ServiceProviderViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing ServiceProvider instances"""
     queryset = ServiceProvider.objects.all()
     serializer_class = ServiceProviderSerializer
@@ -20,8 +21,9 @@ class ServiceProviderViewSet(viewsets.ModelViewSet):
         # Filter by provider_type if provided
         provider_type = self.request.query_params.get('provider_type', None)
         
-        if user.organization:
-            queryset = ServiceProvider.objects.filter(organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            queryset = ServiceProvider.objects.filter(organization=organization)
         else:
             return ServiceProvider.objects.none()
         
@@ -34,10 +36,10 @@ class ServiceProviderViewSet(viewsets.ModelViewSet):
         """Set owner and organization when creating a service provider"""
         serializer.save(
             owner=self.request.user,
-            organization=self.request.user.organization
+            organization=self.organization_context.organization
         )
 
-class TicketViewSet(viewsets.ModelViewSet):
+class TicketViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing Ticket instances"""
     queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
@@ -63,8 +65,9 @@ class TicketViewSet(viewsets.ModelViewSet):
         
         queryset = Ticket.objects.all()
         
-        if user.organization:
-            queryset = queryset.filter(property__organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            queryset = queryset.filter(property__organization=organization)
         else:
             return Ticket.objects.none()
         
@@ -111,7 +114,7 @@ class TicketViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class TicketCommentViewSet(viewsets.ModelViewSet):
+class TicketCommentViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing TicketComment instances"""
     queryset = TicketComment.objects.all()
     serializer_class = TicketCommentSerializer
@@ -125,12 +128,7 @@ class TicketCommentViewSet(viewsets.ModelViewSet):
         
         # Filter by ticket if provided
         ticket_id = self.request.query_params.get('ticket', None)
-        queryset = TicketComment.objects.all()
-        
-        if user.organization:
-            queryset = queryset.filter(ticket__property__organization=user.organization)
-        else:
-            return TicketComment.objects.none()
+        queryset = TicketComment.objects.for_organization(self.organization_context.organization)
         
         if ticket_id:
             queryset = queryset.filter(ticket_id=ticket_id)
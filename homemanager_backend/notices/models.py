@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from properties.models import Property
 from tenants.models import Tenant
+from organizations.models import OrganizationModel
 
 class Notice(models.Model):
     """Model representing notices posted by the property owner"""
@@ -32,13 +33,15 @@ class Notice(models.Model):
     def __str__(self):
         return self.title
 
-class NoticeView(models.Model):
+class NoticeView(OrganizationModel):
     """Model to track which tenants have viewed a notice"""
+    organization_source = 'notice__property__organization'
+    
     notice = models.ForeignKey(Notice, on_delete=models.CASCADE, related_name='views')
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='viewed_notices')
     viewed_at = models.DateTimeField(auto_now_add=True)
     
-    class Meta:
+    class Meta(OrganizationModel.Meta):
         unique_together = ('notice', 'tenant')
     
     def __str__(self):
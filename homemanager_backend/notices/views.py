@@ -7,8 +7,9 @@ from .models import Notice, NoticeView
 from .serializers import NoticeSerializer, NoticeDetailSerializer, NoticeViewSerializer
 from tenants.models import Tenant
 from sms.utils import send_notice_sms
+from organizations.context import OrganizationContextMixin
 
-class NoticeViewSet(viewsets.ModelViewSet):
+class NoticeViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing Notice instances"""
     queryset = Notice.objects.all()
     serializer_class = NoticeSerializer
@@ -35,8 +36,9 @@ class NoticeViewSet(viewsets.ModelViewSet):
         
         queryset = Notice.objects.all()
         
-        if user.organization:
-            queryset = queryset.filter(property__organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            queryset = queryset.filter(property__organization=organization)
         else:
             return Notice.objects.none()
         
@@ -83,7 +85,7 @@ class NoticeViewSet(viewsets.ModelViewSet):
         tenant = get_object_or_404(Tenant, pk=tenant_id)
         
         # Ensure tenant belongs to the same organization
-        if tenant.unit.property.organization != request.user.organization:
+        if tenant.unit.property.organization_id != self.organization_context.organization_id:
             return Response(
                 {'error': 'Unauthorized tenant'}, 
                 status=status.HTTP_403_FORBIDDEN
@@ -134,7 +136,7 @@ class NoticeViewSet(viewsets.ModelViewSet):
             sms_result = send_notice_sms(notice, send_sms_flag=True)
             print(f"SMS Result for Updated Notice {notice.id}: {sms_result}")
 
-class NoticeViewViewSet(viewsets.ReadOnlyModelViewSet):
+class NoticeViewViewSet(OrganizationContextMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing NoticeView instances (read-only)"""
     queryset = NoticeView.objects.all()
     serializer_class = NoticeViewSerializer
@@ -150,12 +152,7 @@ class NoticeViewViewSet(viewsets.ReadOnlyModelViewSet):
         notice_id = self.request.query_params.get('notice', None)
         tenant_id = self.request.query_params.get('tenant', None)
         
-        queryset = NoticeView.objects.all()
-        
-        if user.organization:
-            queryset = queryset.filter(notice__property__organization=user.organization)
-        else:
-            return NoticeView.objects.none()
+        queryset = NoticeView.objects.for_organization(self.organization_context.organization)
         
         if notice_id:
             queryset = queryset.filter(notice_id=notice_id)
@@ -1,6 +1,6 @@
 from django.contrib import admin
-from .models import Organization, SubscriptionPlan, Subscription, SubscriptionPayment, BaseRole, OrganizationRoleCustomization
-from .membership_models import OrganizationRole, OrganizationMembership
+from .models import Organization, SubscriptionPlan, Subscription, SubscriptionPayment, BaseRole, OrganizationRoleCustomization, OrganizationUsage, OrganizationDeletionJob
+from .membership_models import OrganizationRole, OrganizationMembership, InvitationJob
 
 @admin.register(Organization)
 class OrganizationAdmin(admin.ModelAdmin):
@@ -103,3 +103,24 @@ class SubscriptionPaymentAdmin(admin.ModelAdmin):
     list_display = ('subscription', 'amount', 'currency', 'status', 'payment_method', 'payment_date')
     list_filter = ('status', 'payment_method', 'currency')
     search_fields = ('subscription__organization__name', 'transaction_id')
+
+@admin.register(OrganizationUsage)
+class OrganizationUsageAdmin(admin.ModelAdmin):
+    """Admin configuration for OrganizationUsage model"""
+    list_display = ('organization', 'properties', 'units', 'users', 'reconciled_at')
+    search_fields = ('organization__name',)
+    readonly_fields = ('reconciled_at',)
+
+@admin.register(InvitationJob)
+class InvitationJobAdmin(admin.ModelAdmin):
+    """Admin configuration for InvitationJob model"""
+    list_display = ('id', 'organization', 'status', 'total', 'sent', 'failed', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('organization__name',)
+
+@admin.register(OrganizationDeletionJob)
+class OrganizationDeletionJobAdmin(admin.ModelAdmin):
+    """Admin configuration for OrganizationDeletionJob model"""
+    list_display = ('organization_name', 'status', 'current_step', 'deleted_rows', 'total_rows', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('organization_name',)
@@ -0,0 +1,122 @@
+"""
+Request-scoped organization context.
+
+Resolves the requesting user's organization, active membership, role and
+effective permissions once per request. OrganizationContextMiddleware
+exposes the result lazily as ``request.organization_context``; it is only
+resolved on first access, after DRF has authenticated the user.
+"""
+from .role_permissions import ROLE_PERMISSIONS, get_permission_matrix
+
+ADMIN_ROLE_TYPES = ('owner', 'admin')
+
+
+class OrganizationContext:
+    """The organization, membership and role a request acts under"""
+
+    def __init__(self, user, organization=None, membership=None):
+        self.user = user
+        self.organization = organization
+        self.membership = membership
+
+    @property
+    def organization_id(self):
+        return self.organization.pk if self.organization else None
+
+    @property
+    def role(self):
+        return self.membership.role if self.membership else None
+
+    @property
+    def role_type(self):
+        return self.role.role_type if self.role else None
+
+    @property
+    def permissions(self):
+        """Effective permissions of the membership's role, all False without one"""
+        role = self.role
+        if role is None:
+            return dict.fromkeys(ROLE_PERMISSIONS, False)
+        if not role.base_role_id:
+            return {name: role.get_effective_permission(name) for name in ROLE_PERMISSIONS}
+        matrix = get_permission_matrix(self.organization_id).get(role.base_role_id, {})
+        return {name: matrix.get(name, False) for name in ROLE_PERMISSIONS}
+
+    def has_permission(self, permission_name):
+        return self.permissions.get(permission_name, False)
+
+    @property
+    def is_primary_owner(self):
+        return bool(self.organization) and self.organization.primary_owner_id == self.user.pk
+
+    @property
+    def is_admin(self):
+        """Primary owner, an owner/admin role, or a role that can manage users"""
+        return (
+            self.is_primary_owner
+            or self.role_type in ADMIN_ROLE_TYPES
+            or self.has_permission('can_manage_users')
+        )
+
+
+def resolve_organization_context(user):
+    """
+    Load the organization context for a user in at most two queries.
+
+    One query fetches the user's active memberships with their organization,
+    role and base role. The membership in user.organization wins; users
+    without an organization fall back to their first active membership. The
+    organization itself is only fetched separately when the user has no
+    membership in it. The resolved organization is cached on the user so
+    later ``user.organization`` reads are free.
+    """
+    from .membership_models import OrganizationMembership
+    from .models import Organization
+
+    if not user or not user.is_authenticated:
+        return OrganizationContext(user)
+
+    memberships = list(
+        OrganizationMembership.objects.filter(user=user, is_active=True)
+        .select_related('organization', 'role', 'role__base_role')
+        .order_by('created_at')
+    )
+    membership = None
+    if user.organization_id:
+        membership = next((m for m in memberships if m.organization_id == user.organization_id), None)
+    elif memberships:
+        membership = memberships[0]
+
+    if membership:
+        organization = membership.organization
+    elif user.organization_id:
+        organization = Organization.objects.filter(pk=user.organization_id).first()
+    else:
+        organization = None
+
+    if organization is not None and user.organization_id == organization.pk:
+        user.organization = organization
+    return OrganizationContext(user, organization, membership)
+
+
+def get_organization_context(request):
+    """
+    Return the organization context for a request, resolving it on first use.
+
+    Works with or without OrganizationContextMiddleware installed.
+    """
+    # Store on the underlying HttpRequest so DRF and middleware share one copy
+    http_request = getattr(request, '_request', request)
+    context = getattr(http_request, '_organization_context', None)
+    if context is None or context.user is not request.user:
+        context = resolve_organization_context(request.user)
+        http_request._organization_context = context
+    return context
+
+
+class OrganizationContextMixin:
+    """ViewSet mixin exposing the request's organization context"""
+
+    @property
+    def organization_context(self):
+        return get_organization_context(self.request)
@@ -0,0 +1,208 @@
+"""
+Bulk membership invitations.
+
+create_invitation_job() validates a list of (email, role) entries with a
+fixed number of queries, then creates the missing users, the memberships
+and one InvitationDelivery per membership with bulk_create in a single
+transaction. Deliveries are sent later in batches by
+process_invitation_jobs (run it from cron or as a long-running worker with
+--loop); clients poll the job for progress.
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .membership_models import OrganizationRole, OrganizationMembership, InvitationJob, InvitationDelivery
+from .quotas import consume_quota
+from .role_permissions import invalidate_user_permissions
+
+logger = logging.getLogger(__name__)
+
+# Most entries accepted by one bulk invite request
+BULK_INVITE_MAX = 500
+
+
+def invitation_batch_size():
+    return getattr(settings, 'INVITATION_BATCH_SIZE', 50)
+
+
+def validate_invitations(organization, entries):
+    """
+    Check bulk invitation entries against the database in four queries.
+
+    Args:
+        organization: The inviting organization
+        entries: List of {'email': str, 'role': int} dicts
+
+    Returns:
+        tuple: (roles by id, existing users by lowercased email, errors)
+            where errors is a list of {'index', 'email', 'error'} dicts
+    """
+    User = get_user_model()
+    emails = [entry['email'].strip().lower() for entry in entries]
+
+    roles = OrganizationRole.objects.in_bulk({entry['role'] for entry in entries})
+    users = {
+        user.email_lower: user
+        for user in User.objects.annotate(email_lower=Lower('email')).filter(email_lower__in=emails)
+    }
+    members = set(
+        OrganizationMembership.objects.filter(
+            organization=organization, user__in=list(users.values())
+        ).values_list('user_id', flat=True)
+    )
+    taken_usernames = set(User.objects.filter(username__in=emails).values_list('username', flat=True))
+
+    errors = []
+    seen = set()
+    for index, (email, entry) in enumerate(zip(emails, entries)):
+        role = roles.get(entry['role'])
+        user = users.get(email)
+        if email in seen:
+            error = 'Duplicate email in request'
+        elif role is None or role.organization_id != organization.pk:
+            error = 'Role not found in this organization'
+        elif user is not None and user.pk in members:
+            error = 'User is already a member of this organization'
+        elif user is not None and user.organization_id not in (None, organization.pk):
+            error = 'User belongs to another organization'
+        elif user is None and email in taken_usernames:
+            error = 'Username already taken'
+        else:
+            error = None
+        if error:
+            errors.append({'index': index, 'email': entry['email'], 'error': error})
+        seen.add(email)
+    return roles, users, errors
+
+
+def create_invitation_job(organization, created_by, entries):
+    """
+    Create users, memberships and a queued InvitationJob for bulk invitations.
+
+    Nothing is written when any entry is invalid.
+
+    Returns:
+        tuple: (InvitationJob or None, errors)
+    """
+    User = get_user_model()
+    roles, users, errors = validate_invitations(organization, entries)
+    if errors:
+        return None, errors
+
+    new_users = []
+    invitees = []
+    for entry in entries:
+        email = entry['email'].strip().lower()
+        user = users.get(email)
+        if user is None:
+            user = User(
+                username=email,
+                email=email,
+                organization=organization,
+                password=make_password(None),
+            )
+            new_users.append(user)
+        invitees.append((user, roles[entry['role']]))
+
+    with transaction.atomic():
+        consume_quota(organization.pk, 'users', len(invitees))
+        User.objects.bulk_create(new_users)
+        # Existing users without an organization join this one
+        User.objects.filter(
+            pk__in=[user.pk for user in users.values()], organization__isnull=True
+        ).update(organization=organization)
+
+        memberships = OrganizationMembership.objects.bulk_create([
+            OrganizationMembership(organization=organization, user=user, role=role)
+            for user, role in invitees
+        ])
+        job = InvitationJob.objects.create(
+            organization=organization, created_by=created_by, total=len(memberships)
+        )
+        InvitationDelivery.objects.bulk_create([
+            InvitationDelivery(job=job, membership=membership) for membership in memberships
+        ])
+    # bulk_create/update skip save(), so existing users' stamps are bumped here
+    invalidate_user_permissions(*(user.pk for user in users.values()))
+    return job, []
+
+
+def deliver_invitation(membership):
+    """Deliver one invitation whose fields were set by prepare_invitation()"""
+    # In a real implementation, we would send an email here
+    logger.info(f"Invitation sent to {membership.user.email} for organization {membership.organization.name}")
+
+
+def process_invitation_job(job, batch_size=None):
+    """
+    Deliver a job's pending invitations, one batch per transaction.
+
+    Each batch costs a fixed number of queries: load the deliveries with
+    their memberships, then bulk update memberships, deliveries and the
+    job's counters.
+
+    Returns:
+        int: number of deliveries processed
+    """
+    batch_size = batch_size or invitation_batch_size()
+    if job.status == 'pending':
+        InvitationJob.objects.filter(pk=job.pk).update(status='running', started_at=timezone.now())
+
+    processed = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                job.deliveries.filter(status='pending')
+                .select_related('membership__user', 'membership__organization')
+                .select_for_update(skip_locked=True, of=('self',))
+                .order_by('pk')[:batch_size]
+            )
+            if not batch:
+                break
+
+            now = timezone.now()
+            sent = failed = 0
+            for delivery in batch:
+                membership = delivery.membership
+                membership.prepare_invitation()
+                try:
+                    deliver_invitation(membership)
+                except Exception as exc:
+                    logger.exception("Invitation delivery %s failed", delivery.pk)
+                    delivery.status = 'failed'
+                    delivery.error = str(exc)
+                    failed += 1
+                else:
+                    delivery.status = 'sent'
+                    sent += 1
+                delivery.processed_at = now
+
+            OrganizationMembership.objects.bulk_update(
+                [delivery.membership for delivery in batch if delivery.status == 'sent'],
+                ['is_invited', 'invitation_sent_at', 'invitation_token']
+            )
+            InvitationDelivery.objects.bulk_update(batch, ['status', 'error', 'processed_at'])
+            InvitationJob.objects.filter(pk=job.pk).update(sent=F('sent') + sent, failed=F('failed') + failed)
+            processed += len(batch)
+
+    job.refresh_from_db()
+    if not job.deliveries.filter(status='pending').exists():
+        job.status = 'failed' if job.failed and not job.sent else 'completed'
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'completed_at'])
+    return processed
+
+
+def process_pending_jobs(batch_size=None):
+    """Process every pending or running job, oldest first"""
+    processed = 0
+    for job in InvitationJob.objects.filter(status__in=('pending', 'running')).order_by('created_at'):
+        processed += process_invitation_job(job, batch_size)
+    return processed
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""
+Django management command to populate the denormalized organization column
+on tenant-scoped tables (rent payments, tenants, leases, SMS messages, ticket
+comments and notice views) from each row's parent.
+"""
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+
+# Models that denormalize organization through OrganizationModel.organization_source
+DENORMALIZED_MODELS = [
+    'payments.RentPayment',
+    'tenants.Tenant',
+    'tenants.Lease',
+    'sms.SMSMessage',
+    'maintenance.TicketComment',
+    'notices.NoticeView',
+]
+
+
+class Command(BaseCommand):
+    help = 'Backfill the organization column on denormalized tenant-scoped tables in primary key chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            dest='models',
+            help=f'Only backfill this model (repeatable): {", ".join(DENORMALIZED_MODELS)}'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Primary key range updated per transaction (default: 5000)'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute rows that already have an organization, not just empty ones'
+        )
+
+    def handle(self, *args, **options):
+        labels = options['models'] or DENORMALIZED_MODELS
+        unknown = set(labels) - set(DENORMALIZED_MODELS)
+        if unknown:
+            raise CommandError(f'Unknown models: {", ".join(sorted(unknown))}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        for label in labels:
+            model = apps.get_model(label)
+            updated = self.backfill(model, options['chunk_size'], options['all'])
+            self.stdout.write(self.style.SUCCESS(f'{label}: updated {updated} rows'))
+
+    def backfill(self, model, chunk_size, recompute):
+        """Update organization_id with one UPDATE ... SET = (subquery) per primary key range"""
+        relation, path = model.organization_source.split('__', 1)
+        related_model = model._meta.get_field(relation).related_model
+        organization = Subquery(
+            related_model._base_manager.filter(pk=OuterRef(f'{relation}_id')).values(path)[:1]
+        )
+
+        rows = model._base_manager.all()
+        if not recompute:
+            rows = rows.filter(organization__isnull=True)
+        bounds = rows.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            return 0
+
+        updated = 0
+        start = bounds['first']
+        while start <= bounds['last']:
+            with transaction.atomic():
+                updated += rows.filter(pk__gte=start, pk__lt=start + chunk_size).update(
+                    organization_id=organization
+                )
+            start += chunk_size
+        return updated
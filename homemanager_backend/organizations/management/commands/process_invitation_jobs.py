@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+"""
+Django management command to deliver queued bulk membership invitations in
+batches. Run it from cron, or keep it running as a worker with --loop.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from organizations.invitations import process_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending bulk invitation jobs in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Invitations delivered per transaction (default: settings.INVITATION_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new jobs instead of exiting'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds between polls with --loop (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        while True:
+            processed = process_pending_jobs(options['batch_size'])
+            if processed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Processed {processed} invitations'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+"""
+Django management command to tear down organizations queued for deletion,
+removing their rows in bounded batches. Run it from cron, or keep it
+running as a worker with --loop.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from organizations.teardown import process_pending_deletions
+
+
+class Command(BaseCommand):
+    help = 'Run pending organization deletion jobs in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Rows deleted per transaction (default: settings.ORGANIZATION_DELETION_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Also resume jobs that previously failed'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new jobs instead of exiting'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=30,
+            help='Seconds between polls with --loop (default: 30)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        retry_failed = options['retry_failed']
+        while True:
+            deleted = process_pending_deletions(options['batch_size'], retry_failed=retry_failed)
+            # Failed jobs are retried once per invocation, not on every poll
+            retry_failed = False
+            if deleted or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} rows'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
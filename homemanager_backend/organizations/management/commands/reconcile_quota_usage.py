@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+
+"""
+Django management command to recount organization quota usage (properties,
+units and active memberships) and correct drifted counters. Intended to be
+run periodically, e.g. from cron.
+"""
+
+from django.core.management.base import BaseCommand
+
+from organizations.quotas import reconcile_quota_usage
+
+
+class Command(BaseCommand):
+    help = 'Recount properties, units and users per organization and update the quota usage counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--organization',
+            type=int,
+            action='append',
+            dest='organizations',
+            help='Only reconcile this organization id (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        count = reconcile_quota_usage(options['organizations'])
+        self.stdout.write(self.style.SUCCESS(f'Reconciled quota usage for {count} organizations'))
@@ -3,6 +3,7 @@ from django.conf import settings
 from django.utils import timezone
 import uuid
 from .models import OrganizationModel
+from .role_permissions import get_permission_matrix, invalidate_permission_matrix, invalidate_user_permissions
 
 class OrganizationRole(OrganizationModel):
     """
@@ -113,6 +114,9 @@ class OrganizationRole(OrganizationModel):
         """
         Get effective permission value (customization overrides base role default)
         
+        Values come from the organization's cached permission matrix, so
+        reading permissions does not query the database in steady state.
+        
         Args:
             permission_name: The name of the permission (e.g., 'can_manage_users')
         
@@ -120,25 +124,22 @@ class OrganizationRole(OrganizationModel):
             bool: The effective permission value
         """
         # During migration, if base_role is None, use legacy fields
-        if not self.base_role:
+        if not self.base_role_id:
             legacy_field = f'_legacy_{permission_name}'
             return getattr(self, legacy_field, False)
         
-        try:
-            from .models import OrganizationRoleCustomization
-            customization = OrganizationRoleCustomization.objects.get(
-                organization=self.organization,
-                base_role=self.base_role
-            )
-            # Check if there's a custom value for this permission
-            custom_value = getattr(customization, permission_name, None)
-            if custom_value is not None:
-                return custom_value
-        except OrganizationRoleCustomization.DoesNotExist:
-            pass
-          # Fall back to base role default
-        default_field = f'default_{permission_name}'
-        return getattr(self.base_role, default_field, False)
+        # Permissions resolved in memory by the caller (e.g. available_roles)
+        permissions = self.__dict__.get('resolved_permissions')
+        if permissions is None:
+            permissions = get_permission_matrix(self.organization_id).get(self.base_role_id, {})
+        return permissions.get(permission_name, False)
+    
+    @property
+    def is_customized(self):
+        """Whether the organization overrides this role's default permissions"""
+        if not self.base_role_id:
+            return False
+        return self.get_effective_permission('is_customized')
     
     def __str__(self):
         try:
@@ -153,6 +154,15 @@ class OrganizationRole(OrganizationModel):
             
         return f"{org_name} - {role_name}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_permission_matrix(self.organization_id)
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_permission_matrix(self.organization_id)
+        return result
+    
     class Meta:
         ordering = ['organization', 'base_role__name']
         unique_together = ('organization', 'base_role')  # Each organization can have only one instance of each base role
@@ -205,15 +215,22 @@ class OrganizationMembership(models.Model):
     def __str__(self):
         return f"{self.user} - {self.organization} - {self.role}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_user_permissions(self.user_id)
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_user_permissions(self.user_id)
+        return result
+    
     def send_invitation(self):
         """
         Send an invitation email to the user.
         Mark the membership as invited.
         """
         # Set invitation fields
-        self.is_invited = True
-        self.invitation_sent_at = timezone.now()
-        self.invitation_token = uuid.uuid4()
+        self.prepare_invitation()
         self.save()
         
         # In a real implementation, we would send an email here
@@ -230,3 +247,86 @@ class OrganizationMembership(models.Model):
         self.invitation_accepted_at = timezone.now()
         self.is_active = True
         self.save()
+    
+    def prepare_invitation(self):
+        """Set the invitation fields without saving (see send_invitation)"""
+        self.is_invited = True
+        self.invitation_sent_at = timezone.now()
+        self.invitation_token = uuid.uuid4()
+
+
+class InvitationJob(models.Model):
+    """
+    A bulk invitation request whose deliveries are sent in the background
+    by the process_invitation_jobs command. Poll it for progress.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey(
+        'Organization',
+        on_delete=models.CASCADE,
+        related_name='invitation_jobs'
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name='invitation_jobs',
+        null=True,
+        blank=True
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    
+    # Progress counters, updated once per delivered batch
+    total = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+    
+    def __str__(self):
+        return f"Invitation job {self.id} ({self.sent}/{self.total})"
+    
+    @property
+    def progress(self):
+        """Percentage of deliveries processed (sent or failed)"""
+        if not self.total:
+            return 100
+        return round((self.sent + self.failed) * 100 / self.total)
+
+
+class InvitationDelivery(models.Model):
+    """One membership invitation queued by an InvitationJob"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    job = models.ForeignKey(InvitationJob, on_delete=models.CASCADE, related_name='deliveries')
+    membership = models.ForeignKey(
+        OrganizationMembership,
+        on_delete=models.CASCADE,
+        related_name='invitation_deliveries'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True, null=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['job', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.membership_id} ({self.status})"
@@ -0,0 +1,41 @@
+from django.utils.functional import SimpleLazyObject
+
+from .context import get_organization_context
+
+
+class OrganizationContextMiddleware:
+    """
+    Expose the requesting user's organization context as
+    ``request.organization_context``.
+
+    The context is resolved lazily on first access, so JWT-authenticated API
+    requests resolve it after DRF has set ``request.user``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.organization_context = SimpleLazyObject(lambda: get_organization_context(request))
+        return self.get_response(request)
+
+
+class ThrottleHeadersMiddleware:
+    """
+    Add the organization's rate limit state to API responses:
+    X-RateLimit-Scope, X-RateLimit-Limit (requests per minute) and
+    X-RateLimit-Remaining. Set by organizations.throttling.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        throttle_status = getattr(request, '_throttle_status', None)
+        if throttle_status is not None:
+            scope, limit, remaining = throttle_status
+            response['X-RateLimit-Scope'] = scope
+            response['X-RateLimit-Limit'] = str(limit)
+            response['X-RateLimit-Remaining'] = str(remaining)
+        return response
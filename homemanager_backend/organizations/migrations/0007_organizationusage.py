@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0006_make_base_role_required'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationUsage',
+            fields=[
+                ('organization', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='usage', serialize=False, to='organizations.organization')),
+                ('properties', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('users', models.PositiveIntegerField(default=0)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Organization Usage',
+                'verbose_name_plural': 'Organization Usage',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0009_organization_deletion_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='bulk_rate_limit',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='export_rate_limit',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='read_rate_limit',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='write_rate_limit',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
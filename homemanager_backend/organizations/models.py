@@ -7,6 +7,8 @@ from django.http import Http404
 from django.db.models.deletion import SET_NULL
 import uuid
 from datetime import timedelta
+from .role_permissions import invalidate_permission_matrix
+from .quotas import invalidate_quota_limits
 
 class OrganizationQuerySet(QuerySet):
     """QuerySet that adds organization filtering capabilities"""
@@ -54,12 +56,69 @@ class OrganizationModel(models.Model):
     # Use the custom manager
     objects = OrganizationManager()
     
+    # Lookup path to the organization for models that denormalize it from a
+    # parent (e.g. 'unit__property__organization'); filled in on save
+    organization_source = None
+    
     class Meta:
         abstract = True
         # Index the organization field for faster filtering
         indexes = [
             models.Index(fields=["organization"]),
         ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if cls.organization_source:
+            # Remember the loaded parent so save() can tell when it moves
+            attname = instance.organization_source_attname()
+            if attname in instance.__dict__:
+                instance._loaded_source_id = instance.__dict__[attname]
+        return instance
+    
+    def save(self, *args, **kwargs):
+        """
+        Fill in the organization from organization_source when it is missing,
+        and resolve it again when the parent it comes from has changed.
+        """
+        if self.organization_source:
+            relation = self.organization_source.split('__', 1)[0]
+            source_id = getattr(self, f'{relation}_id')
+            update_fields = kwargs.get('update_fields')
+            moved = (
+                source_id != getattr(self, '_loaded_source_id', source_id)
+                and (update_fields is None or {relation, f'{relation}_id'} & set(update_fields))
+            )
+            if self.organization_id is None or moved:
+                organization_id = self.resolve_organization_id()
+                if update_fields is not None and organization_id != self.organization_id:
+                    kwargs['update_fields'] = {*update_fields, 'organization'}
+                self.organization_id = organization_id
+            super().save(*args, **kwargs)
+            self._loaded_source_id = source_id
+            return
+        super().save(*args, **kwargs)
+    
+    def organization_source_attname(self):
+        """Attribute holding the id of the parent named by organization_source"""
+        return f"{self.organization_source.split('__', 1)[0]}_id"
+    
+    def resolve_organization_id(self):
+        """Look up the organization id through organization_source"""
+        relation, path = self.organization_source.split('__', 1)
+        related_id = getattr(self, f'{relation}_id')
+        if related_id is None:
+            return None
+        related_model = self._meta.get_field(relation).related_model
+        return related_model._base_manager.filter(pk=related_id).values_list(path, flat=True).first()
+
+
+class ActiveOrganizationManager(models.Manager):
+    """Default manager that hides organizations being torn down"""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleting=False)
 
 
 class Organization(models.Model):
@@ -109,11 +168,17 @@ class Organization(models.Model):
         blank=True
     )
     plan_name = models.CharField(max_length=100, blank=True, null=True)
+    
+    # Set when deletion is requested; the rows are removed by an OrganizationDeletionJob
+    is_deleting = models.BooleanField(default=False, db_index=True)
       
     # Dates
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ActiveOrganizationManager()
+    all_objects = models.Manager()
+    
     def save(self, *args, **kwargs):
         """Auto-generate slug from name if not provided and sync plan name"""
         # Generate slug if not provided
@@ -125,6 +190,7 @@ class Organization(models.Model):
             self.plan_name = self.subscription_plan.name
             
         super().save(*args, **kwargs)
+        invalidate_quota_limits(self.pk)
     
     def _generate_unique_slug(self):
         """Generate a unique slug from the organization name"""
@@ -132,7 +198,7 @@ class Organization(models.Model):
         slug = base_slug
         counter = 1
         
-        while Organization.objects.filter(slug=slug).exclude(pk=self.pk).exists():
+        while Organization.all_objects.filter(slug=slug).exclude(pk=self.pk).exists():
             slug = f"{base_slug}-{counter}"
             counter += 1
             
@@ -160,6 +226,12 @@ class SubscriptionPlan(models.Model):
     max_units = models.IntegerField(default=0)       # 0 = unlimited
     max_users = models.IntegerField(default=5)       # Default to 5 users
     
+    # API rate limits per organization, in requests per minute (empty = platform default)
+    read_rate_limit = models.PositiveIntegerField(null=True, blank=True)
+    write_rate_limit = models.PositiveIntegerField(null=True, blank=True)
+    bulk_rate_limit = models.PositiveIntegerField(null=True, blank=True)
+    export_rate_limit = models.PositiveIntegerField(null=True, blank=True)
+    
     # Features
     has_tenant_portal = models.BooleanField(default=True)
     has_payment_processing = models.BooleanField(default=True)
@@ -184,6 +256,13 @@ class SubscriptionPlan(models.Model):
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Limits of every organization on this plan may have changed
+        organization_ids = set(self.organizations.values_list('pk', flat=True))
+        organization_ids.update(self.subscriptions.values_list('organization_id', flat=True))
+        invalidate_quota_limits(*organization_ids)
 
 
 class Subscription(OrganizationModel):
@@ -234,6 +313,15 @@ class Subscription(OrganizationModel):
     
     def __str__(self):
         return f"{self.organization.name} - {self.plan.name}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_quota_limits(self.organization_id)
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_quota_limits(self.organization_id)
+        return result
 
 
 class SubscriptionPayment(OrganizationModel):
@@ -288,6 +376,89 @@ class SubscriptionPayment(OrganizationModel):
         return f"{self.subscription.organization.name} - {self.amount} {self.currency}"
 
 
+class OrganizationUsage(models.Model):
+    """
+    Usage counters checked against subscription plan limits.
+    Maintained by organizations.quotas and reconciled periodically.
+    """
+    organization = models.OneToOneField(
+        Organization,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='usage'
+    )
+    properties = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    users = models.PositiveIntegerField(default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Organization Usage"
+        verbose_name_plural = "Organization Usage"
+    
+    def __str__(self):
+        return f"{self.organization_id} usage"
+
+
+class OrganizationDeletionJob(models.Model):
+    """
+    Background teardown of an organization and everything that belongs to it.
+    Processed in batches by the process_organization_deletions command.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Kept after the organization is gone, hence SET_NULL and the copied name
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.SET_NULL,
+        related_name='deletion_jobs',
+        null=True,
+        blank=True
+    )
+    organization_name = models.CharField(max_length=100)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name='organization_deletion_jobs',
+        null=True,
+        blank=True
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    
+    # Progress
+    current_step = models.CharField(max_length=100, blank=True)
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    deleted_rows = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+    
+    def __str__(self):
+        return f"Deletion of {self.organization_name} ({self.status})"
+    
+    @property
+    def progress(self):
+        """Percentage of rows deleted, None until the rows have been counted"""
+        if self.status == 'completed':
+            return 100
+        if self.total_rows is None:
+            return None
+        if not self.total_rows:
+            return 100
+        return min(99, round(self.deleted_rows * 100 / self.total_rows))
+
+
 class BaseRole(models.Model):
     """
     System-defined base roles that serve as templates for organization roles.
@@ -336,6 +507,12 @@ class BaseRole(models.Model):
         if not self.slug:
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
+        invalidate_permission_matrix()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_permission_matrix()
+        return result
 
 
 class OrganizationRoleCustomization(models.Model):
@@ -378,3 +555,12 @@ class OrganizationRoleCustomization(models.Model):
     
     def __str__(self):
         return f"{self.organization.name} - {self.base_role.name} customization"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_permission_matrix(self.organization_id)
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_permission_matrix(self.organization_id)
+        return result
@@ -0,0 +1,264 @@
+"""
+Subscription plan quotas.
+
+Each organization has an OrganizationUsage row holding its property, unit
+and user (active membership) counts. Creating a quota-limited object
+consumes quota with one conditional UPDATE that only increments the
+counter while it is below the limit, so enforcement never scans the
+underlying tables and concurrent creates cannot overshoot. Deletes release
+quota the same way. Both run inside the caller's transaction, so a rolled
+back create or delete also rolls back its counter change.
+
+Limits (plan limits with subscription overrides) and usage snapshots are
+cached. Counters can drift when objects are created or deleted outside the
+API (admin, cascades, scripts); the reconcile_quota_usage command recounts
+them and is meant to be run periodically.
+
+Plans also set per-minute API rate limits for each throttle scope; they are
+resolved and cached alongside the limits and used by
+organizations.throttling.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+QUOTA_RESOURCES = ('properties', 'units', 'users')
+
+# API throttle scopes, see organizations.throttling
+THROTTLE_SCOPES = ('read', 'write', 'bulk', 'export')
+
+# Subscription statuses whose plan (and overrides) apply
+ACTIVE_SUBSCRIPTION_STATUSES = ('active', 'trialing')
+
+LIMITS_KEY = 'organizations:quota_limits:{organization_id}'
+RATES_KEY = 'organizations:throttle_rates:{organization_id}'
+USAGE_KEY = 'organizations:quota_usage:{organization_id}'
+
+
+class QuotaExceeded(APIException):
+    status_code = status.HTTP_403_FORBIDDEN
+    default_code = 'quota_exceeded'
+
+    def __init__(self, resource, limit):
+        self.resource = resource
+        self.limit = limit
+        super().__init__(
+            f"Your subscription plan allows at most {limit} {resource}. "
+            f"Upgrade your plan to add more."
+        )
+
+
+def _cache_timeout():
+    return getattr(settings, 'QUOTA_CACHE_TIMEOUT', 300)
+
+
+def current_plan(organization_id):
+    """
+    Return an organization's (active subscription, plan).
+
+    Organizations without an active subscription fall back to
+    Organization.subscription_plan; either may be None.
+    """
+    from .models import Organization, Subscription
+
+    subscription = Subscription.objects.filter(
+        organization_id=organization_id,
+        status__in=ACTIVE_SUBSCRIPTION_STATUSES
+    ).select_related('plan').order_by('-created_at').first()
+
+    if subscription is not None:
+        return subscription, subscription.plan
+    organization = Organization.objects.filter(pk=organization_id).select_related('subscription_plan').first()
+    return None, organization.subscription_plan if organization else None
+
+
+def compute_quota_limits(organization_id):
+    """
+    Resolve an organization's limits from its current subscription.
+
+    Subscription overrides win over the plan; organizations without an
+    active subscription fall back to Organization.subscription_plan.
+
+    Returns:
+        dict: {resource: int or None}, None meaning unlimited
+    """
+    subscription, plan = current_plan(organization_id)
+
+    limits = {}
+    for resource in QUOTA_RESOURCES:
+        limit = getattr(plan, f'max_{resource}', 0) if plan else 0
+        override = getattr(subscription, f'max_{resource}_override', None) if subscription else None
+        if override is not None:
+            limit = override
+        # 0 means unlimited on plans and overrides alike
+        limits[resource] = limit or None
+    return limits
+
+
+def get_quota_limits(organization_id):
+    """Return the cached limits of an organization"""
+    key = LIMITS_KEY.format(organization_id=organization_id)
+    limits = cache.get(key)
+    if limits is None:
+        limits = compute_quota_limits(organization_id)
+        cache.set(key, limits, _cache_timeout())
+    return limits
+
+
+def default_throttle_rates():
+    return getattr(settings, 'ORGANIZATION_THROTTLE_RATES', {})
+
+
+def compute_throttle_rates(organization_id):
+    """
+    Resolve an organization's API rate limits from its plan.
+
+    Plan rates left empty fall back to ORGANIZATION_THROTTLE_RATES.
+
+    Returns:
+        dict: {scope: requests per minute}
+    """
+    _, plan = current_plan(organization_id)
+    rates = dict(default_throttle_rates())
+    for scope in THROTTLE_SCOPES:
+        rate = getattr(plan, f'{scope}_rate_limit', None) if plan else None
+        if rate is not None:
+            rates[scope] = rate
+    return rates
+
+
+def get_throttle_rates(organization_id):
+    """Return the cached API rate limits of an organization"""
+    key = RATES_KEY.format(organization_id=organization_id)
+    rates = cache.get(key)
+    if rates is None:
+        rates = compute_throttle_rates(organization_id)
+        cache.set(key, rates, _cache_timeout())
+    return rates
+
+
+def invalidate_quota_limits(*organization_ids):
+    """Drop cached limits and rate limits after a plan or subscription change"""
+    cache.delete_many(
+        [LIMITS_KEY.format(organization_id=pk) for pk in organization_ids]
+        + [RATES_KEY.format(organization_id=pk) for pk in organization_ids]
+    )
+
+
+def _invalidate_usage(organization_id):
+    key = USAGE_KEY.format(organization_id=organization_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def get_quota_usage(organization_id):
+    """Return the cached usage counters of an organization"""
+    from .models import OrganizationUsage
+
+    key = USAGE_KEY.format(organization_id=organization_id)
+    usage = cache.get(key)
+    if usage is None:
+        row = OrganizationUsage.objects.filter(organization_id=organization_id).values(*QUOTA_RESOURCES).first()
+        if row is None:
+            reconcile_quota_usage([organization_id])
+            row = OrganizationUsage.objects.filter(organization_id=organization_id).values(*QUOTA_RESOURCES).first()
+        usage = row
+        cache.set(key, usage, _cache_timeout())
+    return usage
+
+
+def consume_quota(organization_id, resource, amount=1):
+    """
+    Count `amount` new objects against an organization's quota.
+
+    Call inside the transaction that creates the objects.
+
+    Raises:
+        QuotaExceeded: when the new total would exceed the limit
+    """
+    from .models import OrganizationUsage
+
+    if organization_id is None:
+        return
+    limit = get_quota_limits(organization_id)[resource]
+    usage = OrganizationUsage.objects.filter(organization_id=organization_id)
+    if limit is not None:
+        usage = usage.filter(**{f'{resource}__lte': limit - amount})
+
+    updated = usage.update(**{resource: F(resource) + amount})
+    if not updated and not OrganizationUsage.objects.filter(organization_id=organization_id).exists():
+        # First quota-limited write for this organization: count once, then retry
+        reconcile_quota_usage([organization_id])
+        updated = usage.update(**{resource: F(resource) + amount})
+    if not updated:
+        raise QuotaExceeded(resource, limit)
+    _invalidate_usage(organization_id)
+
+
+def release_quota(organization_id, **amounts):
+    """
+    Return quota after deleting objects, e.g. release_quota(org_id, units=3).
+
+    Call inside the transaction that deletes the objects.
+    """
+    from .models import OrganizationUsage
+
+    changes = {
+        resource: Greatest(F(resource) - amount, Value(0))
+        for resource, amount in amounts.items() if amount
+    }
+    if changes:
+        OrganizationUsage.objects.filter(organization_id=organization_id).update(**changes)
+        _invalidate_usage(organization_id)
+
+
+def reconcile_quota_usage(organization_ids=None):
+    """
+    Recount usage from the real tables and upsert the counters.
+
+    Uses one grouped COUNT per resource and a single bulk upsert.
+
+    Returns:
+        int: number of organizations reconciled
+    """
+    from properties.models import Property, Unit
+    from .membership_models import OrganizationMembership
+    from .models import Organization, OrganizationUsage
+
+    organizations = Organization.objects.all()
+    properties = Property.objects.values('organization_id')
+    units = Unit.objects.values('property__organization_id')
+    users = OrganizationMembership.objects.filter(is_active=True).values('organization_id')
+    if organization_ids is not None:
+        organizations = organizations.filter(pk__in=organization_ids)
+        properties = properties.filter(organization_id__in=organization_ids)
+        units = units.filter(property__organization_id__in=organization_ids)
+        users = users.filter(organization_id__in=organization_ids)
+
+    counts = {
+        'properties': dict(properties.annotate(n=Count('id')).values_list('organization_id', 'n').order_by()),
+        'units': dict(units.annotate(n=Count('id')).values_list('property__organization_id', 'n').order_by()),
+        'users': dict(users.annotate(n=Count('id')).values_list('organization_id', 'n').order_by()),
+    }
+
+    now = timezone.now()
+    rows = [
+        OrganizationUsage(
+            organization_id=organization_id,
+            reconciled_at=now,
+            **{resource: counts[resource].get(organization_id, 0) for resource in QUOTA_RESOURCES}
+        )
+        for organization_id in organizations.values_list('pk', flat=True)
+    ]
+    OrganizationUsage.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['organization'],
+        update_fields=[*QUOTA_RESOURCES, 'reconciled_at'],
+    )
+    cache.delete_many([USAGE_KEY.format(organization_id=row.organization_id) for row in rows])
+    return len(rows)
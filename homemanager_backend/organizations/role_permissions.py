@@ -0,0 +1,182 @@
+"""
+Resolved role permission matrices.
+
+An organization's effective permissions for every base role (base role
+defaults overridden by that organization's OrganizationRoleCustomization)
+are resolved in one query and cached at two levels:
+
+* a process-local dict, trusted for PERMISSION_MATRIX_LOCAL_TTL seconds
+  before its version is re-checked, and
+* the shared Django cache, keyed by version so that invalidation is a
+  version bump rather than a delete on every worker.
+
+Customization saves/deletes bump the organization's version and BaseRole
+saves/deletes bump the global version. Inside a transaction the version is
+bumped again once it commits: a concurrent request could otherwise rebuild
+the matrix from pre-commit rows and cache it under the new version.
+
+A user's permission stamp adds a per-user version, bumped when the user or
+their memberships change. Access tokens carry the stamp so authentication
+can trust cached users while it is current.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import FilteredRelation, Q
+
+ROLE_PERMISSIONS = (
+    'can_manage_users',
+    'can_manage_billing',
+    'can_manage_properties',
+    'can_manage_tenants',
+    'can_view_reports',
+    'can_manage_roles',
+    'can_manage_system_settings',
+    'can_view_dashboard',
+    'can_manage_tickets',
+    'manage_notices',
+)
+
+GLOBAL_VERSION_KEY = 'organizations:role_permissions:version'
+ORGANIZATION_VERSION_KEY = 'organizations:role_permissions:version:{organization_id}'
+USER_VERSION_KEY = 'organizations:role_permissions:version:user:{user_id}'
+MATRIX_KEY = 'organizations:role_permissions:{organization_id}:{global_version}:{organization_version}'
+
+# Seconds a worker trusts its local copy before re-checking the shared version
+PERMISSION_MATRIX_LOCAL_TTL = 5
+
+_local_matrices = {}
+
+
+def compute_permission_matrix(organization_id):
+    """
+    Resolve every base role's permissions for an organization in one query.
+
+    Returns:
+        dict: {base_role_id: {permission_name: bool, ..., 'is_customized': bool}}
+    """
+    from .models import BaseRole
+
+    fields = []
+    for name in ROLE_PERMISSIONS:
+        fields += [f'default_{name}', f'org_customization__{name}']
+    rows = BaseRole.objects.annotate(
+        org_customization=FilteredRelation(
+            'customizations',
+            condition=Q(customizations__organization_id=organization_id)
+        )
+    ).values('id', 'org_customization__id', *fields)
+
+    matrix = {}
+    for row in rows:
+        permissions = {}
+        for name in ROLE_PERMISSIONS:
+            custom_value = row[f'org_customization__{name}']
+            permissions[name] = row[f'default_{name}'] if custom_value is None else custom_value
+        permissions['is_customized'] = row['org_customization__id'] is not None
+        matrix[row['id']] = permissions
+    return matrix
+
+
+def effective_permissions(base_role, customization=None):
+    """
+    Resolve one base role's permissions from already-loaded instances.
+
+    Returns the same shape as a permission matrix entry, without querying.
+    """
+    permissions = {}
+    for name in ROLE_PERMISSIONS:
+        custom_value = getattr(customization, name) if customization else None
+        permissions[name] = getattr(base_role, f'default_{name}') if custom_value is None else custom_value
+    permissions['is_customized'] = customization is not None
+    return permissions
+
+
+def permission_version(organization_id):
+    """Return the (global, organization) version pair of a permission matrix"""
+    org_key = ORGANIZATION_VERSION_KEY.format(organization_id=organization_id)
+    versions = cache.get_many([GLOBAL_VERSION_KEY, org_key])
+    return versions.get(GLOBAL_VERSION_KEY, 0), versions.get(org_key, 0)
+
+
+def permission_stamp(user_id, organization_id):
+    """
+    Return the permission version stamp of a user in an organization.
+
+    Changes whenever base roles, the organization's customizations or roles,
+    or the user and their memberships change.
+    """
+    org_key = ORGANIZATION_VERSION_KEY.format(organization_id=organization_id)
+    user_key = USER_VERSION_KEY.format(user_id=user_id)
+    versions = cache.get_many([GLOBAL_VERSION_KEY, org_key, user_key])
+    return '.'.join(str(versions.get(key, 0)) for key in (GLOBAL_VERSION_KEY, org_key, user_key))
+
+
+def get_permission_matrix(organization_id):
+    """Return the cached permission matrix for an organization"""
+    now = time.monotonic()
+    entry = _local_matrices.get(organization_id)
+    if entry and entry[0] > now:
+        return entry[2]
+
+    version = permission_version(organization_id)
+    if entry and entry[1] == version:
+        _local_matrices[organization_id] = (now + PERMISSION_MATRIX_LOCAL_TTL, version, entry[2])
+        return entry[2]
+
+    key = MATRIX_KEY.format(
+        organization_id=organization_id, global_version=version[0], organization_version=version[1]
+    )
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = compute_permission_matrix(organization_id)
+        cache.set(key, matrix, getattr(settings, 'ROLE_PERMISSIONS_CACHE_TIMEOUT', 3600))
+    _local_matrices[organization_id] = (now + PERMISSION_MATRIX_LOCAL_TTL, version, matrix)
+    return matrix
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Missing or evicted: restart from a value no earlier version used
+        cache.set(key, time.time_ns(), None)
+
+
+def _invalidate(keys, organization_id=None, clear_local=False):
+    """
+    Bump version keys now, so the current transaction reads fresh values,
+    and again on commit, so nothing cached from pre-commit rows in between
+    stays current.
+    """
+    def bump():
+        for key in keys:
+            _bump(key)
+        if clear_local:
+            _local_matrices.clear()
+        elif organization_id is not None:
+            _local_matrices.pop(organization_id, None)
+
+    bump()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def invalidate_permission_matrix(organization_id=None):
+    """
+    Invalidate cached permission matrices.
+
+    Pass an organization id after changing its customizations, or None after
+    changing base roles, which affects every organization.
+    """
+    if organization_id is None:
+        _invalidate([GLOBAL_VERSION_KEY], clear_local=True)
+    else:
+        _invalidate([ORGANIZATION_VERSION_KEY.format(organization_id=organization_id)], organization_id)
+
+
+def invalidate_user_permissions(*user_ids):
+    """Invalidate permission stamps after users or their memberships change"""
+    _invalidate([USER_VERSION_KEY.format(user_id=user_id) for user_id in user_ids])
@@ -1,6 +1,6 @@
 from rest_framework import serializers
-from .models import Organization, SubscriptionPlan, Subscription, SubscriptionPayment, BaseRole, OrganizationRoleCustomization
-from .membership_models import OrganizationRole, OrganizationMembership
+from .models import Organization, SubscriptionPlan, Subscription, SubscriptionPayment, BaseRole, OrganizationRoleCustomization, OrganizationDeletionJob
+from .membership_models import OrganizationRole, OrganizationMembership, InvitationJob
 
 class OrganizationSerializer(serializers.ModelSerializer):
     """Serializer for the Organization model"""
@@ -17,7 +17,13 @@ class OrganizationSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request or not request.user or not request.user.is_authenticated:
             return None
-            
+
+        # Reuse the membership already loaded for the request
+        from .context import get_organization_context
+        context = get_organization_context(request)
+        if context.organization_id == obj.pk:
+            return context.role.name if context.role else None
+
         try:
             membership = OrganizationMembership.objects.get(
                 organization=obj,
@@ -102,10 +108,7 @@ class OrganizationRoleSerializer(serializers.ModelSerializer):
     
     def get_is_customized(self, obj):
         """Check if this role has any customizations"""
-        return OrganizationRoleCustomization.objects.filter(
-            organization=obj.organization,
-            base_role=obj.base_role
-        ).exists()
+        return obj.is_customized
 
 class OrganizationMembershipSerializer(serializers.ModelSerializer):
     """Serializer for the OrganizationMembership model"""
@@ -129,6 +132,42 @@ class OrganizationMembershipSerializer(serializers.ModelSerializer):
             'last_name': obj.user.last_name
         }
 
+class BulkInvitationEntrySerializer(serializers.Serializer):
+    """One email/role pair of a bulk invitation"""
+    email = serializers.EmailField()
+    role = serializers.IntegerField()
+
+class BulkInvitationSerializer(serializers.Serializer):
+    """Serializer for bulk membership invitations"""
+    invitations = BulkInvitationEntrySerializer(many=True, allow_empty=False)
+    
+    def validate_invitations(self, value):
+        from .invitations import BULK_INVITE_MAX
+        if len(value) > BULK_INVITE_MAX:
+            raise serializers.ValidationError(f"At most {BULK_INVITE_MAX} invitations per request")
+        return value
+
+class InvitationJobSerializer(serializers.ModelSerializer):
+    """Serializer for polling bulk invitation progress"""
+    progress = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = InvitationJob
+        fields = ['id', 'organization', 'status', 'total', 'sent', 'failed', 'progress',
+                 'created_at', 'started_at', 'completed_at']
+        read_only_fields = fields
+
+class OrganizationDeletionJobSerializer(serializers.ModelSerializer):
+    """Serializer for polling organization deletion progress"""
+    progress = serializers.IntegerField(read_only=True, allow_null=True)
+    
+    class Meta:
+        model = OrganizationDeletionJob
+        fields = ['id', 'organization', 'organization_name', 'status', 'current_step',
+                 'total_rows', 'deleted_rows', 'progress', 'error',
+                 'created_at', 'started_at', 'completed_at']
+        read_only_fields = fields
+
 class BaseRoleSerializer(serializers.ModelSerializer):
     """Serializer for the BaseRole model"""
     class Meta:
@@ -0,0 +1,192 @@
+"""
+Background organization deletion.
+
+Deleting an Organization directly cascades through every tenant-scoped
+table in one transaction. Instead, request_organization_deletion() marks
+the organization as deleting (hiding it from Organization.objects), detaches
+its users and deactivates its memberships, so it disappears from every
+view immediately. An OrganizationDeletionJob then removes the dependent
+rows in bounded batches, most dependent tables first, each batch in its own
+short transaction. The process_organization_deletions command runs the
+jobs (from cron, or as a worker with --loop).
+"""
+import logging
+from functools import reduce
+from operator import or_
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Organization, OrganizationDeletionJob
+from .membership_models import OrganizationMembership
+from .quotas import invalidate_quota_limits
+from .role_permissions import invalidate_permission_matrix
+
+logger = logging.getLogger(__name__)
+
+# (model, lookups to the organization) in deletion order: rows that
+# reference other rows go first. Denormalized tables are also matched
+# through their parent in case the organization column is not backfilled.
+TEARDOWN_STEPS = [
+    ('analytics.SMSAnalytics', ('organization',)),
+    ('analytics.PaymentAnalytics', ('organization',)),
+    ('analytics.PropertyMetric', ('property__organization',)),
+    ('analytics.Report', ('organization',)),
+    ('analytics.Dashboard', ('organization',)),
+    ('sms.SMSMessage', ('organization', 'tenant__unit__property__organization')),
+    ('sms.SMSTemplate', ('organization',)),
+    ('sms.SMSProvider', ('organization',)),
+    ('payments.MpesaPayment', ('organization', 'rent_payment__unit__property__organization')),
+    ('payments.RentPayment', ('organization', 'unit__property__organization')),
+    ('payments.LateFeePolicy', ('organization', 'property__organization')),
+    ('notices.NoticeView', ('organization', 'notice__property__organization')),
+    ('notices.Notice', ('property__organization',)),
+    ('maintenance.TicketComment', ('organization', 'ticket__property__organization')),
+    ('maintenance.Ticket', ('property__organization',)),
+    ('maintenance.ServiceProvider', ('organization',)),
+    ('tenants.Lease', ('organization', 'unit__property__organization')),
+    ('tenants.Tenant', ('organization', 'unit__property__organization')),
+    ('properties.QRCode', ('unit__property__organization',)),
+    ('properties.Unit', ('property__organization',)),
+    ('properties.PropertyImage', ('property__organization',)),
+    ('properties.PropertyMpesaConfig', ('property__organization',)),
+    ('properties.Property', ('organization',)),
+    ('properties.MpesaConfig', ('organization',)),
+    ('organizations.SubscriptionPayment', ('organization',)),
+    ('organizations.Subscription', ('organization',)),
+    ('organizations.InvitationJob', ('organization',)),
+    ('organizations.OrganizationMembership', ('organization',)),
+    ('organizations.OrganizationRoleCustomization', ('organization',)),
+    ('organizations.OrganizationRole', ('organization',)),
+    ('organizations.OrganizationUsage', ('organization',)),
+]
+
+# Rows matched to a step's rows by value rather than a foreign key, deleted
+# with each batch of the step: {step: (model, field, field of the step's model)}
+TEARDOWN_DEPENDENTS = {
+    # STK callbacks carry the payment's checkout request id
+    'payments.MpesaPayment': ('payments.MpesaCallback', 'checkout_request_id', 'checkout_request_id'),
+}
+
+
+def deletion_batch_size():
+    return getattr(settings, 'ORGANIZATION_DELETION_BATCH_SIZE', 1000)
+
+
+def step_queryset(label, lookups, organization_id):
+    """Rows of one teardown step that belong to the organization"""
+    model = apps.get_model(label)
+    condition = reduce(or_, (Q(**{f'{lookup}_id': organization_id}) for lookup in lookups))
+    return model._base_manager.filter(condition)
+
+
+def dependent_queryset(label, queryset):
+    """Rows listed in TEARDOWN_DEPENDENTS for the step's rows in queryset"""
+    dependent, field, source = TEARDOWN_DEPENDENTS[label]
+    values = queryset.filter(**{f'{source}__isnull': False}).values(source)
+    return apps.get_model(dependent)._base_manager.filter(**{f'{field}__in': values})
+
+
+def request_organization_deletion(organization, requested_by=None):
+    """
+    Hide an organization and queue its deletion.
+
+    Returns the organization's existing unfinished job if there is one.
+    """
+    with transaction.atomic():
+        existing = OrganizationDeletionJob.objects.filter(
+            organization=organization, status__in=('pending', 'running')
+        ).first()
+        if existing:
+            return existing
+
+        Organization.all_objects.filter(pk=organization.pk).update(is_deleting=True)
+        get_user_model().objects.filter(organization=organization).update(organization=None)
+        OrganizationMembership.objects.filter(organization=organization).update(is_active=False)
+        job = OrganizationDeletionJob.objects.create(
+            organization=organization,
+            organization_name=organization.name,
+            requested_by=requested_by,
+        )
+    organization.is_deleting = True
+    invalidate_quota_limits(organization.pk)
+    # Also changes the permission stamp of every detached user's tokens
+    invalidate_permission_matrix(organization.pk)
+    return job
+
+
+def process_deletion_job(job, batch_size=None):
+    """
+    Delete an organization's rows in batches, then the organization itself.
+
+    Safe to re-run after a failure: every step only deletes what is left.
+
+    Returns:
+        int: number of rows deleted by this run
+    """
+    batch_size = batch_size or deletion_batch_size()
+    organization_id = job.organization_id
+    if organization_id is None:
+        OrganizationDeletionJob.objects.filter(pk=job.pk).update(status='completed', completed_at=timezone.now())
+        return 0
+
+    if job.total_rows is None:
+        # Count once up front so progress can be reported
+        job.total_rows = sum(
+            step_queryset(label, lookups, organization_id).count() for label, lookups in TEARDOWN_STEPS
+        ) + sum(
+            dependent_queryset(label, step_queryset(label, lookups, organization_id)).count()
+            for label, lookups in TEARDOWN_STEPS if label in TEARDOWN_DEPENDENTS
+        ) + 1
+    job.status = 'running'
+    job.error = None
+    job.started_at = job.started_at or timezone.now()
+    job.save(update_fields=['status', 'error', 'started_at', 'total_rows'])
+
+    deleted = 0
+    try:
+        for label, lookups in TEARDOWN_STEPS:
+            job.current_step = label
+            OrganizationDeletionJob.objects.filter(pk=job.pk).update(current_step=label)
+            queryset = step_queryset(label, lookups, organization_id)
+            while True:
+                pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+                if not pks:
+                    break
+                batch = queryset.model._base_manager.filter(pk__in=pks)
+                with transaction.atomic():
+                    count = 0
+                    if label in TEARDOWN_DEPENDENTS:
+                        count, _ = dependent_queryset(label, batch).delete()
+                    count += batch.delete()[0]
+                    OrganizationDeletionJob.objects.filter(pk=job.pk).update(deleted_rows=F('deleted_rows') + count)
+                deleted += count
+
+        with transaction.atomic():
+            count, _ = Organization.all_objects.filter(pk=organization_id).delete()
+            OrganizationDeletionJob.objects.filter(pk=job.pk).update(
+                deleted_rows=F('deleted_rows') + count,
+                current_step='',
+                status='completed',
+                completed_at=timezone.now(),
+            )
+        deleted += count
+    except Exception as exc:
+        logger.exception("Deletion job %s failed at %s", job.pk, job.current_step)
+        OrganizationDeletionJob.objects.filter(pk=job.pk).update(status='failed', error=str(exc))
+
+    job.refresh_from_db()
+    return deleted
+
+
+def process_pending_deletions(batch_size=None, retry_failed=False):
+    """Run every pending or running (and optionally failed) deletion job, oldest first"""
+    statuses = ('pending', 'running', 'failed') if retry_failed else ('pending', 'running')
+    deleted = 0
+    for job in OrganizationDeletionJob.objects.filter(status__in=statuses).order_by('created_at'):
+        deleted += process_deletion_job(job, batch_size)
+    return deleted
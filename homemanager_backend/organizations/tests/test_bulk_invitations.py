@@ -0,0 +1,77 @@
+"""
+Tests for bulk membership invitations and their background delivery.
+"""
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from organizations.models import Organization, BaseRole
+from organizations.membership_models import OrganizationRole, OrganizationMembership, InvitationJob
+from organizations.invitations import process_pending_jobs
+
+User = get_user_model()
+
+
+class BulkInvitationTestCase(TestCase):
+    """Bulk invites create everything up front and deliver in batches"""
+
+    def setUp(self):
+        cache.clear()
+        self.organization = Organization.objects.create(name="Invite Org", slug="invite-org")
+        self.owner = User.objects.create_user(username='invite-owner', password='password',
+                                              organization=self.organization)
+        self.organization.primary_owner = self.owner
+        self.organization.save()
+        base_role = BaseRole.objects.create(name='Member', slug='member', description='Member',
+                                            role_type='member')
+        self.role = OrganizationRole.objects.create(organization=self.organization, base_role=base_role)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.owner)
+        self.url = reverse('organizationmembership-bulk-invite')
+
+    def invite(self, emails):
+        return self.client.post(self.url, {
+            'invitations': [{'email': email, 'role': self.role.pk} for email in emails]
+        }, format='json')
+
+    def test_bulk_invite_and_deliver(self):
+        existing = User.objects.create_user(username='existing', email='Existing@example.com', password='x')
+        response = self.invite(['a@example.com', 'b@example.com', 'existing@example.com'])
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertEqual(response.data['total'], 3)
+
+        memberships = OrganizationMembership.objects.filter(organization=self.organization)
+        self.assertEqual(memberships.count(), 3)
+        self.assertFalse(memberships.filter(is_invited=True).exists())
+        existing.refresh_from_db()
+        self.assertEqual(existing.organization, self.organization)
+        self.assertFalse(User.objects.get(username='a@example.com').has_usable_password())
+
+        self.assertEqual(process_pending_jobs(batch_size=2), 3)
+        self.assertEqual(memberships.filter(is_invited=True).count(), 3)
+
+        response = self.client.get(reverse('invitationjob-detail', args=[response.data['id']]))
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual((response.data['sent'], response.data['failed'], response.data['progress']), (3, 0, 100))
+
+    def test_invalid_entries_write_nothing(self):
+        self.invite(['member@example.com'])
+        response = self.invite(['new@example.com', 'member@example.com', 'new@example.com'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in response.data['invitations']], [1, 2])
+        self.assertFalse(User.objects.filter(username='new@example.com').exists())
+        self.assertEqual(InvitationJob.objects.count(), 1)
+
+    def test_constant_queries(self):
+        # First write also counts usage and resolves plan limits
+        self.invite(['warmup@example.com'])
+        with CaptureQueriesContext(connection) as small:
+            self.invite([f'small{i}@example.com' for i in range(2)])
+        with CaptureQueriesContext(connection) as large:
+            self.invite([f'large{i}@example.com' for i in range(40)])
+        self.assertEqual(len(small), len(large))
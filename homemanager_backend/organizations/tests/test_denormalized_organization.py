@@ -0,0 +1,87 @@
+"""
+Tests for the organization column denormalized onto tenant-scoped tables.
+"""
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from django.test import TestCase
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from organizations.models import Organization
+from properties.models import Property, Unit
+from tenants.models import Tenant, Lease
+from payments.models import RentPayment
+from sms.models import SMSMessage
+
+User = get_user_model()
+
+
+class DenormalizedOrganizationTestCase(TestCase):
+    """Tenant-scoped rows carry their organization without joining through units"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Denormalized Org", slug="denormalized-org")
+        owner = User.objects.create_user(username='denorm-owner', password='password',
+                                         organization=self.organization)
+        prop = Property.objects.create(owner=owner, organization=self.organization, name='Denorm Court',
+                                       address='1 Road', property_type='residential')
+        self.unit = Unit.objects.create(property=prop, unit_number='D1', monthly_rent=Decimal('1000.00'))
+
+    def test_save_fills_organization_from_parent(self):
+        tenant = Tenant.objects.create(name='Tenant', phone_number='0700000001', unit=self.unit,
+                                       move_in_date=date(2025, 1, 1))
+        lease = Lease.objects.create(unit=self.unit, tenant=tenant, start_date=date(2025, 1, 1),
+                                     end_date=date(2025, 12, 31))
+        payment = RentPayment.objects.create(unit=self.unit, tenant=tenant, amount=Decimal('1000.00'),
+                                             due_date=date(2025, 1, 5))
+        message = SMSMessage.objects.create(tenant=tenant, phone_number=tenant.phone_number,
+                                            message_content='Hello')
+
+        for row in (tenant, lease, payment, message):
+            self.assertEqual(row.organization_id, self.organization.pk)
+        self.assertEqual(list(RentPayment.objects.for_organization(self.organization)), [payment])
+
+    def test_save_without_parent_leaves_organization_empty(self):
+        message = SMSMessage.objects.create(phone_number='0700000002', message_content='Broadcast')
+        self.assertIsNone(message.organization_id)
+
+    def test_save_follows_moved_parent(self):
+        other = Organization.objects.create(name="Other Org", slug="other-org")
+        owner = User.objects.create_user(username='other-owner', password='password', organization=other)
+        prop = Property.objects.create(owner=owner, organization=other, name='Other Court',
+                                       address='2 Road', property_type='residential')
+        other_unit = Unit.objects.create(property=prop, unit_number='O1', monthly_rent=Decimal('1000.00'))
+        Tenant.objects.create(name='Tenant', phone_number='0700000004', unit=self.unit,
+                              move_in_date=date(2025, 1, 1))
+
+        tenant = Tenant.objects.get()
+        tenant.unit = other_unit
+        tenant.save(update_fields=['unit'])
+        self.assertEqual(Tenant.objects.get().organization_id, other.pk)
+
+        # Saves that leave the parent alone keep the organization as loaded
+        tenant = Tenant.objects.get()
+        tenant.name = 'Renamed'
+        with self.assertNumQueries(1):
+            tenant.save()
+        self.assertEqual(tenant.organization_id, other.pk)
+
+    def test_backfill_command(self):
+        tenants = Tenant.objects.bulk_create([
+            Tenant(name=f'Tenant {i}', phone_number='0700000003', unit=self.unit,
+                   move_in_date=date(2025, 1, 1))
+            for i in range(3)
+        ])
+        RentPayment.objects.bulk_create([
+            RentPayment(unit=self.unit, tenant=tenant, amount=Decimal('1000.00'), due_date=date(2025, 1, 5))
+            for tenant in tenants
+        ])
+        self.assertEqual(RentPayment.objects.filter(organization__isnull=True).count(), 3)
+
+        out = StringIO()
+        call_command('backfill_organization_ids', '--model', 'tenants.Tenant',
+                     '--model', 'payments.RentPayment', '--chunk-size', '2', stdout=out)
+
+        self.assertIn('payments.RentPayment: updated 3 rows', out.getvalue())
+        self.assertEqual(Tenant.objects.for_organization(self.organization).count(), 3)
+        self.assertEqual(RentPayment.objects.for_organization(self.organization).count(), 3)
@@ -0,0 +1,94 @@
+"""
+Tests for the request-scoped organization context and the permission
+classes that read from it.
+"""
+from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from organizations.models import Organization, BaseRole
+from organizations.membership_models import OrganizationRole, OrganizationMembership
+from organizations.context import resolve_organization_context
+from organizations.role_permissions import _local_matrices
+
+User = get_user_model()
+
+
+class OrganizationContextTestCase(TestCase):
+    """Organization, membership, role and permissions resolve once per request"""
+
+    def setUp(self):
+        cache.clear()
+        _local_matrices.clear()
+        self.organization = Organization.objects.create(name="Context Org", slug="context-org")
+        admin = BaseRole.objects.create(name='Admin', slug='admin', description='Admin',
+                                        role_type='admin', default_can_manage_users=True)
+        member = BaseRole.objects.create(name='Member', slug='member', description='Member',
+                                         role_type='member', default_can_view_dashboard=True)
+        self.admin_role = OrganizationRole.objects.create(organization=self.organization, base_role=admin)
+        self.member_role = OrganizationRole.objects.create(organization=self.organization, base_role=member)
+
+        self.admin = self.create_member('context-admin', self.admin_role)
+        self.member = self.create_member('context-member', self.member_role)
+        self.client = APIClient()
+
+    def create_member(self, username, role):
+        user = User.objects.create_user(username=username, password='password', organization=self.organization)
+        OrganizationMembership.objects.create(organization=self.organization, user=user, role=role)
+        return user
+
+    def test_resolve_in_one_query(self):
+        """Membership, organization and role come from a single join"""
+        user = User.objects.get(pk=self.member.pk)
+        with self.assertNumQueries(1):
+            context = resolve_organization_context(user)
+            self.assertEqual(context.organization, self.organization)
+            self.assertEqual(context.role_type, 'member')
+            self.assertEqual(user.organization.name, 'Context Org')
+
+        # Permissions add one matrix query the first time only
+        with self.assertNumQueries(1):
+            self.assertTrue(context.has_permission('can_view_dashboard'))
+        with self.assertNumQueries(0):
+            self.assertFalse(context.is_admin)
+
+    def test_user_without_membership(self):
+        """Users outside any membership still get their organization"""
+        user = User.objects.create_user(username='loner', password='password', organization=self.organization)
+        user = User.objects.get(pk=user.pk)
+        with self.assertNumQueries(2):
+            context = resolve_organization_context(user)
+        self.assertEqual(context.organization, self.organization)
+        self.assertIsNone(context.role)
+        self.assertFalse(context.is_admin)
+
+    def test_primary_owner_is_admin(self):
+        """The primary owner is an admin without any membership"""
+        owner = User.objects.create_user(username='owner', password='password', organization=self.organization)
+        self.organization.primary_owner = owner
+        self.organization.save()
+        self.assertTrue(resolve_organization_context(owner).is_admin)
+
+    def test_permission_class(self):
+        """IsOrganizationOwnerOrAdmin admits admins and rejects plain members"""
+        url = reverse('organizationrolecustomization-list')
+
+        self.client.force_authenticate(user=self.member)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_memberships_scoped_to_context(self):
+        """Membership listing is filtered to the context organization"""
+        other = Organization.objects.create(name="Other Org", slug="other-org")
+        other_role = OrganizationRole.objects.create(organization=other, base_role=self.member_role.base_role)
+        stranger = User.objects.create_user(username='stranger', password='password', organization=other)
+        OrganizationMembership.objects.create(organization=other, user=stranger, role=other_role)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('organizationmembership-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
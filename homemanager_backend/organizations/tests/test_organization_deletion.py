@@ -0,0 +1,100 @@
+"""
+Tests for background, batched organization deletion.
+"""
+from datetime import date
+from decimal import Decimal
+from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from organizations.models import Organization, BaseRole, OrganizationDeletionJob
+from organizations.membership_models import OrganizationRole, OrganizationMembership
+from organizations.teardown import process_pending_deletions
+from properties.models import Property, Unit
+from tenants.models import Tenant
+from payments.models import RentPayment, MpesaPayment, MpesaCallback
+from sms.models import SMSMessage
+
+User = get_user_model()
+
+
+class OrganizationDeletionTestCase(TestCase):
+    """Deletion hides the organization at once and removes rows in batches"""
+
+    def setUp(self):
+        cache.clear()
+        self.organization = Organization.objects.create(name="Doomed Org", slug="doomed-org")
+        self.other = Organization.objects.create(name="Kept Org", slug="kept-org")
+        self.owner = User.objects.create_user(username='doomed-owner', password='password',
+                                              organization=self.organization)
+        self.organization.primary_owner = self.owner
+        self.organization.save()
+        base_role = BaseRole.objects.create(name='Member', slug='member', description='Member',
+                                            role_type='member')
+        role = OrganizationRole.objects.create(organization=self.organization, base_role=base_role)
+        self.member = User.objects.create_user(username='doomed-member', password='password',
+                                               organization=self.organization)
+        OrganizationMembership.objects.create(organization=self.organization, user=self.member, role=role)
+
+        self.seed(self.organization, self.owner, 3)
+        other_owner = User.objects.create_user(username='kept-owner', password='password', organization=self.other)
+        self.seed(self.other, other_owner, 1)
+        self.client = APIClient()
+
+    def seed(self, organization, owner, unit_count):
+        prop = Property.objects.create(owner=owner, organization=organization, name=f'{organization.name} Court',
+                                       address='Nairobi', property_type='residential')
+        for n in range(unit_count):
+            unit = Unit.objects.create(property=prop, unit_number=str(n), monthly_rent=Decimal('1000.00'))
+            tenant = Tenant.objects.create(name=f'Tenant {n}', phone_number='0700000000', unit=unit,
+                                           move_in_date=date(2025, 1, 1))
+            payment = RentPayment.objects.create(unit=unit, tenant=tenant, amount=Decimal('1000.00'),
+                                                 due_date=date(2025, 1, 5))
+            checkout_request_id = f'ws_CO_{organization.slug}_{n}'
+            MpesaPayment.objects.create(rent_payment=payment, phone_number='254700000000', amount=payment.amount,
+                                        reference=unit.unit_number, description='Rent',
+                                        checkout_request_id=checkout_request_id)
+            MpesaCallback.objects.create(checkout_request_id=checkout_request_id, result_code=0, payload={})
+            SMSMessage.objects.create(tenant=tenant, phone_number='0700000000', message_content='Hi')
+
+    def test_only_primary_owner_can_delete(self):
+        self.client.force_authenticate(user=self.member)
+        response = self.client.delete(reverse('organization-detail', args=[self.organization.pk]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(OrganizationDeletionJob.objects.exists())
+
+    def test_delete_in_background(self):
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.delete(reverse('organization-detail', args=[self.organization.pk]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_url = reverse('organizationdeletionjob-detail', args=[response.data['id']])
+
+        # Hidden right away, rows still present
+        self.assertFalse(Organization.objects.filter(pk=self.organization.pk).exists())
+        self.assertTrue(Organization.all_objects.filter(pk=self.organization.pk).exists())
+        self.assertEqual(User.objects.filter(organization_id=self.organization.pk).count(), 0)
+        self.assertFalse(OrganizationMembership.objects.filter(organization=self.organization, is_active=True).exists())
+        self.assertEqual(Tenant.objects.filter(unit__property__organization_id=self.organization.pk).count(), 3)
+        # Later requests load the detached user
+        self.owner.refresh_from_db()
+        self.client.force_authenticate(user=self.owner)
+        self.assertNotContains(self.client.get(reverse('tenant-list')), 'Tenant 0')
+
+        process_pending_deletions(batch_size=2)
+
+        self.assertFalse(Organization.all_objects.filter(pk=self.organization.pk).exists())
+        self.assertFalse(Property.objects.filter(organization_id=self.organization.pk).exists())
+        self.assertEqual(RentPayment.objects.count(), 1)
+        self.assertEqual(SMSMessage.objects.count(), 1)
+        # Callbacks only reference their payment by checkout request id
+        self.assertEqual(list(MpesaCallback.objects.values_list('checkout_request_id', flat=True)),
+                         ['ws_CO_kept-org_0'])
+        self.assertTrue(User.objects.filter(pk=self.owner.pk).exists())
+
+        response = self.client.get(job_url)
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['progress'], 100)
+        self.assertEqual(response.data['organization_name'], 'Doomed Org')
+        self.assertIsNone(response.data['organization'])
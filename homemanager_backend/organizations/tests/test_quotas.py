@@ -0,0 +1,140 @@
+"""
+Tests for subscription plan quotas and their usage counters.
+"""
+from decimal import Decimal
+from io import StringIO
+from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from organizations.models import Organization, SubscriptionPlan, Subscription, OrganizationUsage, BaseRole
+from organizations.membership_models import OrganizationRole, OrganizationMembership
+from organizations.quotas import get_quota_limits, consume_quota, reconcile_quota_usage, QuotaExceeded
+from properties.models import Property, Unit
+
+User = get_user_model()
+
+
+class QuotaTestCase(TestCase):
+    """Creates are checked against cached counters instead of table scans"""
+
+    def setUp(self):
+        cache.clear()
+        self.plan = SubscriptionPlan.objects.create(name='Starter', slug='starter',
+                                                    max_properties=2, max_units=3, max_users=5)
+        self.organization = Organization.objects.create(name="Quota Org", slug="quota-org",
+                                                        subscription_plan=self.plan)
+        self.user = User.objects.create_user(username='quota-owner', password='password',
+                                             organization=self.organization)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_property(self, name):
+        return self.client.post(reverse('property-list'), {
+            'name': name, 'address': 'Nairobi', 'property_type': 'residential'
+        })
+
+    def test_property_quota(self):
+        self.assertEqual(self.create_property('One').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.create_property('Two').status_code, status.HTTP_201_CREATED)
+
+        response = self.create_property('Three')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Property.objects.filter(organization=self.organization).count(), 2)
+        self.assertEqual(OrganizationUsage.objects.get(organization=self.organization).properties, 2)
+
+        # Deleting frees the slot
+        prop = Property.objects.filter(organization=self.organization).first()
+        self.assertEqual(self.client.delete(reverse('property-detail', args=[prop.pk])).status_code,
+                         status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.create_property('Three').status_code, status.HTTP_201_CREATED)
+
+    def test_unit_quota_and_release(self):
+        prop = Property.objects.create(owner=self.user, organization=self.organization, name='Units',
+                                       address='Nairobi', property_type='residential')
+        for number in ('1', '2', '3'):
+            response = self.client.post(reverse('unit-list'), {
+                'property': prop.pk, 'unit_number': number, 'monthly_rent': '1000.00'
+            })
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(reverse('unit-list'), {
+            'property': prop.pk, 'unit_number': '4', 'monthly_rent': '1000.00'
+        })
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # Deleting the property releases its units too
+        self.client.delete(reverse('property-detail', args=[prop.pk]))
+        usage = OrganizationUsage.objects.get(organization=self.organization)
+        self.assertEqual((usage.properties, usage.units), (0, 0))
+
+    def test_unit_on_other_organization_property(self):
+        """Units cannot be charged to another organization's property"""
+        other = Organization.objects.create(name="Other Org", slug="other-org", subscription_plan=self.plan)
+        prop = Property.objects.create(owner=self.user, organization=other, name='Theirs',
+                                       address='Nairobi', property_type='residential')
+        response = self.client.post(reverse('unit-list'), {
+            'property': prop.pk, 'unit_number': '1', 'monthly_rent': '1000.00'
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Unit.objects.filter(property=prop).exists())
+        self.assertFalse(OrganizationUsage.objects.filter(organization=other, units__gt=0).exists())
+
+    def test_membership_activation_moves_user_quota(self):
+        base_role = BaseRole.objects.create(name='Member', slug='member', description='Member',
+                                            role_type='member')
+        role = OrganizationRole.objects.create(organization=self.organization, base_role=base_role)
+        OrganizationMembership.objects.create(organization=self.organization, user=self.user, role=role)
+        member = User.objects.create_user(username='quota-member', password='password')
+        membership = OrganizationMembership.objects.create(organization=self.organization, user=member, role=role)
+        reconcile_quota_usage([self.organization.pk])
+        url = reverse('organizationmembership-detail', args=[membership.pk])
+        usage = OrganizationUsage.objects.filter(organization=self.organization)
+
+        self.client.patch(url, {'is_active': False})
+        self.assertEqual(usage.get().users, 1)
+        self.client.patch(url, {'is_active': False})
+        self.assertEqual(usage.get().users, 1)
+        self.client.patch(url, {'is_active': True})
+        self.assertEqual(usage.get().users, 2)
+
+    def test_subscription_override(self):
+        self.assertEqual(get_quota_limits(self.organization.pk)['properties'], 2)
+        subscription = Subscription.objects.create(organization=self.organization, plan=self.plan,
+                                                   max_properties_override=0)
+        self.assertIsNone(get_quota_limits(self.organization.pk)['properties'])
+
+        subscription.max_properties_override = 10
+        subscription.save()
+        self.assertEqual(get_quota_limits(self.organization.pk)['properties'], 10)
+
+        self.plan.max_units = 50
+        self.plan.save()
+        self.assertEqual(get_quota_limits(self.organization.pk)['units'], 50)
+
+    def test_consume_does_not_count_rows(self):
+        consume_quota(self.organization.pk, 'properties')
+        with self.assertNumQueries(1):
+            consume_quota(self.organization.pk, 'properties')
+        with self.assertNumQueries(2), self.assertRaises(QuotaExceeded):
+            consume_quota(self.organization.pk, 'properties')
+
+    def test_reconcile_command(self):
+        prop = Property.objects.create(owner=self.user, organization=self.organization, name='Drift',
+                                       address='Nairobi', property_type='residential')
+        Unit.objects.bulk_create([
+            Unit(property=prop, unit_number=str(n), monthly_rent=Decimal('1000.00')) for n in range(2)
+        ])
+        OrganizationUsage.objects.create(organization=self.organization, properties=7, units=0, users=0)
+
+        call_command('reconcile_quota_usage', '--organization', str(self.organization.pk), stdout=StringIO())
+
+        usage = OrganizationUsage.objects.get(organization=self.organization)
+        self.assertEqual((usage.properties, usage.units, usage.users), (1, 2, 0))
+        self.assertIsNotNone(usage.reconciled_at)
+
+        response = self.client.get(reverse('organization-quota', args=[self.organization.pk]))
+        self.assertEqual(response.data['usage'], {'properties': 1, 'units': 2, 'users': 0})
+        self.assertEqual(response.data['limits'], {'properties': 2, 'units': 3, 'users': 5})
@@ -0,0 +1,127 @@
+"""
+Tests for the cached effective-permission matrix of organization roles.
+"""
+from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+from organizations.models import Organization, BaseRole, OrganizationRoleCustomization
+from organizations.membership_models import OrganizationRole
+from organizations.role_permissions import _local_matrices, permission_version, get_permission_matrix
+
+User = get_user_model()
+
+
+class RolePermissionMatrixTestCase(TestCase):
+    """Permission reads come from the cached matrix and follow invalidations"""
+
+    def setUp(self):
+        cache.clear()
+        _local_matrices.clear()
+        self.organization = Organization.objects.create(name="Matrix Org", slug="matrix-org")
+        self.other_organization = Organization.objects.create(name="Other Org", slug="other-org")
+        self.manager = BaseRole.objects.create(
+            name='Manager', slug='manager', description='Manager', role_type='manager',
+            default_can_manage_properties=True, default_can_view_reports=True
+        )
+        self.admin = BaseRole.objects.create(
+            name='Admin', slug='admin', description='Admin', role_type='admin',
+            default_can_manage_users=True
+        )
+        self.role = OrganizationRole.objects.create(organization=self.organization, base_role=self.manager)
+
+        self.user = User.objects.create_user(
+            username='matrix-owner', password='password', organization=self.organization
+        )
+        self.organization.primary_owner = self.user
+        self.organization.save()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_permissions_resolved_once(self):
+        """All permissions of all roles come from a single query"""
+        with self.assertNumQueries(1):
+            self.assertTrue(self.role.can_manage_properties)
+            self.assertFalse(self.role.can_manage_users)
+            self.assertFalse(self.role.is_customized)
+            admin_role = OrganizationRole(organization=self.organization, base_role=self.admin)
+            self.assertTrue(admin_role.can_manage_users)
+
+        role = OrganizationRole.objects.get(pk=self.role.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(role.can_view_reports)
+
+    def test_customization_invalidates(self):
+        """Customizing and resetting a role are visible immediately"""
+        self.assertFalse(self.role.can_manage_tenants)
+
+        response = self.client.post(reverse('organizationrolecustomization-customize-role'), {
+            'base_role': self.manager.pk, 'can_manage_tenants': True, 'can_view_reports': False
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(self.role.can_manage_tenants)
+        self.assertFalse(self.role.can_view_reports)
+        self.assertTrue(self.role.is_customized)
+
+        # Other organizations keep the defaults
+        other_role = OrganizationRole(organization=self.other_organization, base_role=self.manager)
+        self.assertFalse(other_role.can_manage_tenants)
+
+        response = self.client.delete(
+            reverse('organizationrolecustomization-reset-role') + f'?base_role={self.manager.pk}'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.role.can_manage_tenants)
+        self.assertTrue(self.role.can_view_reports)
+
+    def test_base_role_save_invalidates(self):
+        """Changing a base role default reaches every organization"""
+        self.assertFalse(self.role.can_manage_tickets)
+        self.manager.default_can_manage_tickets = True
+        self.manager.save()
+        self.assertTrue(self.role.can_manage_tickets)
+
+    def test_customization_model_save_invalidates(self):
+        """Customizations saved outside the API also invalidate the matrix"""
+        self.assertTrue(self.role.can_manage_properties)
+        OrganizationRoleCustomization.objects.create(
+            organization=self.organization, base_role=self.manager, can_manage_properties=False
+        )
+        self.assertFalse(self.role.can_manage_properties)
+
+    def test_invalidated_again_on_commit(self):
+        """A matrix cached from pre-commit rows is dropped when the change commits"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.manager.default_can_manage_tickets = True
+            self.manager.save()
+            version = permission_version(self.organization.pk)
+            # A concurrent reader caches under the bumped version meanwhile
+            get_permission_matrix(self.organization.pk)
+        self.assertNotEqual(permission_version(self.organization.pk), version)
+        self.assertNotIn(self.organization.pk, _local_matrices)
+
+    def test_available_roles_constant_queries(self):
+        """available_roles creates missing roles once and then runs a fixed number of queries"""
+        url = reverse('organizationrolecustomization-available-roles')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(OrganizationRole.objects.filter(organization=self.organization, base_role=self.admin).exists())
+
+        for i in range(3):
+            base_role = BaseRole.objects.create(name=f'Extra {i}', slug=f'extra-{i}', description='Extra',
+                                                role_type='member')
+            OrganizationRole.objects.create(organization=self.organization, base_role=base_role)
+        OrganizationRoleCustomization.objects.create(
+            organization=self.organization, base_role=self.manager, can_manage_tenants=True
+        )
+
+        # Context (membership + organization) plus base roles, customizations and roles
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 5)
+        manager = next(item for item in response.data if item['base_role']['id'] == self.manager.pk)
+        self.assertTrue(manager['is_customized'])
+        self.assertTrue(manager['organization_role']['is_customized'])
+        self.assertTrue(manager['organization_role']['can_manage_tenants'])
+        self.assertTrue(manager['organization_role']['can_view_reports'])
@@ -0,0 +1,103 @@
+"""
+Tests for per-organization token bucket throttling.
+"""
+from unittest import mock
+from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from organizations.models import Organization, SubscriptionPlan
+from organizations.throttling import OrganizationRateThrottle
+
+User = get_user_model()
+
+
+class OrganizationThrottleTestCase(TestCase):
+    """Organizations draw from their own buckets at their plan's rates"""
+
+    def setUp(self):
+        cache.clear()
+        self.plan = SubscriptionPlan.objects.create(name='Starter', slug='starter',
+                                                    read_rate_limit=3, bulk_rate_limit=1)
+        self.organization = Organization.objects.create(name="Busy Org", slug="busy-org",
+                                                        subscription_plan=self.plan)
+        self.other = Organization.objects.create(name="Quiet Org", slug="quiet-org",
+                                                 subscription_plan=self.plan)
+        self.user = User.objects.create_user(username='busy-user', password='password',
+                                             organization=self.organization)
+        self.colleague = User.objects.create_user(username='busy-colleague', password='password',
+                                                  organization=self.organization)
+        self.neighbour = User.objects.create_user(username='quiet-user', password='password',
+                                                  organization=self.other)
+
+    def get_me(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client.get(reverse('user-me'))
+
+    def test_bucket_shared_by_organization(self):
+        response = self.get_me(self.user)
+        self.assertEqual(response['X-RateLimit-Scope'], 'read')
+        self.assertEqual(response['X-RateLimit-Limit'], '3')
+        self.assertEqual(response['X-RateLimit-Remaining'], '2')
+        self.get_me(self.colleague)
+        self.get_me(self.user)
+
+        response = self.get_me(self.colleague)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['X-RateLimit-Remaining'], '0')
+        self.assertIn('Retry-After', response)
+
+        # Other organizations are unaffected
+        self.assertEqual(self.get_me(self.neighbour).status_code, status.HTTP_200_OK)
+
+    def test_scoped_action(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = reverse('smsmessage-send-bulk')
+        response = client.post(url, {}, format='json')
+        self.assertEqual(response['X-RateLimit-Scope'], 'bulk')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(client.post(url, {}, format='json').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # Reads have their own bucket
+        self.assertEqual(self.get_me(self.user).status_code, status.HTTP_200_OK)
+
+    def test_plan_change_updates_rates(self):
+        self.assertEqual(self.get_me(self.user)['X-RateLimit-Limit'], '3')
+        self.plan.read_rate_limit = None
+        self.plan.save()
+        self.assertEqual(self.get_me(self.user)['X-RateLimit-Limit'], '600')
+
+    def test_refill_interval(self):
+        """A drained bucket gets a token back every 1/rate of a minute"""
+        timer = mock.Mock(return_value=1000.0)
+        with mock.patch.object(OrganizationRateThrottle, 'timer', timer):
+            for _ in range(3):
+                self.assertEqual(self.get_me(self.user).status_code, status.HTTP_200_OK)
+            timer.return_value = 1019.0
+            response = self.get_me(self.user)
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response['Retry-After'], '1')
+
+            timer.return_value = 1020.0
+            self.assertEqual(self.get_me(self.user).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.get_me(self.colleague).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_burst_after_idle(self):
+        """Idle time refills the bucket in proportion, up to the full rate"""
+        timer = mock.Mock(return_value=1000.0)
+        with mock.patch.object(OrganizationRateThrottle, 'timer', timer):
+            for _ in range(3):
+                self.get_me(self.user)
+            timer.return_value = 1040.0
+            for _ in range(2):
+                self.assertEqual(self.get_me(self.user).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.get_me(self.user).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+            # A long gap refills to the rate, not beyond it
+            timer.return_value = 2000.0
+            for _ in range(3):
+                self.assertEqual(self.get_me(self.colleague).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.get_me(self.colleague).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
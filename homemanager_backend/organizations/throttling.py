@@ -0,0 +1,151 @@
+"""
+Per-organization API throttling.
+
+OrganizationRateThrottle keeps one token bucket per organization and scope
+in the shared cache, so one organization's traffic cannot use up another's.
+Each request takes a token from its scope's bucket; buckets hold a minute's
+worth of requests and get a token back every 1/rate of a minute at the
+organization's per-minute rate (see quotas.get_throttle_rates).
+
+A bucket is stored as (tokens, last refill time). Each request first adds
+the tokens earned since the last refill, elapsed * rate / BUCKET_PERIOD,
+capped at the rate, so a bucket that sat idle comes back full and a burst
+after the gap is allowed. Buckets left untouched for BUCKET_PERIOD expire,
+which is the same as full.
+
+The read-refill-take-write cycle must be atomic across workers. On Redis it
+runs as one Lua script; other cache backends serialize it with a short lock
+taken by cache.add.
+
+Scopes are:
+
+* read / write - picked from the HTTP method
+* bulk / export - set per viewset action in organization_throttle_scopes
+
+Users without an organization are throttled per user, anonymous requests
+per client IP, both at the default rates. The bucket state of the request
+is exposed as X-RateLimit-* headers by ThrottleHeadersMiddleware.
+"""
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from .quotas import default_throttle_rates, get_throttle_rates
+
+BUCKET_KEY = 'organizations:throttle:{scope}:{ident}'
+
+# Seconds a bucket takes to refill completely
+BUCKET_PERIOD = 60
+
+# Lock attempts (LOCK_WAIT seconds apart) before updating a bucket unlocked
+LOCK_ATTEMPTS = 20
+LOCK_WAIT = 0.005
+
+# KEYS[1] bucket; ARGV rate, now, period. Returns {allowed, tokens left}
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local now = tonumber(ARGV[2])
+local period = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = rate
+if state[1] then
+    local elapsed = math.max(now - tonumber(state[2]), 0)
+    tokens = math.min(rate, tonumber(state[1]) + elapsed * rate / period)
+    tokens = math.floor(tokens * 1e6 + 0.5) / 1e6
+end
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', ARGV[2])
+redis.call('EXPIRE', KEYS[1], math.ceil(period))
+return {allowed, tostring(tokens)}
+"""
+
+
+def refill(state, rate, now):
+    """Return the tokens in a bucket stored as state = (tokens, ts) at now"""
+    if state is None:
+        return rate
+    tokens, ts = state
+    # Rounded so float error can't leave a bucket a hair short of a token
+    return round(min(rate, tokens + max(now - ts, 0) * rate / BUCKET_PERIOD), 6)
+
+
+class OrganizationRateThrottle(BaseThrottle):
+    """Token bucket throttle keyed by organization and scope"""
+    timer = time.time
+
+    def get_scope(self, request, view):
+        scopes = getattr(view, 'organization_throttle_scopes', {})
+        scope = scopes.get(getattr(view, 'action', None))
+        if scope:
+            return scope
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def get_bucket(self, request):
+        """Return (ident, rates) of the bucket the request draws from"""
+        user = request.user
+        if user and user.is_authenticated:
+            if user.organization_id:
+                return f'organization:{user.organization_id}', get_throttle_rates(user.organization_id)
+            return f'user:{user.pk}', default_throttle_rates()
+        return f'ip:{self.get_ident(request)}', default_throttle_rates()
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        ident, rates = self.get_bucket(request)
+        self.rate = rates.get(scope)
+        if not self.rate:
+            # No rate (or 0) for this scope means unthrottled
+            return True
+
+        key = BUCKET_KEY.format(scope=scope, ident=ident)
+        self.now = self.timer()
+        cache = caches[DEFAULT_CACHE_ALIAS]
+        if isinstance(cache, RedisCache):
+            allowed, self.remaining = self.take_redis(cache, key)
+        else:
+            allowed, self.remaining = self.take_locked(cache, key)
+        self.tokens = int(self.remaining)
+
+        http_request = getattr(request, '_request', request)
+        http_request._throttle_status = (scope, self.rate, self.tokens)
+        return allowed
+
+    def take_redis(self, cache, key):
+        """Refill and take a token in one Lua script; returns (allowed, tokens left)"""
+        key = cache.make_and_validate_key(key)
+        client = cache._cache.get_client(key, write=True)
+        allowed, tokens = client.register_script(TAKE_SCRIPT)(
+            keys=[key], args=[self.rate, repr(self.now), BUCKET_PERIOD])
+        return bool(allowed), float(tokens)
+
+    def take_locked(self, cache, key):
+        """Refill and take a token under a cache.add lock; returns (allowed, tokens left)"""
+        lock_key = f'{key}:lock'
+        for _ in range(LOCK_ATTEMPTS):
+            if cache.add(lock_key, 1, 1):
+                break
+            time.sleep(LOCK_WAIT)
+        else:
+            # Lock holder died or is stuck: don't stall the request on it
+            lock_key = None
+        try:
+            tokens = refill(cache.get(key), self.rate, self.now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            cache.set(key, (tokens, self.now), BUCKET_PERIOD)
+        finally:
+            if lock_key:
+                cache.delete(lock_key)
+        return allowed, tokens
+
+    def wait(self):
+        """Seconds until the bucket has a whole token again"""
+        return round((1 - self.remaining % 1) * BUCKET_PERIOD / self.rate, 6)
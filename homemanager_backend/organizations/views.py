@@ -3,8 +3,9 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError, NotFound
 from django.shortcuts import get_object_or_404
-from .models import Organization, SubscriptionPlan, Subscription, SubscriptionPayment, BaseRole, OrganizationRoleCustomization
-from .membership_models import OrganizationRole, OrganizationMembership
+from django.db import transaction
+from .models import Organization, SubscriptionPlan, Subscription, SubscriptionPayment, BaseRole, OrganizationRoleCustomization, OrganizationDeletionJob
+from .membership_models import OrganizationRole, OrganizationMembership, InvitationJob
 from .serializers import (
     OrganizationSerializer, 
     SubscriptionPlanSerializer,
@@ -13,11 +14,19 @@ from .serializers import (
     OrganizationRoleSerializer,
     OrganizationMembershipSerializer,
     BaseRoleSerializer,
-    OrganizationRoleCustomizationSerializer
+    OrganizationRoleCustomizationSerializer,
+    BulkInvitationSerializer,
+    InvitationJobSerializer,
+    OrganizationDeletionJobSerializer
 )
 from .permissions import IsOrganizationOwnerOrAdmin
+from .context import OrganizationContextMixin
+from .role_permissions import effective_permissions
+from .invitations import create_invitation_job
+from .teardown import request_organization_deletion
+from .quotas import consume_quota, release_quota, get_quota_limits, get_quota_usage
 
-class OrganizationViewSet(viewsets.ModelViewSet):
+class OrganizationViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing Organization instances"""
     queryset = Organization.objects.all()
     serializer_class = OrganizationSerializer
@@ -29,11 +38,12 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         Only global superusers without an organization get all organizations.
         """
         user = self.request.user
-        if user.is_superuser and not user.organization:
+        if user.is_superuser and not user.organization_id:
             return Organization.objects.all()
         
-        if user.organization:
-            return Organization.objects.filter(id=user.organization.id)
+        organization = self.organization_context.organization
+        if organization:
+            return Organization.objects.filter(id=organization.pk)
         return Organization.objects.none()
     
     def perform_create(self, serializer):
@@ -44,6 +54,30 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         user = self.request.user
         user.organization = organization
         user.save()
+    
+    def destroy(self, request, *args, **kwargs):
+        """
+        Queue the organization for deletion.
+        
+        The organization is hidden immediately and its data is removed in the
+        background; poll the returned job for progress.
+        """
+        organization = self.get_object()
+        if not (request.user.is_superuser or organization.primary_owner_id == request.user.pk):
+            return Response({'error': 'Only the primary owner can delete an organization'},
+                            status=status.HTTP_403_FORBIDDEN)
+        
+        job = request_organization_deletion(organization, request.user)
+        return Response(OrganizationDeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=True, methods=['get'])
+    def quota(self, request, pk=None):
+        """Plan limits and current usage (None means unlimited)"""
+        organization = self.get_object()
+        return Response({
+            'limits': get_quota_limits(organization.pk),
+            'usage': get_quota_usage(organization.pk),
+        })
 
 class SubscriptionPlanViewSet(viewsets.ModelViewSet):
     """ViewSet for viewing and editing SubscriptionPlan instances"""
@@ -58,7 +92,7 @@ class SubscriptionPlanViewSet(viewsets.ModelViewSet):
             return SubscriptionPlan.objects.all()
         return SubscriptionPlan.objects.filter(is_active=True, is_public=True)
 
-class SubscriptionViewSet(viewsets.ModelViewSet):
+class SubscriptionViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing Subscription instances"""
     queryset = Subscription.objects.all()
     serializer_class = SubscriptionSerializer
@@ -70,21 +104,22 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
         Only global superusers without an organization get all subscriptions.
         """
         user = self.request.user
-        if user.is_superuser and not user.organization:
+        if user.is_superuser and not user.organization_id:
             return Subscription.objects.all()
         
-        if user.organization:
-            return Subscription.objects.filter(organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            return Subscription.objects.filter(organization=organization)
         return Subscription.objects.none()
     
     def perform_create(self, serializer):
         """Set organization when creating a new subscription"""
         if not self.request.user.is_superuser and 'organization' not in serializer.validated_data:
-            serializer.save(organization=self.request.user.organization)
+            serializer.save(organization=self.organization_context.organization)
         else:
             serializer.save()
 
-class SubscriptionPaymentViewSet(viewsets.ModelViewSet):
+class SubscriptionPaymentViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing SubscriptionPayment instances"""
     queryset = SubscriptionPayment.objects.all()
     serializer_class = SubscriptionPaymentSerializer
@@ -96,14 +131,15 @@ class SubscriptionPaymentViewSet(viewsets.ModelViewSet):
         Only global superusers without an organization get all payments.
         """
         user = self.request.user
-        if user.is_superuser and not user.organization:
+        if user.is_superuser and not user.organization_id:
             return SubscriptionPayment.objects.all()
         
-        if user.organization:
-            return SubscriptionPayment.objects.filter(organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            return SubscriptionPayment.objects.filter(organization=organization)
         return SubscriptionPayment.objects.none()
 
-class OrganizationRoleViewSet(viewsets.ModelViewSet):
+class OrganizationRoleViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing OrganizationRole instances"""
     queryset = OrganizationRole.objects.all()
     serializer_class = OrganizationRoleSerializer
@@ -115,32 +151,34 @@ class OrganizationRoleViewSet(viewsets.ModelViewSet):
         Only global superusers without an organization get all roles.
         """
         user = self.request.user
-        if user.is_superuser and not user.organization:
+        if user.is_superuser and not user.organization_id:
             return OrganizationRole.objects.all()
         
-        if user.organization:
-            return OrganizationRole.objects.filter(organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            return OrganizationRole.objects.filter(organization=organization).select_related('base_role')
         return OrganizationRole.objects.none()
     
     def perform_create(self, serializer):
         """Set organization when creating a new role"""
         if not self.request.user.is_superuser and 'organization' not in serializer.validated_data:
-            serializer.save(organization=self.request.user.organization)
+            serializer.save(organization=self.organization_context.organization)
         else:
             serializer.save()
     def perform_update(self, serializer):
         """Ensure users can only update roles from their organization"""
         obj = self.get_object()
-        if not self.request.user.is_superuser and obj.organization != self.request.user.organization:
+        if not self.request.user.is_superuser and obj.organization_id != self.organization_context.organization_id:
             raise ValidationError("You can only update roles for your organization")
         serializer.save()
 
-class OrganizationMembershipViewSet(viewsets.ModelViewSet):
+class OrganizationMembershipViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing OrganizationMembership instances"""
     # Define as empty queryset - will be filtered in get_queryset
     queryset = OrganizationMembership.objects.none()  
     serializer_class = OrganizationMembershipSerializer
     permission_classes = [permissions.IsAuthenticated]
+    organization_throttle_scopes = {'bulk_invite': 'bulk'}
     
     def get_queryset(self):
         """
@@ -151,23 +189,16 @@ class OrganizationMembershipViewSet(viewsets.ModelViewSet):
         if not user.is_authenticated:
             return OrganizationMembership.objects.none()
             
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.info(f"User {user.username} requesting memberships, is_superuser={user.is_superuser}")
+        memberships = OrganizationMembership.objects.select_related('user', 'role', 'role__base_role')
         
         # Only allow true system admins (superusers without an organization) to see all memberships
-        if user.is_superuser and not user.organization:
-            logger.info(f"Global admin {user.username} gets all memberships")
-            return OrganizationMembership.objects.all()
-        
-        if user.organization:
-            logger.info(f"User {user.username} filtered to organization {user.organization.id}")
-            # Make extra sure we're filtering properly
-            filtered_memberships = OrganizationMembership.objects.filter(organization=user.organization)
-            logger.info(f"Found {filtered_memberships.count()} memberships for user's organization")
-            return filtered_memberships
-        
-        logger.warning(f"User {user.username} has no organization, returning empty queryset")
+        if user.is_superuser and not user.organization_id:
+            return memberships
+        
+        organization = self.organization_context.organization
+        if organization:
+            return memberships.filter(organization=organization)
+        
         return OrganizationMembership.objects.none()
     
     def get_object(self):
@@ -175,12 +206,13 @@ class OrganizationMembershipViewSet(viewsets.ModelViewSet):
         obj = super().get_object()
         
         # Allow global superusers (without organization) to access any membership
-        if self.request.user.is_superuser and not self.request.user.organization:
+        if self.request.user.is_superuser and not self.request.user.organization_id:
             return obj
             
         # For all other users (including superusers with an organization), check that 
         # the membership belongs to their organization
-        if not self.request.user.organization or obj.organization != self.request.user.organization:
+        organization_id = self.organization_context.organization_id
+        if not organization_id or obj.organization_id != organization_id:
             import logging
             logger = logging.getLogger(__name__)
             logger.warning(f"User {self.request.user.username} attempted to access membership {obj.id} from another organization")
@@ -193,23 +225,65 @@ class OrganizationMembershipViewSet(viewsets.ModelViewSet):
         """Ensure new memberships are associated with the user's organization"""
         # If organization is not provided in request data, use the user's organization
         if 'organization' not in self.request.data and not self.request.user.is_superuser:
-            if self.request.user.organization:
-                organization = self.request.user.organization
-                serializer.save(organization=organization)
-            else:
+            organization = self.organization_context.organization
+            if not organization:
                 raise ValidationError("User has no associated organization")
         else:
             # Make sure the provided organization matches the user's organization
-            if not self.request.user.is_superuser and int(self.request.data.get('organization')) != self.request.user.organization.id:
+            if not self.request.user.is_superuser and int(self.request.data.get('organization')) != self.organization_context.organization_id:
                 raise ValidationError("You can only create memberships for your organization")
-            serializer.save()
+            organization = serializer.validated_data.get('organization', self.organization_context.organization)
+            if organization is None:
+                raise ValidationError("organization is required")
         
         # Additional validation: ensure the role belongs to the same organization
-        membership = serializer.instance
-        if membership.role and hasattr(membership.role, 'organization') and membership.role.organization != membership.organization:
-            # If role and membership organizations don't match, this is a security issue
-            membership.delete()  # Clean up the invalid membership
+        role = serializer.validated_data.get('role')
+        if role and role.organization_id != organization.pk:
             raise ValidationError("The role must belong to the same organization as the membership")
+        
+        with transaction.atomic():
+            if serializer.validated_data.get('is_active', True):
+                consume_quota(organization.pk, 'users')
+            serializer.save(organization=organization)
+    
+    def perform_update(self, serializer):
+        """Move the user quota when a membership is activated, deactivated or moved"""
+        was_active = serializer.instance.is_active
+        old_organization_id = serializer.instance.organization_id
+        with transaction.atomic():
+            membership = serializer.save()
+            if (membership.is_active, membership.organization_id) != (was_active, old_organization_id):
+                if membership.is_active:
+                    consume_quota(membership.organization_id, 'users')
+                if was_active:
+                    release_quota(old_organization_id, users=1)
+    
+    def perform_destroy(self, instance):
+        """Delete the membership and release its user quota"""
+        with transaction.atomic():
+            instance.delete()
+            if instance.is_active:
+                release_quota(instance.organization_id, users=1)
+    
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsOrganizationOwnerOrAdmin])
+    def bulk_invite(self, request):
+        """
+        Invite many users at once.
+        
+        Creates the users and memberships in one transaction and queues the
+        invitation emails; poll the returned job for delivery progress.
+        """
+        organization = self.organization_context.organization
+        if not organization:
+            return Response({'error': 'User has no associated organization'}, status=400)
+        
+        serializer = BulkInvitationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        job, errors = create_invitation_job(organization, request.user, serializer.validated_data['invitations'])
+        if errors:
+            return Response({'error': 'Some invitations are invalid', 'invitations': errors}, status=400)
+        return Response(InvitationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=True, methods=['post'])
     def send_invitation(self, request, pk=None):
@@ -218,6 +292,36 @@ class OrganizationMembershipViewSet(viewsets.ModelViewSet):
         membership.send_invitation()
         return Response({'status': 'invitation sent'}, status=status.HTTP_200_OK)
 
+class InvitationJobViewSet(OrganizationContextMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet for polling bulk invitation jobs"""
+    queryset = InvitationJob.objects.all()
+    serializer_class = InvitationJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        """Filter jobs to the user's organization"""
+        user = self.request.user
+        if user.is_superuser and not user.organization_id:
+            return InvitationJob.objects.all()
+        
+        organization = self.organization_context.organization
+        if organization:
+            return InvitationJob.objects.filter(organization=organization)
+        return InvitationJob.objects.none()
+
+class OrganizationDeletionJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """ViewSet for polling organization deletion jobs"""
+    queryset = OrganizationDeletionJob.objects.all()
+    serializer_class = OrganizationDeletionJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        """Requesters see their own jobs; the organization is already hidden from them"""
+        user = self.request.user
+        if user.is_superuser:
+            return OrganizationDeletionJob.objects.all()
+        return OrganizationDeletionJob.objects.filter(requested_by=user)
+
 class BaseRoleViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing BaseRole instances (read-only)"""
     queryset = BaseRole.objects.all()
@@ -228,7 +332,7 @@ class BaseRoleViewSet(viewsets.ReadOnlyModelViewSet):
         """Return all base roles - they are system-wide"""
         return BaseRole.objects.all().order_by('name')
 
-class OrganizationRoleCustomizationViewSet(viewsets.ModelViewSet):
+class OrganizationRoleCustomizationViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for managing organization-specific role customizations"""
     queryset = OrganizationRoleCustomization.objects.all()
     serializer_class = OrganizationRoleCustomizationSerializer
@@ -237,70 +341,87 @@ class OrganizationRoleCustomizationViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filter customizations to current user's organization"""
         user = self.request.user
-        if user.is_superuser and not user.organization:
+        if user.is_superuser and not user.organization_id:
             return OrganizationRoleCustomization.objects.all()
         
-        if user.organization:
-            return OrganizationRoleCustomization.objects.filter(organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            return OrganizationRoleCustomization.objects.filter(organization=organization)
         return OrganizationRoleCustomization.objects.none()
     
     def perform_create(self, serializer):
         """Ensure customization is created for the user's organization"""
         if not self.request.user.is_superuser:
-            if not self.request.user.organization:
+            organization = self.organization_context.organization
+            if not organization:
                 raise ValidationError("User has no associated organization")
-            serializer.save(organization=self.request.user.organization)
+            serializer.save(organization=organization)
         else:
             serializer.save()
     
     def perform_update(self, serializer):
         """Ensure users can only update their organization's customizations"""
         obj = self.get_object()
-        if not self.request.user.is_superuser and obj.organization != self.request.user.organization:
+        if not self.request.user.is_superuser and obj.organization_id != self.organization_context.organization_id:
             raise ValidationError("You can only update your organization's role customizations")
         serializer.save()
     
     @action(detail=False, methods=['get'])
     def available_roles(self, request):
-        """Get all base roles with their current customization status"""
-        user = request.user
-        if not user.organization:
+        """
+        Get all base roles with their current customization status.
+        
+        Base roles, the organization's customizations and its roles are
+        loaded in three queries; missing organization roles are created with
+        one bulk insert and permissions are resolved in memory.
+        """
+        organization = self.organization_context.organization
+        if not organization:
             return Response({'error': 'User has no associated organization'}, status=400)
         
-        base_roles = BaseRole.objects.all()
-        result = []
+        base_roles = list(BaseRole.objects.all())
+        customizations = {
+            customization.base_role_id: customization
+            for customization in OrganizationRoleCustomization.objects.filter(organization=organization)
+        }
+        org_roles = {
+            role.base_role_id: role
+            for role in OrganizationRole.objects.filter(organization=organization)
+        }
         
-        for base_role in base_roles:
-            # Check if there's a customization for this role
-            try:
-                customization = OrganizationRoleCustomization.objects.get(
-                    organization=user.organization,
-                    base_role=base_role
+        missing = [base_role for base_role in base_roles if base_role.pk not in org_roles]
+        if missing:
+            # Create organization roles that don't exist yet; re-read them so a
+            # concurrent request creating the same roles is not an error
+            OrganizationRole.objects.bulk_create([
+                OrganizationRole(organization=organization, base_role=base_role)
+                for base_role in missing
+            ], ignore_conflicts=True)
+            org_roles.update(
+                (role.base_role_id, role)
+                for role in OrganizationRole.objects.filter(
+                    organization=organization, base_role__in=missing
                 )
+            )
+        
+        result = []
+        for base_role in base_roles:
+            customization = customizations.get(base_role.pk)
+            org_role = org_roles[base_role.pk]
+            org_role.base_role = base_role
+            org_role.resolved_permissions = effective_permissions(base_role, customization)
+            
+            if customization is not None:
+                customization.base_role = base_role
                 customization_data = OrganizationRoleCustomizationSerializer(customization).data
-            except OrganizationRoleCustomization.DoesNotExist:
+            else:
                 customization_data = None
             
-            # Get the organization role instance
-            try:
-                org_role = OrganizationRole.objects.get(
-                    organization=user.organization,
-                    base_role=base_role
-                )
-                role_data = OrganizationRoleSerializer(org_role).data
-            except OrganizationRole.DoesNotExist:
-                # Create organization role if it doesn't exist
-                org_role = OrganizationRole.objects.create(
-                    organization=user.organization,
-                    base_role=base_role
-                )
-                role_data = OrganizationRoleSerializer(org_role).data
-            
             result.append({
                 'base_role': BaseRoleSerializer(base_role).data,
-                'organization_role': role_data,
+                'organization_role': OrganizationRoleSerializer(org_role).data,
                 'customization': customization_data,
-                'is_customized': customization_data is not None
+                'is_customized': customization is not None
             })
         
         return Response(result)
@@ -308,8 +429,8 @@ class OrganizationRoleCustomizationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def customize_role(self, request):
         """Create or update a role customization"""
-        user = request.user
-        if not user.organization:
+        organization = self.organization_context.organization
+        if not organization:
             return Response({'error': 'User has no associated organization'}, status=400)
         
         base_role_id = request.data.get('base_role')
@@ -323,7 +444,7 @@ class OrganizationRoleCustomizationViewSet(viewsets.ModelViewSet):
         
         # Get or create customization
         customization, created = OrganizationRoleCustomization.objects.get_or_create(
-            organization=user.organization,
+            organization=organization,
             base_role=base_role
         )
         
@@ -343,8 +464,8 @@ class OrganizationRoleCustomizationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['delete'])
     def reset_role(self, request):
         """Reset a role to its default permissions by deleting customization"""
-        user = request.user
-        if not user.organization:
+        organization = self.organization_context.organization
+        if not organization:
             return Response({'error': 'User has no associated organization'}, status=400)
         
         base_role_id = request.data.get('base_role') or request.query_params.get('base_role')
@@ -358,7 +479,7 @@ class OrganizationRoleCustomizationViewSet(viewsets.ModelViewSet):
         
         try:
             customization = OrganizationRoleCustomization.objects.get(
-                organization=user.organization,
+                organization=organization,
                 base_role=base_role
             )
             customization.delete()
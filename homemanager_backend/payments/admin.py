@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import RentPayment, MpesaPayment
+from .models import RentPayment, MpesaPayment, MpesaCallback, BillingRun, LateFeePolicy
 
 @admin.register(RentPayment)
 class RentPaymentAdmin(admin.ModelAdmin):
@@ -8,11 +8,15 @@ class RentPaymentAdmin(admin.ModelAdmin):
     search_fields = ('tenant__name', 'unit__unit_number', 'transaction_id')
     date_hierarchy = 'due_date'
     readonly_fields = ('transaction_id',)
+    raw_id_fields = ('lease',)
     
     fieldsets = (
         ('Basic Information', {
             'fields': ('tenant', 'unit', 'amount', 'due_date')
         }),
+        ('Billing', {
+            'fields': ('lease', 'billing_period')
+        }),
         ('Payment Details', {
             'fields': ('payment_date', 'status', 'payment_method', 'transaction_id')
         }),
@@ -45,3 +49,30 @@ class MpesaPaymentAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at')
         }),
     )
+
+
+@admin.register(MpesaCallback)
+class MpesaCallbackAdmin(admin.ModelAdmin):
+    """Admin configuration for MpesaCallback model"""
+    list_display = ('checkout_request_id', 'result_code', 'status', 'error', 'received_at', 'processed_at')
+    list_filter = ('status', 'result_code')
+    search_fields = ('checkout_request_id', 'merchant_request_id')
+    date_hierarchy = 'received_at'
+    readonly_fields = ('checkout_request_id', 'merchant_request_id', 'result_code', 'payload', 'token', 'error',
+                       'received_at', 'processed_at')
+
+
+@admin.register(LateFeePolicy)
+class LateFeePolicyAdmin(admin.ModelAdmin):
+    """Admin configuration for LateFeePolicy model"""
+    list_display = ('organization', 'property', 'grace_days', 'flat_fee', 'percentage', 'daily_fee', 'max_fee', 'is_active')
+    list_filter = ('is_active', 'organization')
+    search_fields = ('organization__name', 'property__name')
+
+
+@admin.register(BillingRun)
+class BillingRunAdmin(admin.ModelAdmin):
+    """Admin configuration for BillingRun model"""
+    list_display = ('period', 'status', 'leases_processed', 'payments_created', 'started_at', 'completed_at')
+    list_filter = ('status',)
+    readonly_fields = ('last_lease_id', 'leases_processed', 'payments_created', 'error', 'started_at', 'completed_at')
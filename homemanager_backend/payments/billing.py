@@ -0,0 +1,138 @@
+"""
+Monthly rent charge generation.
+
+generate_rent_charges() creates one pending RentPayment per active lease
+for a billing period, across all organizations. Leases are read in primary
+key order in chunks; each chunk is inserted with a single bulk_create in its
+own transaction, together with the BillingRun cursor, so an interrupted run
+resumes after the last committed chunk. The (lease, billing_period) unique
+constraint makes re-running a period harmless: leases that already have a
+charge are skipped.
+
+Run the generate_rent_charges command from cron shortly before each month
+starts.
+"""
+import logging
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from tenants.models import Lease
+from .models import RentPayment, BillingRun
+
+logger = logging.getLogger(__name__)
+
+
+def billing_chunk_size():
+    return getattr(settings, 'BILLING_CHUNK_SIZE', 1000)
+
+
+def rent_due_day():
+    return getattr(settings, 'RENT_DUE_DAY', 5)
+
+
+def billing_period(value):
+    """The billing period (first day of the month) containing a date"""
+    return value.replace(day=1)
+
+
+def next_billing_period(today=None):
+    """The billing period after the current one"""
+    today = today or timezone.now().date()
+    return billing_period(today) + relativedelta(months=1)
+
+
+def billable_leases(period):
+    """Active leases overlapping the billing period, in primary key order"""
+    period_end = period + relativedelta(months=1, days=-1)
+    return Lease.objects.filter(
+        is_active=True,
+        start_date__lte=period_end,
+        end_date__gte=period,
+    ).exclude(
+        unit__property__organization__is_deleting=True
+    ).order_by('pk')
+
+
+def generate_rent_charges(period, chunk_size=None, restart=False):
+    """
+    Create the period's RentPayment for every billable lease.
+
+    Args:
+        period: First day of the month to bill
+        chunk_size: Leases per transaction (default: settings.BILLING_CHUNK_SIZE)
+        restart: Rescan every lease even if the period's run completed,
+            e.g. to bill leases added since
+
+    Returns:
+        BillingRun: the period's run
+    """
+    chunk_size = chunk_size or billing_chunk_size()
+    period = billing_period(period)
+    run, created = BillingRun.objects.get_or_create(period=period)
+    if run.status == 'completed' and not restart:
+        return run
+    if restart and not created:
+        run.last_lease_id = 0
+        run.leases_processed = 0
+        run.payments_created = 0
+    run.status = 'running'
+    run.error = None
+    run.completed_at = None
+    run.save(update_fields=['status', 'error', 'completed_at', 'last_lease_id', 'leases_processed',
+                            'payments_created'])
+
+    due_date = period + relativedelta(day=rent_due_day())
+    description = f"Rent for {period:%B %Y}"
+    leases = billable_leases(period).annotate(
+        organization_ref=Coalesce('organization_id', 'unit__property__organization_id'),
+    ).values_list('pk', 'unit_id', 'tenant_id', 'organization_ref', 'unit__monthly_rent')
+
+    try:
+        while True:
+            chunk = list(leases.filter(pk__gt=run.last_lease_id)[:chunk_size])
+            if not chunk:
+                break
+            with transaction.atomic():
+                chunk_payments = RentPayment.objects.filter(
+                    billing_period=period, lease_id__in=[row[0] for row in chunk]
+                )
+                billed = set(chunk_payments.values_list('lease_id', flat=True))
+                # bulk_create skips save(), so the organization is set here
+                payments = [
+                    RentPayment(
+                        lease_id=lease_id,
+                        billing_period=period,
+                        unit_id=unit_id,
+                        tenant_id=tenant_id,
+                        organization_id=organization_id,
+                        amount=monthly_rent,
+                        due_date=due_date,
+                        status='pending',
+                        description=description,
+                    )
+                    for lease_id, unit_id, tenant_id, organization_id, monthly_rent in chunk
+                    if lease_id not in billed
+                ]
+                # ignore_conflicts covers a concurrent run billing the same leases
+                RentPayment.objects.bulk_create(payments, ignore_conflicts=True)
+                # Rows dropped as conflicts were not created by this run
+                created = chunk_payments.count() - len(billed) if payments else 0
+                run.last_lease_id = chunk[-1][0]
+                BillingRun.objects.filter(pk=run.pk).update(
+                    last_lease_id=run.last_lease_id,
+                    leases_processed=F('leases_processed') + len(chunk),
+                    payments_created=F('payments_created') + created,
+                )
+    except Exception as exc:
+        logger.exception("Billing run for %s failed after lease %s", period, run.last_lease_id)
+        BillingRun.objects.filter(pk=run.pk).update(status='failed', error=str(exc))
+    else:
+        BillingRun.objects.filter(pk=run.pk).update(status='completed', completed_at=timezone.now())
+
+    run.refresh_from_db()
+    return run
@@ -0,0 +1,357 @@
+"""
+M-Pesa STK push callback ingestion.
+
+Daraja posts the result of every STK push to its CallBackURL, and may
+deliver the same result more than once. record_callback() stores each
+delivery as an MpesaCallback; the unique checkout_request_id turns repeats
+into no-ops with a single INSERT. apply_callbacks() then applies a batch of
+stored callbacks in one transaction: the matching MpesaPayment rows are
+looked up by their unique checkout_request_id and locked with
+select_for_update, results already recorded are skipped, and payments,
+rent payments and callbacks are each written with one bulk_update.
+
+Daraja does not sign its callbacks and the endpoint is open, so a result
+is only applied when it was posted with the payment's callback token (sent
+in the push's CallBackURL); a successful one must also report the amount
+the push asked for, and Daraja's STK query must confirm it
+(MPESA_VERIFY_CALLBACKS). Results failing a check are stored as rejected.
+A successful delivery replaces a stored failure for the same checkout
+request, and a delivery with the right token replaces one without it, so a
+forged or early delivery cannot block the real result.
+Callbacks that cannot be read are marked failed on their own, without
+rolling back the rest of their batch.
+
+By default the receiver applies each callback as it arrives. With
+MPESA_CALLBACK_BATCHING on it only stores them, and the
+process_mpesa_callbacks command applies pending callbacks in micro-batches,
+which keeps the receiver at one INSERT per request during rent week.
+"""
+import hmac
+import logging
+import secrets
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_CEILING
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import MpesaCallback, MpesaPayment, RentPayment
+from .mpesa import MpesaError, config_for_property, get_client
+
+logger = logging.getLogger(__name__)
+
+# Acknowledgement Daraja expects from the callback receiver
+ACCEPTED = {'ResultCode': 0, 'ResultDesc': 'Accepted'}
+
+# CallBackURL query parameter carrying the payment's callback token
+TOKEN_PARAM = 'token'
+
+
+def callback_batching():
+    return getattr(settings, 'MPESA_CALLBACK_BATCHING', False)
+
+
+def callback_batch_size():
+    return getattr(settings, 'MPESA_CALLBACK_BATCH_SIZE', 500)
+
+
+def callback_verification():
+    return getattr(settings, 'MPESA_VERIFY_CALLBACKS', True)
+
+
+def new_callback_token():
+    return secrets.token_urlsafe(32)
+
+
+def callback_url_with_token(url, token):
+    """The CallBackURL for an STK push, carrying its payment's callback token"""
+    parts = urlsplit(url)
+    query = urlencode([*parse_qsl(parts.query), (TOKEN_PARAM, token)])
+    return urlunsplit(parts._replace(query=query))
+
+
+def parse_callback(data):
+    """
+    The stkCallback object of a Daraja callback body, or None if the body
+    is not an STK result.
+    """
+    try:
+        callback = data['Body']['stkCallback']
+        int(callback['ResultCode'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return callback if callback.get('CheckoutRequestID') else None
+
+
+def callback_metadata(payload):
+    """CallbackMetadata items of a successful result as {name: value}"""
+    items = payload.get('CallbackMetadata', {}).get('Item', [])
+    return {item['Name']: item.get('Value') for item in items if 'Name' in item}
+
+
+def transaction_date(value):
+    """Daraja's YYYYMMDDHHMMSS transaction date, in local time"""
+    try:
+        return timezone.make_aware(datetime.strptime(str(value), '%Y%m%d%H%M%S'))
+    except (TypeError, ValueError):
+        return timezone.now()
+
+
+def read_result(payload):
+    """
+    The fields of a stored STK result that are applied to its payment.
+
+    Returns:
+        dict: description, and for successful results receipt_number,
+            transaction_date and amount
+
+    Raises:
+        AttributeError, KeyError, TypeError, ValueError, InvalidOperation:
+            when the payload is malformed
+    """
+    description = payload.get('ResultDesc') or ''
+    if not isinstance(description, str):
+        raise TypeError('ResultDesc is not a string')
+    result = {'description': description[:255]}
+    if int(payload['ResultCode']) != 0:
+        return result
+    metadata = callback_metadata(payload)
+    receipt_number = metadata.get('MpesaReceiptNumber')
+    if not receipt_number or not isinstance(receipt_number, str):
+        raise ValueError('No MpesaReceiptNumber')
+    result.update(
+        receipt_number=receipt_number[:100],
+        transaction_date=transaction_date(metadata.get('TransactionDate')),
+        amount=Decimal(str(metadata['Amount'])),
+    )
+    return result
+
+
+def token_matches(payment_token, token):
+    """Whether a callback token is the payment's; payments from before tokens accept any"""
+    return not payment_token or hmac.compare_digest(token or '', payment_token)
+
+
+def verification_error(callback, payment, result, clients):
+    """
+    Why a result may not be applied to its payment, or None.
+
+    Every result needs the payment's callback token; successful ones must
+    also report the pushed amount and be confirmed by Daraja. clients caches
+    the Daraja client of each property within a batch.
+
+    Raises:
+        MpesaError: when Daraja could not confirm the result (yet)
+    """
+    if not token_matches(payment.callback_token, callback.token):
+        return 'Callback token does not match'
+    if callback.result_code != 0:
+        return None
+    amount = result['amount']
+    # STK pushes ask for whole shillings, see MpesaClient.stk_push
+    expected = payment.amount.to_integral_value(rounding=ROUND_CEILING)
+    if amount != expected:
+        return f'Amount {amount} does not match {expected}'
+    if not callback_verification():
+        return None
+
+    if payment.property_id not in clients:
+        config = config_for_property(payment.property)
+        clients[payment.property_id] = get_client(config) if config else None
+    client = clients[payment.property_id]
+    if client is None:
+        return 'No M-Pesa configuration to confirm the result with'
+    result_code = str(client.stk_query(payment.checkout_request_id).get('ResultCode'))
+    if result_code != '0':
+        return f'Daraja reports result code {result_code}'
+    return None
+
+
+def record_callback(payload, token=None):
+    """
+    Store a parsed STK callback.
+
+    A successful result replaces a stored unsuccessful, rejected or failed
+    callback for the same checkout request, and a delivery carrying the
+    payment's callback token replaces one that does not; the replacement is
+    then applied again. A forged delivery posted first therefore cannot make
+    the real result look like a repeat.
+
+    Returns:
+        tuple: (MpesaCallback, True), or (None, False) for a repeated
+            delivery of a callback already stored
+    """
+    checkout_request_id = payload['CheckoutRequestID']
+    fields = {
+        'merchant_request_id': payload.get('MerchantRequestID'),
+        'result_code': int(payload['ResultCode']),
+        'payload': payload,
+        'token': token,
+    }
+    try:
+        with transaction.atomic():
+            callback = MpesaCallback.objects.create(checkout_request_id=checkout_request_id, **fields)
+    except IntegrityError:
+        replaceable = Q(status__in=('rejected', 'failed'))
+        if fields['result_code'] == 0:
+            replaceable |= ~Q(result_code=0)
+        payment_token = MpesaPayment.objects.filter(
+            checkout_request_id=checkout_request_id
+        ).values_list('callback_token', flat=True).first()
+        if payment_token and token_matches(payment_token, token):
+            replaceable |= ~Q(token=token)
+        replaced = MpesaCallback.objects.filter(checkout_request_id=checkout_request_id).filter(
+            replaceable
+        ).update(status='pending', error='', processed_at=None, **fields)
+        if not replaced:
+            return None, False
+        callback = MpesaCallback.objects.get(checkout_request_id=checkout_request_id)
+    return callback, True
+
+
+def apply_callbacks(callbacks):
+    """
+    Apply stored callbacks to their M-Pesa and rent payments in one
+    transaction.
+
+    A verified successful result completes the rent payment; a verified
+    failed or cancelled one returns an initiated rent payment to pending so it stays
+    owed. Callbacks Daraja could not confirm yet stay pending.
+
+    Returns:
+        int: number of payments updated
+    """
+    if not callbacks:
+        return 0
+
+    with transaction.atomic(savepoint=False):
+        payments = {
+            payment.checkout_request_id: payment
+            for payment in MpesaPayment.objects.select_for_update().filter(
+                checkout_request_id__in=[callback.checkout_request_id for callback in callbacks]
+            ).order_by('pk')
+        }
+        rent_payments = RentPayment.objects.select_for_update().in_bulk(
+            sorted({payment.rent_payment_id for payment in payments.values()})
+        )
+
+        now = timezone.now()
+        clients = {}
+        updated_payments, updated_rent_payments = [], []
+        for callback in callbacks:
+            callback.processed_at = now
+            payment = payments.get(callback.checkout_request_id)
+            if payment is None:
+                callback.status = 'unmatched'
+                continue
+            if payment.result_code == '0' or (payment.result_code is not None and callback.result_code != 0):
+                # Already recorded, e.g. by a repeated delivery
+                callback.status = 'applied'
+                continue
+
+            try:
+                result = read_result(callback.payload)
+            except (AttributeError, KeyError, TypeError, ValueError, InvalidOperation) as exc:
+                logger.warning("Malformed M-Pesa callback %s: %s", callback.checkout_request_id, exc)
+                callback.status = 'failed'
+                callback.error = f'Malformed callback: {exc}'[:255]
+                continue
+            try:
+                error = verification_error(callback, payment, result, clients)
+            except MpesaError as exc:
+                logger.warning("Could not confirm M-Pesa callback %s: %s", callback.checkout_request_id, exc)
+                callback.processed_at = None
+                continue
+            if error:
+                logger.warning("Rejected M-Pesa callback %s: %s", callback.checkout_request_id, error)
+                callback.status = 'rejected'
+                callback.error = error
+                continue
+
+            callback.status = 'applied'
+            callback.error = ''
+            payment.result_code = str(callback.result_code)
+            payment.result_description = result['description']
+            payment.updated_at = now
+            updated_payments.append(payment)
+
+            rent_payment = rent_payments[payment.rent_payment_id]
+            if callback.result_code == 0:
+                payment.mpesa_receipt_number = result['receipt_number']
+                payment.transaction_date = result['transaction_date']
+                if rent_payment.status != 'completed':
+                    rent_payment.status = 'completed'
+                    rent_payment.payment_method = 'm_pesa'
+                    rent_payment.payment_date = payment.transaction_date
+                    rent_payment.transaction_id = payment.mpesa_receipt_number
+                    rent_payment.updated_at = now
+                    updated_rent_payments.append(rent_payment)
+            elif rent_payment.status == 'initiated':
+                rent_payment.status = 'pending'
+                rent_payment.updated_at = now
+                updated_rent_payments.append(rent_payment)
+
+        MpesaPayment.objects.bulk_update(updated_payments, [
+            'result_code', 'result_description', 'mpesa_receipt_number', 'transaction_date', 'updated_at'
+        ])
+        # Two callbacks in a batch can update the same rent payment
+        RentPayment.objects.bulk_update(list({rp.pk: rp for rp in updated_rent_payments}.values()), [
+            'status', 'payment_method', 'payment_date', 'transaction_id', 'updated_at'
+        ])
+        MpesaCallback.objects.bulk_update(callbacks, ['status', 'error', 'processed_at'])
+    return len(updated_payments)
+
+
+def receive_callback(data, token=None):
+    """
+    Store a callback body posted by Daraja and, unless callbacks are
+    batched, apply it.
+
+    Args:
+        data: Callback body
+        token: Callback token from the CallBackURL it was posted to
+
+    Returns:
+        bool: False if the body is not an STK result
+    """
+    payload = parse_callback(data)
+    if payload is None:
+        return False
+    callback, created = record_callback(payload, token)
+    if created and not callback_batching():
+        try:
+            apply_callbacks([callback])
+        except Exception:
+            # It stays pending for process_mpesa_callbacks
+            logger.exception("Applying M-Pesa callback %s failed", callback.checkout_request_id)
+    return True
+
+
+def process_pending_callbacks(batch_size=None):
+    """
+    Apply pending callbacks, one batch per transaction. Concurrent workers
+    skip the batches other workers have claimed. Callbacks left pending
+    (Daraja could not confirm them yet) are retried on the next run.
+
+    Returns:
+        int: number of callbacks processed
+    """
+    batch_size = batch_size or callback_batch_size()
+    processed = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                MpesaCallback.objects.filter(status='pending', pk__gt=last_pk)
+                .select_for_update(skip_locked=True)
+                .order_by('pk')[:batch_size]
+            )
+            if not batch:
+                break
+            apply_callbacks(batch)
+            processed += len(batch)
+            last_pk = batch[-1].pk
+    return processed
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+"""
+Django management command to mark past-due rent payments overdue and
+apply late fees under each organization's or property's LateFeePolicy.
+Run it nightly from cron; fees are recomputed on every run.
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.late_fees import assess_late_fees
+
+
+class Command(BaseCommand):
+    help = 'Mark past-due rent payments overdue and apply late fees'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Assess as of this date, YYYY-MM-DD (default: today)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Payments per batch (default: settings.LATE_FEE_BATCH_SIZE)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        today = None
+        if options['date']:
+            try:
+                today = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be in YYYY-MM-DD format')
+
+        result = assess_late_fees(today, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Assessed {result['assessed']} payments, updated {result['updated']}"
+        ))
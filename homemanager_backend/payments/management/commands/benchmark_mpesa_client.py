@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from properties.models import MpesaConfig
+from payments.mpesa import MpesaClient, clear_clients
+from payments.mpesa_simulator import DarajaSimulator
+
+
+class Command(BaseCommand):
+    help = 'Benchmark a burst of STK pushes against the local Daraja simulator (per-push vs pooled client)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pushes',
+            type=int,
+            default=500,
+            help='STK pushes per run (default: 500)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=10,
+            help='Threads sending pushes (default: 10)'
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0.02,
+            help='Simulated Daraja latency per call in seconds (default: 0.02)'
+        )
+        parser.add_argument(
+            '--connect-latency',
+            type=float,
+            default=0.05,
+            help='Simulated TCP + TLS handshake per new connection in seconds (default: 0.05)'
+        )
+
+    def handle(self, *args, **options):
+        if options['pushes'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--pushes and --concurrency must be at least 1')
+
+        # Unsaved config: nothing is written to the database
+        config = MpesaConfig(consumer_key='benchmark-key', consumer_secret='benchmark-secret',
+                             business_short_code='174379', passkey='benchmark-passkey',
+                             callback_url='https://example.com/mpesa/callback/')
+
+        def per_push(simulator):
+            """A new session and token for every push"""
+            def push(n):
+                client = MpesaClient(config, base_url=simulator.base_url)
+                # A token of its own, as if nothing were cached
+                client.token_key = f'{client.token_key}:{n}'
+                client.stk_push('0712345678', 1000, f'Rent-{n}', 'Rent')
+                client.close()
+            return push
+
+        def pooled(simulator):
+            """One shared client: kept-alive connections and a cached token"""
+            client = MpesaClient(config, base_url=simulator.base_url)
+            client.invalidate_token()
+            return lambda n: client.stk_push('0712345678', 1000, f'Rent-{n}', 'Rent')
+
+        for label, factory in (('before', per_push), ('after', pooled)):
+            cache.clear()
+            clear_clients()
+            with DarajaSimulator(latency=options['latency'],
+                                 connect_latency=options['connect_latency']) as simulator:
+                push = factory(simulator)
+                start = time.perf_counter()
+                with ThreadPoolExecutor(options['concurrency']) as executor:
+                    list(executor.map(push, range(options['pushes'])))
+                elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{label:>6}: {options['pushes']} pushes in {elapsed:.2f}s "
+                f"({options['pushes'] / elapsed:.0f}/s), {simulator.connections} connections, "
+                f"{simulator.token_requests} token requests"
+            )
+        clear_clients()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+"""
+Django management command to create the monthly rent charges of every
+active lease. Run it from cron before each month starts; re-running a
+period only bills leases that have no charge yet, and an interrupted run
+resumes where it stopped.
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.billing import generate_rent_charges, next_billing_period
+
+
+class Command(BaseCommand):
+    help = 'Generate pending rent payments for every active lease for a billing period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period',
+            help='Month to bill as YYYY-MM (default: next month)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Leases per transaction (default: settings.BILLING_CHUNK_SIZE)'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Rescan all leases even if the period was already billed'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] is not None and options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        if options['period']:
+            try:
+                period = datetime.strptime(options['period'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--period must be in YYYY-MM format')
+        else:
+            period = next_billing_period()
+
+        run = generate_rent_charges(period, options['chunk_size'], restart=options['restart'])
+        message = (f'{run.period:%Y-%m}: {run.payments_created} payments created '
+                   f'for {run.leases_processed} leases ({run.status})')
+        if run.status == 'failed':
+            raise CommandError(f'{message}: {run.error}')
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+"""
+Django management command to apply stored M-Pesa STK callbacks in batches.
+Keep it running as a worker with --loop when MPESA_CALLBACK_BATCHING is on;
+otherwise run it from cron to pick up callbacks that failed to apply on
+receipt.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.callbacks import process_pending_callbacks
+
+
+class Command(BaseCommand):
+    help = 'Apply pending M-Pesa STK callbacks in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Callbacks applied per transaction (default: settings.MPESA_CALLBACK_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new callbacks instead of exiting'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1,
+            help='Seconds between polls with --loop (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        while True:
+            processed = process_pending_callbacks(options['batch_size'])
+            if processed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Processed {processed} callbacks'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""
+Django management command to settle an organization's outstanding rent
+payments from an M-Pesa paybill statement export, writing the lines it
+cannot match to an exceptions CSV for review.
+"""
+
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from organizations.models import Organization
+from payments.reconciliation import reconcile_statement
+
+
+class Command(BaseCommand):
+    help = 'Reconcile outstanding rent payments against an M-Pesa statement CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Path of the statement CSV export')
+        parser.add_argument(
+            '--organization',
+            type=int,
+            required=True,
+            help='ID of the organization whose paybill the statement is for'
+        )
+        parser.add_argument(
+            '--exceptions',
+            help='Path of the exceptions CSV (default: <statement>-exceptions.csv)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Statement lines per batch (default: settings.RECONCILIATION_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Match and write exceptions without updating any payment'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        try:
+            organization = Organization.objects.get(pk=options['organization'])
+        except Organization.DoesNotExist:
+            raise CommandError(f"Organization {options['organization']} does not exist")
+
+        statement_path = Path(options['statement'])
+        exceptions_path = Path(options['exceptions'] or statement_path.with_name(f'{statement_path.stem}-exceptions.csv'))
+        try:
+            # utf-8-sig drops the byte order mark of Excel-saved exports
+            with open(statement_path, newline='', encoding='utf-8-sig') as statement, \
+                    open(exceptions_path, 'w', newline='', encoding='utf-8') as exceptions:
+                summary = reconcile_statement(organization, statement, exceptions, options['batch_size'],
+                                              dry_run=options['dry_run'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        prefix = 'Dry run: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{summary['matched']} of {summary['lines']} lines matched, "
+            f"{summary['exceptions']} exceptions written to {exceptions_path}, "
+            f"{summary['already_reconciled']} already reconciled, {summary['skipped']} skipped"
+        ))
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+"""
+Django management command to serve the local Daraja stand-in. Point
+settings.MPESA_BASE_URL at the printed URL to send STK pushes to it.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.mpesa_simulator import DarajaSimulator
+
+
+class Command(BaseCommand):
+    help = 'Run a local M-Pesa Daraja API simulator'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on (default: 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=8089, help='Port to listen on (default: 8089)')
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0,
+            help='Seconds each API call takes (default: 0)'
+        )
+        parser.add_argument(
+            '--send-callbacks',
+            action='store_true',
+            help="Post a successful STK result to each request's CallBackURL"
+        )
+
+    def handle(self, *args, **options):
+        simulator = DarajaSimulator(options['host'], options['port'], latency=options['latency'],
+                                    send_callbacks=options['send_callbacks'])
+        simulator.start()
+        self.stdout.write(self.style.SUCCESS(f'Daraja simulator listening on {simulator.base_url}'))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            simulator.stop()
+            self.stdout.write(f'Served {simulator.token_requests} token requests and '
+                              f'{len(simulator.stk_requests)} STK pushes over {simulator.connections} connections')
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0006_make_base_role_required'),
+        ('payments', '0007_rentpayment_updated_at'),
+        ('properties', '0007_unit_updated_at'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rentpayment',
+            name='organization',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)ss', to='organizations.organization'),
+        ),
+        migrations.AddIndex(
+            model_name='rentpayment',
+            index=models.Index(fields=['organization'], name='payments_re_organiz_cbb0f1_idx'),
+        ),
+    ]
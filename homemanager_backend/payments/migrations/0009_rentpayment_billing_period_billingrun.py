@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0010_subscriptionplan_rate_limits'),
+        ('payments', '0008_rentpayment_organization_and_more'),
+        ('properties', '0007_unit_updated_at'),
+        ('tenants', '0002_lease_organization_tenant_organization_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(unique=True)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=10)),
+                ('last_lease_id', models.BigIntegerField(default=0)),
+                ('leases_processed', models.PositiveIntegerField(default=0)),
+                ('payments_created', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-period'],
+            },
+        ),
+        migrations.AddField(
+            model_name='rentpayment',
+            name='billing_period',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rentpayment',
+            name='lease',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rent_payments', to='tenants.lease'),
+        ),
+        migrations.AddConstraint(
+            model_name='rentpayment',
+            constraint=models.UniqueConstraint(fields=('lease', 'billing_period'), name='unique_rent_payment_lease_period'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0010_subscriptionplan_rate_limits'),
+        ('payments', '0009_rentpayment_billing_period_billingrun'),
+        ('properties', '0007_unit_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rentpayment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('initiated', 'Initiated'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed'), ('overdue', 'Overdue')], default='pending', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='LateFeePolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grace_days', models.PositiveIntegerField(default=5)),
+                ('flat_fee', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('percentage', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('daily_fee', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('max_fee', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)ss', to='organizations.organization')),
+                ('property', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='late_fee_policies', to='properties.property')),
+            ],
+            options={
+                'verbose_name_plural': 'Late fee policies',
+                'abstract': False,
+                'indexes': [models.Index(fields=['organization'], name='payments_la_organiz_22cbdd_idx')],
+                'constraints': [models.UniqueConstraint(fields=('organization', 'property'), name='unique_late_fee_policy_property'), models.UniqueConstraint(condition=models.Q(('property__isnull', True)), fields=('organization',), name='unique_late_fee_policy_organization')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:32
+
+from django.db import migrations
+
+
+def blank_to_null(apps, schema_editor):
+    """Empty checkout request IDs would collide once the column is unique"""
+    MpesaPayment = apps.get_model('payments', 'MpesaPayment')
+    MpesaPayment.objects.filter(checkout_request_id='').update(checkout_request_id=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0010_latefeepolicy_overdue_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(blank_to_null, migrations.RunPython.noop),
+    ]
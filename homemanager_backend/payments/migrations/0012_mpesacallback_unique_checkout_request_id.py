@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0011_blank_checkout_request_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MpesaCallback',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checkout_request_id', models.CharField(max_length=100, unique=True)),
+                ('merchant_request_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('result_code', models.IntegerField()),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('applied', 'Applied'), ('unmatched', 'Unmatched')], db_index=True, default='pending', max_length=10)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['received_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='mpesapayment',
+            name='checkout_request_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
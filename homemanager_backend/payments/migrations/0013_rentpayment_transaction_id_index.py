@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0012_mpesacallback_unique_checkout_request_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rentpayment',
+            name='transaction_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+    ]
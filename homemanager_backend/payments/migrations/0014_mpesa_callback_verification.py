@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0013_rentpayment_transaction_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mpesacallback',
+            name='error',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='mpesacallback',
+            name='token',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='mpesapayment',
+            name='callback_token',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='mpesacallback',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('applied', 'Applied'), ('unmatched', 'Unmatched'), ('rejected', 'Rejected'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10),
+        ),
+    ]
@@ -1,16 +1,20 @@
 from django.db import models
 from django.utils import timezone
-from properties.models import Unit
-from tenants.models import Tenant
+from properties.models import Property, Unit
+from tenants.models import Tenant, Lease
+from organizations.models import OrganizationModel, OrganizationManager
 
-class RentPayment(models.Model):
+class RentPayment(OrganizationModel):
     """Model representing a rent payment"""
+    organization_source = 'unit__property__organization'
+    
     PAYMENT_STATUS = [
         ('pending', 'Pending'),
         ('initiated', 'Initiated'),  # When payment request has been sent
         ('processing', 'Processing'),  # When payment is being processed
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('overdue', 'Overdue'),  # Pending past its due date, set by payments.late_fees
     ]
     
     PAYMENT_METHODS = [
@@ -28,13 +32,90 @@ class RentPayment(models.Model):
     payment_date = models.DateTimeField(blank=True, null=True)
     status = models.CharField(max_length=10, choices=PAYMENT_STATUS, default='pending')
     payment_method = models.CharField(max_length=10, choices=PAYMENT_METHODS, blank=True, null=True)
-    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    # Indexed for statement reconciliation, which looks receipts up here
+    transaction_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
     description = models.TextField(blank=True, null=True)
     receipt_sent = models.BooleanField(default=False)
     late_fee_applied = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    # Set on monthly charges generated by payments.billing
+    lease = models.ForeignKey(Lease, on_delete=models.SET_NULL, related_name='rent_payments',
+                              null=True, blank=True)
+    billing_period = models.DateField(null=True, blank=True)  # First day of the billed month
+    
+    class Meta(OrganizationModel.Meta):
+        constraints = [
+            # One generated charge per lease and month; manual payments leave both empty
+            models.UniqueConstraint(fields=['lease', 'billing_period'], name='unique_rent_payment_lease_period'),
+        ]
     
     def __str__(self):
         return f"Rent payment for {self.unit} - {self.tenant.name} ({self.due_date})"
+
+
+class LateFeePolicy(OrganizationModel):
+    """
+    Late fee rules for an organization, or for one of its properties.
+    
+    A property's policy overrides the organization-wide one (the policy
+    without a property). Once a payment is more than grace_days late its fee
+    is flat_fee plus percentage of the rent, plus daily_fee for every day
+    past the grace period, capped at max_fee.
+    """
+    organization_source = 'property__organization'
+    
+    property = models.ForeignKey('properties.Property', on_delete=models.CASCADE,
+                                 related_name='late_fee_policies', null=True, blank=True)
+    grace_days = models.PositiveIntegerField(default=5)
+    flat_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # Of the rent amount
+    daily_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    max_fee = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # Empty = no cap
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta(OrganizationModel.Meta):
+        verbose_name_plural = "Late fee policies"
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'property'], name='unique_late_fee_policy_property'),
+            models.UniqueConstraint(fields=['organization'], condition=models.Q(property__isnull=True),
+                                    name='unique_late_fee_policy_organization'),
+        ]
+    
+    def __str__(self):
+        scope = self.property if self.property_id else self.organization
+        return f"Late fee policy for {scope}"
+
+
+class BillingRun(models.Model):
+    """
+    Progress of the monthly rent charge generation for one billing period.
+    
+    Leases are invoiced in primary key order; last_lease_id is the cursor a
+    crashed or interrupted run resumes from.
+    """
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    period = models.DateField(unique=True)  # First day of the billed month
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    last_lease_id = models.BigIntegerField(default=0)
+    leases_processed = models.PositiveIntegerField(default=0)
+    payments_created = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-period']
+    
+    def __str__(self):
+        return f"Billing run {self.period:%Y-%m} ({self.status})"
         
         
 class MpesaPayment(models.Model):
@@ -49,8 +130,11 @@ class MpesaPayment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     reference = models.CharField(max_length=100)  # Account reference
     description = models.CharField(max_length=255)
-    checkout_request_id = models.CharField(max_length=100, blank=True, null=True)
+    # Unique so STK result callbacks are matched with an index lookup
+    checkout_request_id = models.CharField(max_length=100, blank=True, null=True, unique=True)
     merchant_request_id = models.CharField(max_length=100, blank=True, null=True)
+    # Secret sent in the STK push CallBackURL; only callbacks carrying it can complete the payment
+    callback_token = models.CharField(max_length=64, blank=True, null=True)
     mpesa_receipt_number = models.CharField(max_length=100, blank=True, null=True)
     transaction_date = models.DateTimeField(blank=True, null=True)
     result_code = models.CharField(max_length=5, blank=True, null=True)
@@ -58,25 +142,81 @@ class MpesaPayment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = OrganizationManager()
+    
     def __str__(self):
         return f"M-Pesa payment for {self.rent_payment}"
         
     def save(self, *args, **kwargs):
-        if not self.property_id and self.rent_payment:
+        if not self.property_id and self.rent_payment_id:
             # Auto-set the property from the rent payment's unit
-            self.property = self.rent_payment.unit.property
+            self.property_id = Unit.objects.filter(
+                pk=self.rent_payment.unit_id
+            ).values_list('property_id', flat=True).first()
             
-        if not self.organization_id and self.property:
+        if not self.organization_id and self.rent_payment_id:
+            # Rent payments carry their organization since it was denormalized
+            self.organization_id = self.rent_payment.organization_id
+            
+        if not self.organization_id and self.property_id:
             # Auto-set the organization from the property
-            self.organization = self.property.organization
+            self.organization_id = Property.objects.filter(
+                pk=self.property_id
+            ).values_list('organization_id', flat=True).first()
             
         if self.mpesa_receipt_number and not self.transaction_date:
             self.transaction_date = timezone.now()
-            # Update the related rent payment
-            self.rent_payment.status = 'completed'
-            self.rent_payment.payment_method = 'm_pesa'
-            self.rent_payment.payment_date = self.transaction_date
-            self.rent_payment.transaction_id = self.mpesa_receipt_number
-            self.rent_payment.save()
+            self.complete_rent_payment()
             
         super().save(*args, **kwargs)
+    
+    def complete_rent_payment(self):
+        """Mark the rent payment paid by this transaction with a single UPDATE"""
+        fields = {
+            'status': 'completed',
+            'payment_method': 'm_pesa',
+            'payment_date': self.transaction_date,
+            'transaction_id': self.mpesa_receipt_number,
+            'updated_at': timezone.now(),
+        }
+        RentPayment.objects.filter(pk=self.rent_payment_id).update(**fields)
+        if self._meta.get_field('rent_payment').is_cached(self):
+            for field, value in fields.items():
+                setattr(self.rent_payment, field, value)
+
+
+class MpesaCallback(models.Model):
+    """
+    An STK push result callback as delivered by Daraja.
+    
+    Callbacks are stored before they are applied to their MpesaPayment. The
+    unique checkout_request_id makes repeated deliveries of the same result
+    no-ops, and lets pending callbacks be applied in batches by
+    process_mpesa_callbacks. A successful result replaces a stored failed,
+    rejected or unsuccessful one.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('applied', 'Applied'),
+        ('unmatched', 'Unmatched'),  # No MpesaPayment has the checkout request ID
+        ('rejected', 'Rejected'),  # Failed the token, amount or Daraja check
+        ('failed', 'Failed'),  # Malformed, could not be applied
+    ]
+    
+    checkout_request_id = models.CharField(max_length=100, unique=True)
+    merchant_request_id = models.CharField(max_length=100, blank=True, null=True)
+    result_code = models.IntegerField()
+    payload = models.JSONField()
+    # Callback token from the CallBackURL the result was posted to
+    token = models.CharField(max_length=64, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    # Why the callback was rejected or failed
+    error = models.CharField(max_length=255, blank=True, default='')
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['received_at']
+    
+    def __str__(self):
+        return f"M-Pesa callback {self.checkout_request_id} ({self.status})"
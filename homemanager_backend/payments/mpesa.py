@@ -0,0 +1,313 @@
+"""
+M-Pesa Daraja API client.
+
+get_client(config) returns one MpesaClient per MpesaConfig or
+PropertyMpesaConfig. Each client keeps a requests.Session whose connection
+pool stays open between calls, so a burst of STK pushes reuses kept-alive
+TLS connections instead of opening one per request.
+
+OAuth tokens are cached per set of credentials, in the process and in the
+shared cache, until shortly before they expire. When a token is missing
+only one thread per process fetches a new one; the others wait for it and
+reuse it.
+
+Every call has connect/read timeouts. Requests that fail to connect are
+retried with exponential backoff. Token requests and STK queries are also
+retried on timeouts and 5xx responses. STK pushes are not retried once the
+request may have reached Daraja, since that could send the customer a
+second prompt.
+
+Set MPESA_BASE_URL to point every client at another Daraja endpoint, e.g.
+the local simulator in payments.mpesa_simulator.
+"""
+import base64
+import hashlib
+import logging
+import threading
+import time
+from decimal import Decimal, ROUND_CEILING
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SANDBOX_BASE_URL = 'https://sandbox.safaricom.co.ke'
+PRODUCTION_BASE_URL = 'https://api.safaricom.co.ke'
+
+TOKEN_PATH = '/oauth/v1/generate?grant_type=client_credentials'
+STK_PUSH_PATH = '/mpesa/stkpush/v1/processrequest'
+STK_QUERY_PATH = '/mpesa/stkpushquery/v1/query'
+
+TOKEN_CACHE_KEY = 'payments:mpesa_token:{digest}'
+
+# Seconds before expiry a cached token stops being used
+TOKEN_EXPIRY_MARGIN = 60
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# {(model label, pk): MpesaClient}
+_clients = {}
+_clients_lock = threading.Lock()
+
+# {token cache key: (expires_at, token)} and one refresh lock per key
+_tokens = {}
+_token_locks = {}
+_token_locks_lock = threading.Lock()
+
+
+class MpesaError(Exception):
+    """A Daraja request failed or returned an error response"""
+
+    def __init__(self, message, status_code=None, response=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = response
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _never_sent(exc):
+    """Whether a connection error happened before the request could be sent"""
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def normalize_phone_number(phone_number):
+    """Convert 07XXXXXXXX / +2547XXXXXXXX style numbers to 2547XXXXXXXX"""
+    digits = ''.join(ch for ch in str(phone_number) if ch.isdigit())
+    if digits.startswith('0'):
+        digits = '254' + digits[1:]
+    elif len(digits) == 9:
+        digits = '254' + digits
+    return digits
+
+
+class MpesaClient:
+    """Daraja client for one set of M-Pesa credentials"""
+
+    def __init__(self, config, base_url=None):
+        self.consumer_key = config.consumer_key
+        self.consumer_secret = config.consumer_secret
+        self.business_short_code = config.business_short_code
+        self.passkey = config.passkey
+        self.updated_at = getattr(config, 'updated_at', None)
+        self.callback_url = config.callback_url or _setting('MPESA_CALLBACK_URL', None)
+        self.base_url = (
+            base_url
+            or _setting('MPESA_BASE_URL', None)
+            or (SANDBOX_BASE_URL if config.is_sandbox else PRODUCTION_BASE_URL)
+        ).rstrip('/')
+        self.timeout = _setting('MPESA_TIMEOUT', (3.05, 15))
+        self.max_retries = _setting('MPESA_MAX_RETRIES', 2)
+        self.retry_backoff = _setting('MPESA_RETRY_BACKOFF', 0.5)
+        digest = hashlib.sha256(f'{self.base_url} {self.consumer_key}'.encode()).hexdigest()
+        self.token_key = TOKEN_CACHE_KEY.format(digest=digest)
+
+        pool_size = _setting('MPESA_POOL_SIZE', 10)
+        self.session = requests.Session()
+        # Retries are handled in _request, which knows what is safe to repeat
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, method, path, idempotent, **kwargs):
+        """Send a request, retrying failures that are safe to repeat"""
+        url = f'{self.base_url}{path}'
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except requests.ConnectionError as exc:
+                retryable = idempotent or _never_sent(exc)
+                error = MpesaError(f'M-Pesa request to {path} failed: {exc}')
+            except requests.Timeout as exc:
+                retryable = idempotent
+                error = MpesaError(f'M-Pesa request to {path} timed out: {exc}')
+            else:
+                if response.status_code not in RETRY_STATUSES or not idempotent:
+                    return response
+                retryable = True
+                error = MpesaError(f'M-Pesa returned {response.status_code} for {path}',
+                                   status_code=response.status_code, response=response)
+
+            if not retryable or attempt >= self.max_retries:
+                raise error
+            delay = self.retry_backoff * (2 ** attempt)
+            attempt += 1
+            logger.warning("%s; retrying in %.2fs (attempt %s)", error, delay, attempt)
+            time.sleep(delay)
+
+    # OAuth tokens
+
+    def _cached_token(self):
+        entry = _tokens.get(self.token_key)
+        if entry and entry[0] > time.time():
+            return entry[1]
+        entry = cache.get(self.token_key)
+        if entry and entry[0] > time.time():
+            _tokens[self.token_key] = entry
+            return entry[1]
+        return None
+
+    def _token_lock(self):
+        with _token_locks_lock:
+            return _token_locks.setdefault(self.token_key, threading.Lock())
+
+    def get_token(self):
+        """Return a valid access token, fetching one only when none is cached"""
+        token = self._cached_token()
+        if token:
+            return token
+        with self._token_lock():
+            # Another thread may have refreshed it while we waited
+            token = self._cached_token()
+            if token:
+                return token
+            return self._fetch_token()
+
+    def _fetch_token(self):
+        response = self._request('GET', TOKEN_PATH, idempotent=True,
+                                 auth=(self.consumer_key, self.consumer_secret))
+        if response.status_code != 200:
+            raise MpesaError(f'M-Pesa token request failed with {response.status_code}',
+                             status_code=response.status_code, response=response)
+        data = response.json()
+        lifetime = int(data.get('expires_in', 3599))
+        ttl = max(lifetime - TOKEN_EXPIRY_MARGIN, 1)
+        entry = (time.time() + ttl, data['access_token'])
+        _tokens[self.token_key] = entry
+        cache.set(self.token_key, entry, ttl)
+        return entry[1]
+
+    def invalidate_token(self):
+        _tokens.pop(self.token_key, None)
+        cache.delete(self.token_key)
+
+    def _authorized_post(self, path, payload, idempotent=False):
+        """POST with a bearer token, fetching a new token once if it was rejected"""
+        for attempt in range(2):
+            response = self._request('POST', path, idempotent=idempotent, json=payload,
+                                     headers={'Authorization': f'Bearer {self.get_token()}'})
+            if response.status_code != 401 or attempt:
+                break
+            self.invalidate_token()
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if response.status_code != 200:
+            message = data.get('errorMessage') or f'M-Pesa returned {response.status_code}'
+            raise MpesaError(message, status_code=response.status_code, response=response)
+        return data
+
+    # STK push
+
+    def stk_password(self, timestamp):
+        raw = f'{self.business_short_code}{self.passkey}{timestamp}'
+        return base64.b64encode(raw.encode()).decode()
+
+    def stk_push(self, phone_number, amount, account_reference, description, callback_url=None):
+        """
+        Send an STK push (Lipa na M-Pesa Online) prompt to a customer's phone.
+
+        Returns:
+            dict: Daraja's response, including MerchantRequestID and
+                CheckoutRequestID
+
+        Raises:
+            MpesaError: when the request fails or Daraja rejects it
+        """
+        callback_url = callback_url or self.callback_url
+        if not callback_url:
+            raise MpesaError('No M-Pesa callback URL configured')
+
+        phone_number = normalize_phone_number(phone_number)
+        timestamp = timezone.localtime().strftime('%Y%m%d%H%M%S')
+        payload = {
+            'BusinessShortCode': self.business_short_code,
+            'Password': self.stk_password(timestamp),
+            'Timestamp': timestamp,
+            'TransactionType': 'CustomerPayBillOnline',
+            # Daraja only accepts whole shillings
+            'Amount': int(Decimal(amount).to_integral_value(rounding=ROUND_CEILING)),
+            'PartyA': phone_number,
+            'PartyB': self.business_short_code,
+            'PhoneNumber': phone_number,
+            'CallBackURL': callback_url,
+            'AccountReference': account_reference[:12],
+            'TransactionDesc': description[:13],
+        }
+        data = self._authorized_post(STK_PUSH_PATH, payload)
+        if str(data.get('ResponseCode')) != '0':
+            raise MpesaError(data.get('ResponseDescription') or 'M-Pesa rejected the STK push', response=data)
+        return data
+
+    def stk_query(self, checkout_request_id):
+        """
+        Ask Daraja for the result of an STK push.
+
+        Returns:
+            dict: Daraja's response, including ResultCode and ResultDesc
+
+        Raises:
+            MpesaError: when the request fails, or the push has no result yet
+        """
+        timestamp = timezone.localtime().strftime('%Y%m%d%H%M%S')
+        return self._authorized_post(STK_QUERY_PATH, {
+            'BusinessShortCode': self.business_short_code,
+            'Password': self.stk_password(timestamp),
+            'Timestamp': timestamp,
+            'CheckoutRequestID': checkout_request_id,
+        }, idempotent=True)
+
+
+def config_for_property(property_obj):
+    """
+    The active M-Pesa config payments for a property go through: its own
+    PropertyMpesaConfig unless that defers to the organization's MpesaConfig.
+    """
+    from properties.models import MpesaConfig, PropertyMpesaConfig
+
+    config = PropertyMpesaConfig.objects.filter(property=property_obj, is_active=True).first()
+    if config is None or config.use_organization_config:
+        config = MpesaConfig.objects.filter(organization_id=property_obj.organization_id, is_active=True).first()
+    return config
+
+
+def get_client(config):
+    """
+    Return the shared client for an MpesaConfig or PropertyMpesaConfig.
+
+    A new client is built when the config has been edited since.
+    """
+    key = (config._meta.label, config.pk)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None and client.updated_at == config.updated_at:
+            return client
+        if client is not None:
+            client.close()
+        client = MpesaClient(config)
+        _clients[key] = client
+        return client
+
+
+def clear_clients():
+    """Close every pooled session and forget cached tokens"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+    _tokens.clear()
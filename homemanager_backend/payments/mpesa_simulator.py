@@ -0,0 +1,250 @@
+"""
+Local stand-in for the M-Pesa Daraja API.
+
+DarajaSimulator serves the OAuth, STK push and STK query endpoints used by
+payments.mpesa from a background thread on localhost, with HTTP/1.1
+keep-alive, so tests and benchmarks can exercise the real client without
+network access. It counts connections, token requests and STK pushes, can
+add per-call and per-connection (handshake) latency, can fail upcoming
+requests on demand, and can post the STK result callback to the request's
+CallBackURL like Daraja does. STK queries report the results recorded with
+set_result (or posted as callbacks).
+
+    with DarajaSimulator() as simulator:
+        client = MpesaClient(config, base_url=simulator.base_url)
+        client.stk_push('0712345678', 1000, 'Rent-1', 'Rent')
+
+Run it standalone with the run_mpesa_simulator command and point
+MPESA_BASE_URL at it.
+"""
+import base64
+import json
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from .mpesa import TOKEN_PATH, STK_PUSH_PATH, STK_QUERY_PATH
+
+STK_REQUIRED_FIELDS = (
+    'BusinessShortCode', 'Password', 'Timestamp', 'TransactionType', 'Amount',
+    'PartyA', 'PartyB', 'PhoneNumber', 'CallBackURL', 'AccountReference', 'TransactionDesc',
+)
+STK_QUERY_REQUIRED_FIELDS = ('BusinessShortCode', 'Password', 'Timestamp', 'CheckoutRequestID')
+
+
+def stk_callback_payload(stk_request, response, result_code=0, receipt_number=None):
+    """
+    The body Daraja posts to the CallBackURL once the customer answers the
+    STK prompt. result_code 0 is a successful payment; 1032 means the
+    customer cancelled.
+    """
+    callback = {
+        'MerchantRequestID': response['MerchantRequestID'],
+        'CheckoutRequestID': response['CheckoutRequestID'],
+        'ResultCode': result_code,
+        'ResultDesc': 'The service request is processed successfully.' if result_code == 0
+        else 'Request cancelled by user',
+    }
+    if result_code == 0:
+        callback['CallbackMetadata'] = {'Item': [
+            {'Name': 'Amount', 'Value': stk_request['Amount']},
+            {'Name': 'MpesaReceiptNumber', 'Value': receipt_number or uuid.uuid4().hex[:10].upper()},
+            {'Name': 'TransactionDate', 'Value': int(time.strftime('%Y%m%d%H%M%S'))},
+            {'Name': 'PhoneNumber', 'Value': int(stk_request['PhoneNumber'])},
+        ]}
+    return {'Body': {'stkCallback': callback}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # One handler instance serves one (kept-alive) connection
+        simulator = self.server.simulator
+        with simulator.lock:
+            simulator.connections += 1
+        if simulator.connect_latency:
+            # Stands in for the TCP + TLS handshake of a real Daraja connection
+            time.sleep(simulator.connect_latency)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return None
+
+    def has_basic_auth(self):
+        credentials = self.headers.get('Authorization', '')
+        if not credentials.startswith('Basic '):
+            return False
+        try:
+            return ':' in base64.b64decode(credentials[6:]).decode()
+        except ValueError:
+            return False
+
+    def do_GET(self):
+        simulator = self.server.simulator
+        if self.path != TOKEN_PATH:
+            return self.send_json(404, {'errorMessage': 'Not found'})
+        if simulator.take_failure():
+            return self.send_json(simulator.failure_status, {'errorMessage': 'Simulated failure'})
+        simulator.delay()
+        if not self.has_basic_auth():
+            return self.send_json(400, {'errorCode': '400.008.01', 'errorMessage': 'Invalid Authentication passed'})
+        self.send_json(200, simulator.issue_token())
+
+    def do_POST(self):
+        simulator = self.server.simulator
+        payload = self.read_json()
+        required = {STK_PUSH_PATH: STK_REQUIRED_FIELDS, STK_QUERY_PATH: STK_QUERY_REQUIRED_FIELDS}.get(self.path)
+        if required is None:
+            return self.send_json(404, {'errorMessage': 'Not found'})
+        if simulator.take_failure():
+            return self.send_json(simulator.failure_status, {'errorMessage': 'Simulated failure'})
+        simulator.delay()
+        token = self.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not simulator.token_valid(token):
+            return self.send_json(401, {'errorCode': '404.001.03', 'errorMessage': 'Invalid Access Token'})
+        missing = [field for field in required if not (payload or {}).get(field)]
+        if missing:
+            return self.send_json(400, {'errorCode': '400.002.02',
+                                        'errorMessage': f'Bad Request - Invalid {missing[0]}'})
+        if self.path == STK_QUERY_PATH:
+            result_code = simulator.results.get(payload['CheckoutRequestID'])
+            if result_code is None:
+                return self.send_json(500, {'errorCode': '500.001.1001',
+                                            'errorMessage': 'The transaction is being processed'})
+            return self.send_json(200, {
+                'ResponseCode': '0',
+                'ResponseDescription': 'The service request has been accepted successfully',
+                'CheckoutRequestID': payload['CheckoutRequestID'],
+                'ResultCode': str(result_code),
+                'ResultDesc': 'The service request is processed successfully.' if result_code == 0
+                else 'Request cancelled by user',
+            })
+        self.send_json(200, simulator.accept_stk_push(payload))
+
+
+class DarajaSimulator:
+    """A Daraja API stand-in served from a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=0, token_lifetime=3599, latency=0, connect_latency=0,
+                 send_callbacks=False):
+        self.token_lifetime = token_lifetime
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.send_callbacks = send_callbacks
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.token_requests = 0
+        self.stk_requests = []
+        # {CheckoutRequestID: ResultCode} reported by STK queries
+        self.results = {}
+        self.tokens = {}
+        self.failures = 0
+        self.failure_status = 503
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.simulator = self
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def fail_next(self, count=1, status=503):
+        """Answer the next `count` requests with an error status"""
+        with self.lock:
+            self.failures = count
+            self.failure_status = status
+
+    def take_failure(self):
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                return True
+            return False
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def issue_token(self):
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.token_requests += 1
+            self.tokens[token] = time.time() + self.token_lifetime
+        return {'access_token': token, 'expires_in': str(self.token_lifetime)}
+
+    def token_valid(self, token):
+        with self.lock:
+            return self.tokens.get(token, 0) > time.time()
+
+    def expire_tokens(self):
+        """Invalidate every issued token, as if they had all expired"""
+        with self.lock:
+            self.tokens.clear()
+
+    def accept_stk_push(self, payload):
+        response = {
+            'MerchantRequestID': f'{uuid.uuid4().int % 10 ** 5}-{uuid.uuid4().int % 10 ** 8}-1',
+            'CheckoutRequestID': f'ws_CO_{time.strftime("%d%m%Y%H%M%S")}{uuid.uuid4().hex[:12]}',
+            'ResponseCode': '0',
+            'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing',
+        }
+        with self.lock:
+            self.stk_requests.append((payload, response))
+        if self.send_callbacks:
+            threading.Thread(target=self.post_callback, args=(payload, response), daemon=True).start()
+        return response
+
+    def set_result(self, checkout_request_id, result_code=0):
+        """Record the result STK queries report for a push"""
+        with self.lock:
+            self.results[checkout_request_id] = result_code
+
+    def post_callback(self, stk_request, response, result_code=0):
+        """Post the STK result to the request's CallBackURL"""
+        self.set_result(response['CheckoutRequestID'], result_code)
+        body = json.dumps(stk_callback_payload(stk_request, response, result_code)).encode()
+        url = stk_request['CallBackURL']
+        if not urlsplit(url).scheme:
+            return
+        request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+        except OSError:
+            pass
@@ -0,0 +1,272 @@
+"""
+M-Pesa statement reconciliation.
+
+reconcile_statement() settles an organization's outstanding rent payments
+against an M-Pesa paybill statement export (CSV), for payments made
+without an STK push. The organization's outstanding payments are loaded
+once into hash indexes by payment reference (Rent-{id}, as sent by
+initiate_mpesa), unit access code and normalized tenant phone number. The
+statement is then streamed in batches: each line looks up its candidates by
+account reference, then access code, then phone number, and takes the
+oldest candidate whose amount due (rent plus late fee) equals the amount
+paid. Each batch costs a fixed number of queries: one to skip receipts
+already recorded, a bulk_update of the matched payments' receipts and
+dates, and one UPDATE of their status. Both updates skip payments settled
+since the indexes were loaded; when the UPDATE changes fewer rows than
+were matched, one more query finds those lines.
+
+Lines that cannot be settled are written to an exceptions CSV with the
+reason, for review by hand. Re-running a statement is harmless: receipts
+already recorded as a payment's transaction ID are skipped.
+"""
+import csv
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import RentPayment
+from .mpesa import normalize_phone_number
+
+# Payments a statement line can settle
+OUTSTANDING_STATUSES = ('pending', 'overdue', 'initiated')
+
+# Statement column names, by field
+COLUMNS = {
+    'receipt': ('Receipt No.', 'Receipt No', 'Receipt', 'Transaction ID'),
+    'completed_at': ('Completion Time', 'Transaction Time', 'Date'),
+    'status': ('Transaction Status', 'Status'),
+    'paid_in': ('Paid In', 'Amount'),
+    'party': ('Other Party Info', 'Other Party', 'Phone Number'),
+    'account': ('A/C No.', 'A/C No', 'Account No.', 'Account Reference', 'Account'),
+    'details': ('Details',),
+}
+
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%d-%m-%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%Y-%m-%d %H:%M', '%d-%m-%Y %H:%M')
+
+REFERENCE_PATTERN = re.compile(r'^rent-(\d+)$', re.IGNORECASE)
+# "Pay Bill from 254712345678 - JOHN DOE Acc. Rent-12"
+DETAILS_ACCOUNT_PATTERN = re.compile(r'\bAcc\.?\s*(\S+)', re.IGNORECASE)
+PHONE_PATTERN = re.compile(r'\+?\d{9,12}')
+
+EXCEPTION_FIELDS = ('line', 'receipt', 'completed_at', 'amount', 'phone', 'account', 'reason', 'candidates')
+
+
+def reconciliation_batch_size():
+    return getattr(settings, 'RECONCILIATION_BATCH_SIZE', 1000)
+
+
+def parse_amount(value):
+    try:
+        return Decimal(str(value).replace(',', '').strip() or 0)
+    except InvalidOperation:
+        return Decimal('0')
+
+
+def parse_time(value):
+    value = (value or '').strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return timezone.make_aware(datetime.strptime(value, date_format))
+        except ValueError:
+            continue
+    return None
+
+
+def read_statement(statement):
+    """
+    Yield the lines of a statement export as dicts of receipt, completed_at,
+    status, amount, phone and account, with their line numbers.
+
+    Rows before the header row (report title, paybill details, ...) are
+    skipped, and rows are read one at a time.
+    """
+    reader = csv.reader(statement)
+    columns = None
+    for row in reader:
+        row = [cell.strip() for cell in row]
+        if columns is None:
+            found = {
+                field: next((row.index(name) for name in names if name in row), None)
+                for field, names in COLUMNS.items()
+            }
+            if found['receipt'] is not None and found['paid_in'] is not None:
+                columns = found
+            continue
+        if not any(row):
+            continue
+
+        def cell(field):
+            index = columns[field]
+            return row[index] if index is not None and index < len(row) else ''
+
+        account = cell('account')
+        if not account:
+            match = DETAILS_ACCOUNT_PATTERN.search(cell('details'))
+            account = match.group(1) if match else ''
+        phone = PHONE_PATTERN.search(cell('party') or cell('details'))
+        yield {
+            'line': reader.line_num,
+            'receipt': cell('receipt'),
+            'completed_at': cell('completed_at'),
+            'status': cell('status') or 'Completed',
+            'amount': parse_amount(cell('paid_in')),
+            'phone': normalize_phone_number(phone.group()) if phone else '',
+            'account': account,
+        }
+    if columns is None:
+        raise ValueError('No statement header row with receipt and paid in columns found')
+
+
+class OutstandingPayments:
+    """Hash indexes over an organization's outstanding rent payments"""
+
+    def __init__(self, organization):
+        rows = RentPayment.objects.filter(
+            organization=organization, status__in=OUTSTANDING_STATUSES
+        ).annotate(
+            total_due=F('amount') + F('late_fee_applied'),
+        ).values_list(
+            'pk', 'total_due', 'unit__access_code', 'tenant__phone_number'
+        ).order_by('due_date', 'pk')
+
+        self.amounts = {}
+        self.by_access_code = {}
+        self.by_phone = {}
+        for pk, total_due, access_code, phone_number in rows:
+            self.amounts[pk] = total_due
+            if access_code:
+                self.by_access_code.setdefault(access_code.upper(), []).append(pk)
+            if phone_number:
+                self.by_phone.setdefault(normalize_phone_number(phone_number), []).append(pk)
+
+    def candidates(self, line):
+        """Outstanding payments a statement line may be for, best key first"""
+        account = line['account'].strip()
+        reference = REFERENCE_PATTERN.match(account)
+        if reference and int(reference.group(1)) in self.amounts:
+            return [int(reference.group(1))]
+        if account.upper() in self.by_access_code:
+            return self.by_access_code[account.upper()]
+        return self.by_phone.get(line['phone'], [])
+
+    def match(self, line):
+        """
+        Claim the oldest candidate whose amount due equals the amount paid.
+
+        Returns:
+            tuple: (payment pk or None, reason, candidate pks)
+        """
+        candidates = [pk for pk in self.candidates(line) if pk in self.amounts]
+        if not candidates:
+            return None, 'unmatched', candidates
+        for pk in candidates:
+            if self.amounts[pk] == line['amount']:
+                # Settled payments cannot be matched again
+                del self.amounts[pk]
+                return pk, None, candidates
+        return None, 'amount_mismatch', candidates
+
+
+def reconcile_statement(organization, statement, exceptions, batch_size=None, dry_run=False):
+    """
+    Settle an organization's outstanding rent payments from a statement.
+
+    Args:
+        organization: Organization whose paybill the statement is for
+        statement: Text file of the statement CSV export
+        exceptions: Text file the exceptions CSV is written to
+        batch_size: Statement lines per batch (default: settings.RECONCILIATION_BATCH_SIZE)
+        dry_run: Match without updating any payment
+
+    Returns:
+        dict: line counts: 'lines' read, 'matched', 'exceptions', 'skipped'
+            (not completed paid-in transactions) and 'already_reconciled'
+    """
+    batch_size = batch_size or reconciliation_batch_size()
+    outstanding = OutstandingPayments(organization)
+    writer = csv.DictWriter(exceptions, fieldnames=EXCEPTION_FIELDS)
+    writer.writeheader()
+    summary = dict.fromkeys(('lines', 'matched', 'exceptions', 'skipped', 'already_reconciled'), 0)
+    seen_receipts = set()
+
+    def write_exception(line, reason, candidates):
+        summary['exceptions'] += 1
+        writer.writerow({
+            **{field: line[field] for field in ('line', 'receipt', 'completed_at', 'phone', 'account')},
+            'amount': line['amount'],
+            'reason': reason,
+            'candidates': ' '.join(str(candidate) for candidate in candidates),
+        })
+
+    def apply(batch):
+        receipts = [line['receipt'] for line in batch]
+        recorded = set(RentPayment.objects.filter(
+            organization=organization, transaction_id__in=receipts
+        ).values_list('transaction_id', flat=True))
+
+        now = timezone.now()
+        settled = []
+        settled_lines = {}
+        for line in batch:
+            if line['receipt'] in recorded:
+                summary['already_reconciled'] += 1
+                continue
+            pk, reason, candidates = outstanding.match(line)
+            if pk is None:
+                write_exception(line, reason, candidates)
+                continue
+            settled.append(RentPayment(
+                pk=pk,
+                payment_date=parse_time(line['completed_at']) or now,
+                transaction_id=line['receipt'],
+            ))
+            settled_lines[pk] = (line, candidates)
+
+        unsettled = set()
+        if settled and not dry_run:
+            with transaction.atomic():
+                # Filtering on status skips payments settled since the indexes were loaded
+                outstanding_rows = RentPayment.objects.filter(status__in=OUTSTANDING_STATUSES)
+                # bulk_update costs a CASE branch per row and column, so only the
+                # per-line columns go through it; the rest is one plain UPDATE
+                outstanding_rows.bulk_update(settled, ['payment_date', 'transaction_id'])
+                updated = outstanding_rows.filter(pk__in=settled_lines).update(
+                    status='completed', payment_method='m_pesa', updated_at=now,
+                )
+                if updated < len(settled):
+                    current = dict(RentPayment.objects.filter(
+                        pk__in=settled_lines
+                    ).values_list('pk', 'transaction_id'))
+                    unsettled = {
+                        pk for pk, (line, _) in settled_lines.items()
+                        if current.get(pk) != line['receipt']
+                    }
+
+        for pk, (line, candidates) in settled_lines.items():
+            if pk in unsettled:
+                write_exception(line, 'already_settled', candidates)
+            else:
+                summary['matched'] += 1
+
+    batch = []
+    for line in read_statement(statement):
+        summary['lines'] += 1
+        if line['status'].lower() != 'completed' or line['amount'] <= 0 or not line['receipt']:
+            summary['skipped'] += 1
+            continue
+        if line['receipt'] in seen_receipts:
+            summary['already_reconciled'] += 1
+            continue
+        seen_receipts.add(line['receipt'])
+        batch.append(line)
+        if len(batch) >= batch_size:
+            apply(batch)
+            batch = []
+    if batch:
+        apply(batch)
+    return summary
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import RentPayment, MpesaPayment
+from .models import RentPayment, MpesaPayment, LateFeePolicy
 
 class MpesaPaymentSerializer(serializers.ModelSerializer):
     """Serializer for the MpesaPayment model"""
@@ -31,8 +31,9 @@ class RentPaymentSerializer(serializers.ModelSerializer):
         fields = ['id', 'unit', 'unit_number', 'property_name', 'tenant', 'tenant_name',
                  'tenant_phone', 'amount', 'due_date', 'payment_date', 'status',
                  'status_display', 'payment_method', 'payment_method_display',
-                 'transaction_id', 'description', 'receipt_sent', 'late_fee_applied']
-        read_only_fields = ['id', 'transaction_id']
+                 'transaction_id', 'description', 'receipt_sent', 'late_fee_applied',
+                 'lease', 'billing_period']
+        read_only_fields = ['id', 'transaction_id', 'lease', 'billing_period']
     
     def get_property_name(self, obj):
         return obj.unit.property.name
@@ -43,3 +44,29 @@ class RentPaymentDetailSerializer(RentPaymentSerializer):
     
     class Meta(RentPaymentSerializer.Meta):
         fields = RentPaymentSerializer.Meta.fields + ['mpesa_transactions']
+
+class LateFeePolicySerializer(serializers.ModelSerializer):
+    """Serializer for the LateFeePolicy model"""
+    property_name = serializers.CharField(source='property.name', read_only=True, default=None)
+    
+    class Meta:
+        model = LateFeePolicy
+        fields = ['id', 'organization', 'property', 'property_name', 'grace_days', 'flat_fee',
+                  'percentage', 'daily_fee', 'max_fee', 'is_active', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'organization', 'created_at', 'updated_at']
+    
+    def validate(self, data):
+        organization = self.context['organization']
+        if organization is None:
+            raise serializers.ValidationError('No organization found')
+        property_obj = data.get('property', self.instance.property if self.instance else None)
+        if property_obj is not None and property_obj.organization_id != organization.pk:
+            raise serializers.ValidationError({'property': 'Property not found in your organization.'})
+        
+        existing = LateFeePolicy.objects.filter(organization=organization, property=property_obj)
+        if self.instance:
+            existing = existing.exclude(pk=self.instance.pk)
+        if existing.exists():
+            raise serializers.ValidationError('A late fee policy already exists for this property or organization.')
+        return data
+
@@ -1,3 +1,580 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
+import tempfile
+from io import StringIO
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from users.models import User
+from organizations.models import Organization
+from properties.models import Property, Unit, MpesaConfig
+from tenants.models import Tenant, Lease
+from .models import RentPayment, MpesaPayment, MpesaCallback, BillingRun, LateFeePolicy
+from .billing import generate_rent_charges
+from .callbacks import process_pending_callbacks
+from .late_fees import assess_late_fees
+from .reconciliation import OutstandingPayments, reconcile_statement
+from .mpesa import MpesaClient, MpesaError, clear_clients
+from .mpesa_simulator import DarajaSimulator, stk_callback_payload
 
-# Create your tests here.
+
+class RentChargeGenerationTests(TestCase):
+    """Monthly charges are created in bulk, once per lease and period"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Billing Org', email='billing@example.com')
+        owner = User.objects.create_user(username='billing-owner', password='securepassword',
+                                         organization=self.organization)
+        self.property = Property.objects.create(owner=owner, organization=self.organization, name='Court',
+                                                address='Nairobi', property_type='residential')
+        self.leases = [self.create_lease(n, date(2025, 1, 1), date(2025, 12, 31)) for n in range(5)]
+        # Ended before, inactive, and starting after the billed month
+        self.create_lease(5, date(2024, 1, 1), date(2024, 12, 31))
+        inactive = self.create_lease(6, date(2025, 1, 1), date(2025, 12, 31))
+        Lease.objects.filter(pk=inactive.pk).update(is_active=False)
+        self.create_lease(7, date(2025, 4, 1), date(2026, 3, 31))
+
+    def create_lease(self, n, start, end):
+        unit = Unit.objects.create(property=self.property, unit_number=str(n),
+                                   monthly_rent=Decimal('1000.00') + n)
+        tenant = Tenant.objects.create(name=f'Tenant {n}', phone_number='0700000000', unit=unit,
+                                       move_in_date=start)
+        return Lease.objects.create(unit=unit, tenant=tenant, start_date=start, end_date=end)
+
+    def test_generate_charges(self):
+        # One chunk: a fixed number of queries however many leases it holds
+        with self.assertNumQueries(15):
+            run = generate_rent_charges(date(2025, 3, 15), chunk_size=100)
+
+        self.assertEqual(run.period, date(2025, 3, 1))
+        self.assertEqual(run.status, 'completed')
+        self.assertEqual(run.payments_created, 5)
+        payments = RentPayment.objects.order_by('lease_id')
+        self.assertEqual([p.lease_id for p in payments], [lease.pk for lease in self.leases])
+        self.assertEqual(payments[1].amount, Decimal('1001.00'))
+        self.assertEqual(payments[0].due_date, date(2025, 3, 5))
+        self.assertEqual(payments[0].status, 'pending')
+        self.assertEqual(payments[0].organization_id, self.organization.pk)
+
+    def test_idempotent_per_period(self):
+        generate_rent_charges(date(2025, 3, 1))
+        run = generate_rent_charges(date(2025, 3, 1), restart=True)
+        self.assertEqual(RentPayment.objects.count(), 5)
+        # The rescan found every lease billed already
+        self.assertEqual((run.leases_processed, run.payments_created), (5, 0))
+
+        generate_rent_charges(date(2025, 4, 1))
+        self.assertEqual(RentPayment.objects.filter(billing_period=date(2025, 4, 1)).count(), 6)
+
+    def test_dropped_rows_not_counted(self):
+        """Rows bulk_create drops as conflicts are not counted as created"""
+        original = RentPayment.objects.bulk_create
+
+        def drop_first(objs, **kwargs):
+            return original(objs[1:], **kwargs)
+
+        with mock.patch.object(RentPayment.objects, 'bulk_create', side_effect=drop_first):
+            run = generate_rent_charges(date(2025, 3, 1))
+        self.assertEqual(RentPayment.objects.count(), 4)
+        self.assertEqual(run.payments_created, 4)
+
+    def test_resume_after_failure(self):
+        original = RentPayment.objects.bulk_create
+        calls = []
+
+        def fail_second_chunk(objs, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 2:
+                raise RuntimeError('connection lost')
+            return original(objs, **kwargs)
+
+        with mock.patch.object(RentPayment.objects, 'bulk_create', side_effect=fail_second_chunk), \
+                self.assertLogs('payments.billing', 'ERROR'):
+            run = generate_rent_charges(date(2025, 3, 1), chunk_size=2)
+        self.assertEqual(run.status, 'failed')
+        self.assertEqual(run.last_lease_id, self.leases[1].pk)
+        self.assertEqual(RentPayment.objects.count(), 2)
+
+        out = StringIO()
+        call_command('generate_rent_charges', period='2025-03', chunk_size=2, stdout=out)
+        self.assertIn('5 payments created', out.getvalue())
+        self.assertEqual(RentPayment.objects.count(), 5)
+        self.assertEqual(BillingRun.objects.get().status, 'completed')
+
+
+class LateFeeAssessmentTests(TestCase):
+    """Past-due payments are marked overdue and charged under the applicable policy"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Fee Org', email='fees@example.com')
+        self.owner = User.objects.create_user(username='fee-owner', password='securepassword',
+                                              organization=self.organization)
+        self.organization.primary_owner = self.owner
+        self.organization.save()
+        self.court = Property.objects.create(owner=self.owner, organization=self.organization, name='Court',
+                                             address='Nairobi', property_type='residential')
+        self.tower = Property.objects.create(owner=self.owner, organization=self.organization, name='Tower',
+                                             address='Nairobi', property_type='residential')
+        LateFeePolicy.objects.create(organization=self.organization, grace_days=5,
+                                     flat_fee=Decimal('500.00'), daily_fee=Decimal('100.00'))
+        LateFeePolicy.objects.create(organization=self.organization, property=self.tower, grace_days=0,
+                                     percentage=Decimal('10.00'), daily_fee=Decimal('50.00'),
+                                     max_fee=Decimal('1200.00'))
+
+        self.court_late = self.create_payment(self.court, '1', date(2025, 3, 1))
+        self.court_grace = self.create_payment(self.court, '2', date(2025, 3, 8))
+        self.tower_late = self.create_payment(self.tower, '1', date(2025, 3, 1))
+        self.not_due = self.create_payment(self.tower, '2', date(2025, 3, 20))
+        self.paid = self.create_payment(self.court, '3', date(2025, 3, 1), status='completed')
+
+    def create_payment(self, prop, unit_number, due_date, status='pending'):
+        unit = Unit.objects.create(property=prop, unit_number=unit_number, monthly_rent=Decimal('10000.00'))
+        tenant = Tenant.objects.create(name=f'Tenant {prop.name} {unit_number}', phone_number='0700000000',
+                                       unit=unit, move_in_date=date(2025, 1, 1))
+        return RentPayment.objects.create(unit=unit, tenant=tenant, amount=Decimal('10000.00'),
+                                          due_date=due_date, status=status)
+
+    def test_assess_late_fees(self):
+        result = assess_late_fees(today=date(2025, 3, 10), batch_size=2)
+        self.assertEqual(result, {'assessed': 3, 'updated': 3})
+
+        for payment in (self.court_late, self.court_grace, self.tower_late, self.not_due, self.paid):
+            payment.refresh_from_db()
+        # Organization policy: 9 days late, 4 past grace
+        self.assertEqual(self.court_late.status, 'overdue')
+        self.assertEqual(self.court_late.late_fee_applied, Decimal('900.00'))
+        # Overdue but still within the grace period
+        self.assertEqual(self.court_grace.status, 'overdue')
+        self.assertEqual(self.court_grace.late_fee_applied, Decimal('0.00'))
+        # Property policy: 10% plus 9 days at 50, capped
+        self.assertEqual(self.tower_late.late_fee_applied, Decimal('1200.00'))
+        self.assertEqual(self.not_due.status, 'pending')
+        self.assertEqual(self.paid.status, 'completed')
+
+        # Re-running the same day changes nothing; fees accrue on later days
+        self.assertEqual(assess_late_fees(today=date(2025, 3, 10))['updated'], 0)
+        assess_late_fees(today=date(2025, 3, 11))
+        self.court_late.refresh_from_db()
+        self.assertEqual(self.court_late.late_fee_applied, Decimal('1000.00'))
+
+    def test_constant_queries_per_batch(self):
+        # Policies, then per batch: read, one bulk update; plus the final empty read
+        with self.assertNumQueries(6):
+            assess_late_fees(today=date(2025, 3, 10), batch_size=2)
+
+    def test_policy_api(self):
+        client = APIClient()
+        client.force_authenticate(user=self.owner)
+        url = reverse('latefeepolicy-list')
+        self.assertEqual(len(client.get(url).data['results']), 2)
+
+        response = client.post(url, {'property': self.court.pk, 'grace_days': 3, 'flat_fee': '250.00'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['organization'], self.organization.pk)
+        response = client.post(url, {'property': self.court.pk, 'grace_days': 1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(MPESA_RETRY_BACKOFF=0, MPESA_CALLBACK_URL='https://example.com/api/payments/mpesa/callback/')
+class MpesaClientTests(TestCase):
+    """The Daraja client reuses connections and tokens and retries only what is safe"""
+
+    def setUp(self):
+        cache.clear()
+        clear_clients()
+        self.simulator = DarajaSimulator().start()
+        self.addCleanup(self.simulator.stop)
+        self.addCleanup(clear_clients)
+        self.config = MpesaConfig(consumer_key='key', consumer_secret='secret', business_short_code='174379',
+                                  passkey='passkey')
+
+    def client_for(self):
+        client = MpesaClient(self.config, base_url=self.simulator.base_url)
+        self.addCleanup(client.close)
+        return client
+
+    def test_reuses_connection_and_token(self):
+        client = self.client_for()
+        for n in range(3):
+            response = client.stk_push('0712345678', Decimal('1000.50'), f'Rent-{n}', 'Rent payment')
+            self.assertEqual(response['ResponseCode'], '0')
+
+        self.assertEqual(self.simulator.connections, 1)
+        self.assertEqual(self.simulator.token_requests, 1)
+        payload = self.simulator.stk_requests[0][0]
+        self.assertEqual(payload['PhoneNumber'], '254712345678')
+        self.assertEqual(payload['Amount'], 1001)
+
+    def test_single_flight_token_refresh(self):
+        client = self.client_for()
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda n: client.stk_push('0712345678', 1000, f'Rent-{n}', 'Rent'), range(16)))
+        self.assertEqual(self.simulator.token_requests, 1)
+        self.assertEqual(len(self.simulator.stk_requests), 16)
+
+    def test_token_shared_between_clients(self):
+        self.client_for().get_token()
+        self.client_for().get_token()
+        self.assertEqual(self.simulator.token_requests, 1)
+
+    def test_retries(self):
+        client = self.client_for()
+        # Token requests are retried on 5xx
+        self.simulator.fail_next(2)
+        with self.assertLogs('payments.mpesa', 'WARNING'):
+            client.get_token()
+        self.assertEqual(self.simulator.token_requests, 1)
+
+        # STK pushes are not, so the customer never gets two prompts
+        self.simulator.fail_next(1)
+        with self.assertRaises(MpesaError):
+            client.stk_push('0712345678', 1000, 'Rent-1', 'Rent')
+        self.assertEqual(len(self.simulator.stk_requests), 0)
+
+    def test_rejected_token_is_refreshed(self):
+        client = self.client_for()
+        client.stk_push('0712345678', 1000, 'Rent-1', 'Rent')
+        self.simulator.expire_tokens()
+        client.stk_push('0712345678', 1000, 'Rent-2', 'Rent')
+        self.assertEqual(self.simulator.token_requests, 2)
+        self.assertEqual(len(self.simulator.stk_requests), 2)
+
+    def test_initiate_mpesa(self):
+        organization = Organization.objects.create(name='Mpesa Org', email='mpesa@example.com')
+        owner = User.objects.create_user(username='mpesa-owner', password='securepassword',
+                                         organization=organization)
+        prop = Property.objects.create(owner=owner, organization=organization, name='Court',
+                                       address='Nairobi', property_type='residential')
+        unit = Unit.objects.create(property=prop, unit_number='1', monthly_rent=Decimal('1000.00'))
+        tenant = Tenant.objects.create(name='Tenant', phone_number='0712345678', unit=unit,
+                                       move_in_date=date(2025, 1, 1))
+        payment = RentPayment.objects.create(unit=unit, tenant=tenant, amount=Decimal('1000.00'),
+                                             due_date=date(2025, 3, 5))
+        client = APIClient()
+        client.force_authenticate(user=owner)
+        url = reverse('rentpayment-initiate-mpesa', args=[payment.pk])
+
+        response = client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        MpesaConfig.objects.create(organization=organization, consumer_key='key', consumer_secret='secret',
+                                   business_short_code='174379', passkey='passkey')
+        with override_settings(MPESA_BASE_URL=self.simulator.base_url):
+            response = client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['checkout_request_id'], self.simulator.stk_requests[0][1]['CheckoutRequestID'])
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'initiated')
+        # Results are posted back with the payment's secret callback token
+        callback_token = MpesaPayment.objects.get(rent_payment=payment).callback_token
+        self.assertTrue(self.simulator.stk_requests[0][0]['CallBackURL'].endswith(f'?token={callback_token}'))
+        self.assertNotIn('callback_token', response.data)
+
+
+class MpesaCallbackTests(TestCase):
+    """STK results are applied once per checkout request, inline or in batches"""
+
+    def setUp(self):
+        cache.clear()
+        clear_clients()
+        self.simulator = DarajaSimulator().start()
+        self.addCleanup(self.simulator.stop)
+        self.addCleanup(clear_clients)
+        simulated = override_settings(MPESA_BASE_URL=self.simulator.base_url, MPESA_MAX_RETRIES=0)
+        simulated.enable()
+        self.addCleanup(simulated.disable)
+
+        organization = Organization.objects.create(name='Callback Org', email='callbacks@example.com')
+        owner = User.objects.create_user(username='callback-owner', password='securepassword',
+                                         organization=organization)
+        prop = Property.objects.create(owner=owner, organization=organization, name='Court',
+                                       address='Nairobi', property_type='residential')
+        MpesaConfig.objects.create(organization=organization, consumer_key='key', consumer_secret='secret',
+                                   business_short_code='174379', passkey='passkey')
+        self.payments = []
+        for n in range(2):
+            unit = Unit.objects.create(property=prop, unit_number=str(n), monthly_rent=Decimal('1000.00'))
+            tenant = Tenant.objects.create(name=f'Tenant {n}', phone_number='0712345678', unit=unit,
+                                           move_in_date=date(2025, 1, 1))
+            payment = RentPayment.objects.create(unit=unit, tenant=tenant, amount=Decimal('1000.00'),
+                                                 due_date=date(2025, 3, 5), status='initiated')
+            MpesaPayment.objects.create(rent_payment=payment, phone_number='254712345678',
+                                        amount=payment.amount, reference=f'Rent-{payment.pk}',
+                                        description='Rent', checkout_request_id=f'ws_CO_{n}',
+                                        callback_token=f'token-{n}')
+            self.payments.append(payment)
+        self.client = APIClient()
+        self.url = reverse('mpesa-callback')
+
+    def post_result(self, checkout_request_id, result_code=0, receipt_number='QKJ1234567', amount=1000,
+                    token=None):
+        body = stk_callback_payload(
+            {'Amount': amount, 'PhoneNumber': '254712345678'},
+            {'MerchantRequestID': '1-1-1', 'CheckoutRequestID': checkout_request_id},
+            result_code=result_code, receipt_number=receipt_number,
+        )
+        token = token or f'token-{checkout_request_id.removeprefix("ws_CO_")}'
+        return self.client.post(f'{self.url}?token={token}', body, format='json')
+
+    def test_success_applied_once(self):
+        self.simulator.set_result('ws_CO_0')
+        response = self.post_result('ws_CO_0')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['ResultCode'], 0)
+
+        mpesa_payment = MpesaPayment.objects.get(checkout_request_id='ws_CO_0')
+        self.assertEqual(mpesa_payment.result_code, '0')
+        self.assertEqual(mpesa_payment.mpesa_receipt_number, 'QKJ1234567')
+        payment = RentPayment.objects.get(pk=self.payments[0].pk)
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(payment.transaction_id, 'QKJ1234567')
+        self.assertEqual(payment.payment_date, mpesa_payment.transaction_date)
+
+        # Daraja redelivers: acknowledged, stored once, not applied again
+        response = self.post_result('ws_CO_0', receipt_number='QKJ7654321')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(MpesaCallback.objects.count(), 1)
+        self.assertEqual(RentPayment.objects.get(pk=self.payments[0].pk).transaction_id, 'QKJ1234567')
+
+    def test_cancelled_payment_stays_owed(self):
+        self.post_result('ws_CO_1', result_code=1032)
+        self.assertEqual(MpesaPayment.objects.get(checkout_request_id='ws_CO_1').result_code, '1032')
+        self.assertEqual(RentPayment.objects.get(pk=self.payments[1].pk).status, 'pending')
+
+    def test_unmatched_and_invalid_callbacks(self):
+        self.assertEqual(self.post_result('ws_CO_unknown').status_code, status.HTTP_200_OK)
+        self.assertEqual(MpesaCallback.objects.get().status, 'unmatched')
+
+        response = self.client.post(self.url, {'Body': {}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unverified_results_rejected(self):
+        """Success needs the payment's token, its amount and Daraja's confirmation"""
+        self.simulator.set_result('ws_CO_0', 1032)
+        for kwargs, error in (({'token': 'forged'}, 'Callback token does not match'),
+                              ({'amount': 1}, 'Amount 1 does not match 1000'),
+                              ({}, 'Daraja reports result code 1032')):
+            self.assertEqual(self.post_result('ws_CO_0', **kwargs).status_code, status.HTTP_200_OK)
+            callback = MpesaCallback.objects.get()
+            self.assertEqual((callback.status, callback.error), ('rejected', error))
+            self.assertEqual(RentPayment.objects.get(pk=self.payments[0].pk).status, 'initiated')
+
+        # The real result replaces the rejected one
+        self.simulator.set_result('ws_CO_0')
+        self.post_result('ws_CO_0')
+        self.assertEqual(MpesaCallback.objects.get().status, 'applied')
+        self.assertEqual(RentPayment.objects.get(pk=self.payments[0].pk).status, 'completed')
+
+    def test_forged_failure_rejected(self):
+        self.post_result('ws_CO_0', result_code=1032, token='forged')
+        callback = MpesaCallback.objects.get()
+        self.assertEqual((callback.status, callback.error), ('rejected', 'Callback token does not match'))
+        self.assertIsNone(MpesaPayment.objects.get(checkout_request_id='ws_CO_0').result_code)
+        self.assertEqual(RentPayment.objects.get(pk=self.payments[0].pk).status, 'initiated')
+
+    @override_settings(MPESA_CALLBACK_BATCHING=True)
+    def test_forged_then_real_batched(self):
+        """A forged delivery stored first doesn't turn the real one into a repeat"""
+        self.simulator.set_result('ws_CO_0')
+        self.post_result('ws_CO_0', token='forged', receipt_number='FORGED0001')
+        self.assertEqual(self.post_result('ws_CO_0').status_code, status.HTTP_200_OK)
+        callback = MpesaCallback.objects.get()
+        self.assertEqual((callback.status, callback.token), ('pending', 'token-0'))
+        # Forged repeats can't take the slot back
+        self.post_result('ws_CO_0', token='forged', receipt_number='FORGED0002')
+        self.post_result('ws_CO_0', result_code=1032, token='forged')
+        self.assertEqual(MpesaCallback.objects.get().token, 'token-0')
+
+        process_pending_callbacks()
+        self.assertEqual(MpesaCallback.objects.get().status, 'applied')
+        payment = RentPayment.objects.get(pk=self.payments[0].pk)
+        self.assertEqual((payment.status, payment.transaction_id), ('completed', 'QKJ1234567'))
+
+    def test_success_overrides_failure(self):
+        self.post_result('ws_CO_0', result_code=1032)
+        self.assertEqual(RentPayment.objects.get(pk=self.payments[0].pk).status, 'pending')
+
+        self.simulator.set_result('ws_CO_0')
+        self.post_result('ws_CO_0')
+        self.assertEqual(MpesaCallback.objects.get().result_code, 0)
+        self.assertEqual(MpesaPayment.objects.get(checkout_request_id='ws_CO_0').result_code, '0')
+        self.assertEqual(RentPayment.objects.get(pk=self.payments[0].pk).status, 'completed')
+
+        # Failures never replace a success
+        self.post_result('ws_CO_0', result_code=1032)
+        self.assertEqual(MpesaCallback.objects.get().result_code, 0)
+
+    def test_unconfirmed_result_stays_pending(self):
+        """Results Daraja cannot confirm yet are retried by process_mpesa_callbacks"""
+        with self.assertLogs('payments.callbacks', 'WARNING'):
+            self.post_result('ws_CO_0')
+        self.assertEqual(MpesaCallback.objects.get().status, 'pending')
+        with self.assertLogs('payments.callbacks', 'WARNING'):
+            self.assertEqual(process_pending_callbacks(), 1)
+
+        self.simulator.set_result('ws_CO_0')
+        self.assertEqual(process_pending_callbacks(), 1)
+        self.assertEqual(MpesaCallback.objects.get().status, 'applied')
+        self.assertEqual(RentPayment.objects.get(pk=self.payments[0].pk).status, 'completed')
+
+    @override_settings(MPESA_CALLBACK_BATCHING=True)
+    def test_malformed_callback_fails_alone(self):
+        self.simulator.set_result('ws_CO_0')
+        self.simulator.set_result('ws_CO_1')
+        self.post_result('ws_CO_0')
+        body = stk_callback_payload({'Amount': 1000, 'PhoneNumber': '254712345678'},
+                                    {'MerchantRequestID': '1-1-2', 'CheckoutRequestID': 'ws_CO_1'})
+        body['Body']['stkCallback']['CallbackMetadata'] = []
+        self.client.post(f'{self.url}?token=token-1', body, format='json')
+
+        with self.assertLogs('payments.callbacks', 'WARNING'):
+            self.assertEqual(process_pending_callbacks(), 2)
+        self.assertEqual(MpesaCallback.objects.get(checkout_request_id='ws_CO_0').status, 'applied')
+        self.assertEqual(MpesaCallback.objects.get(checkout_request_id='ws_CO_1').status, 'failed')
+        self.assertEqual(RentPayment.objects.get(pk=self.payments[0].pk).status, 'completed')
+        self.assertEqual(RentPayment.objects.get(pk=self.payments[1].pk).status, 'initiated')
+        self.assertEqual(process_pending_callbacks(), 0)
+
+    @override_settings(MPESA_CALLBACK_BATCHING=True)
+    def test_batched_callbacks(self):
+        self.simulator.set_result('ws_CO_0')
+        self.post_result('ws_CO_0')
+        self.post_result('ws_CO_1', result_code=1032)
+        self.post_result('ws_CO_0')
+        self.assertEqual(MpesaCallback.objects.filter(status='pending').count(), 2)
+        self.assertEqual(RentPayment.objects.filter(status='initiated').count(), 2)
+
+        out = StringIO()
+        call_command('process_mpesa_callbacks', stdout=out)
+        self.assertIn('Processed 2 callbacks', out.getvalue())
+        self.assertEqual(MpesaCallback.objects.filter(status='applied').count(), 2)
+        self.assertEqual(RentPayment.objects.get(pk=self.payments[0].pk).status, 'completed')
+        self.assertEqual(RentPayment.objects.get(pk=self.payments[1].pk).status, 'pending')
+        self.assertEqual(process_pending_callbacks(), 0)
+
+
+STATEMENT_HEADER = (
+    'Organization Name:,Court Properties\n'
+    'Time Period:,01-03-2025 - 31-03-2025\n'
+    '\n'
+    'Receipt No.,Completion Time,Initiation Time,Details,Transaction Status,Paid In,Withdrawn,Balance,'
+    'Balance Confirmed,Reason Type,Other Party Info,Linked Transaction ID,A/C No.\n'
+)
+
+
+def statement_line(receipt, amount, phone='254700000000', account='', status='Completed'):
+    return (f'{receipt},2025-03-04 10:15:00,2025-03-04 10:15:00,Pay Bill Online,{status},"{amount}",,,'
+            f'true,Pay Bill Online,{phone} - JOHN DOE,,{account}\n')
+
+
+class StatementReconciliationTests(TestCase):
+    """Statement lines settle outstanding payments by reference, access code or phone, and amount"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Recon Org', email='recon@example.com')
+        owner = User.objects.create_user(username='recon-owner', password='securepassword',
+                                         organization=self.organization)
+        self.property = Property.objects.create(owner=owner, organization=self.organization, name='Court',
+                                                address='Nairobi', property_type='residential')
+        self.by_reference = self.create_payment('1', '0711000001', date(2025, 3, 5))
+        self.by_code = self.create_payment('2', '0711000002', date(2025, 3, 5), access_code='CT2')
+        self.by_phone_old = self.create_payment('3', '0711000003', date(2025, 2, 5))
+        self.by_phone_new = self.create_payment('3b', '0711000003', date(2025, 3, 5))
+        self.with_fee = self.create_payment('4', '0711000004', date(2025, 3, 5), late_fee=Decimal('500.00'))
+
+    def create_payment(self, unit_number, phone_number, due_date, access_code=None, late_fee=Decimal('0')):
+        unit = Unit.objects.create(property=self.property, unit_number=unit_number, access_code=access_code,
+                                   monthly_rent=Decimal('10000.00'))
+        tenant = Tenant.objects.create(name=f'Tenant {unit_number}', phone_number=phone_number, unit=unit,
+                                       move_in_date=date(2025, 1, 1))
+        return RentPayment.objects.create(unit=unit, tenant=tenant, amount=Decimal('10000.00'),
+                                          due_date=due_date, late_fee_applied=late_fee)
+
+    def reconcile(self, lines, **kwargs):
+        exceptions = StringIO()
+        summary = reconcile_statement(self.organization, StringIO(STATEMENT_HEADER + ''.join(lines)),
+                                      exceptions, **kwargs)
+        return summary, exceptions.getvalue().splitlines()
+
+    def test_reconcile(self):
+        lines = [
+            statement_line('RC1', '10,000.00', account=f'Rent-{self.by_reference.pk}'),
+            statement_line('RC2', '10000.00', account='ct2'),
+            statement_line('RC3', '10000.00', phone='254711000003'),
+            statement_line('RC4', '10000.00', phone='254711000004'),  # Late fee not paid
+            statement_line('RC5', '10000.00', phone='254799999999'),
+            statement_line('RC6', '500.00', status='Failed'),
+            statement_line('RC3', '10000.00', phone='254711000003'),  # Repeated line
+        ]
+        summary, exceptions = self.reconcile(lines, batch_size=2)
+
+        self.assertEqual(summary, {'lines': 7, 'matched': 3, 'exceptions': 2, 'skipped': 1,
+                                   'already_reconciled': 1})
+        self.assertIn('amount_mismatch', exceptions[1])
+        self.assertTrue(exceptions[1].startswith('8,RC4,'))
+        self.assertIn('unmatched', exceptions[2])
+
+        for payment, receipt in ((self.by_reference, 'RC1'), (self.by_code, 'RC2'), (self.by_phone_old, 'RC3')):
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, 'completed')
+            self.assertEqual(payment.transaction_id, receipt)
+            self.assertEqual(payment.payment_method, 'm_pesa')
+        self.by_phone_new.refresh_from_db()
+        self.assertEqual(self.by_phone_new.status, 'pending')
+
+        # Re-running the statement settles nothing twice
+        summary, exceptions = self.reconcile(lines + [statement_line('RC7', '10500.00', phone='254711000004')])
+        self.assertEqual(summary['matched'], 1)
+        self.assertEqual(summary['already_reconciled'], 4)
+        self.assertEqual(RentPayment.objects.get(pk=self.with_fee.pk).transaction_id, 'RC7')
+
+    def test_dry_run_and_command(self):
+        lines = [statement_line('RC1', '10000.00', account='CT2')]
+        summary, _ = self.reconcile(lines, dry_run=True)
+        self.assertEqual(summary['matched'], 1)
+        self.assertEqual(RentPayment.objects.get(pk=self.by_code.pk).status, 'pending')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'statement.csv'
+            path.write_text(STATEMENT_HEADER + ''.join(lines), encoding='utf-8-sig')
+            out = StringIO()
+            call_command('reconcile_mpesa_statement', str(path), organization=self.organization.pk, stdout=out)
+            self.assertIn('1 of 1 lines matched', out.getvalue())
+            self.assertTrue((Path(directory) / 'statement-exceptions.csv').exists())
+        self.assertEqual(RentPayment.objects.get(pk=self.by_code.pk).status, 'completed')
+
+    def test_settled_since_loaded(self):
+        """Lines for payments settled after the indexes were loaded become exceptions"""
+        load = OutstandingPayments
+
+        def load_then_settle(organization):
+            outstanding = load(organization)
+            RentPayment.objects.filter(pk=self.by_code.pk).update(status='completed', transaction_id='STK1')
+            return outstanding
+
+        lines = [
+            statement_line('RC1', '10000.00', account=f'Rent-{self.by_reference.pk}'),
+            statement_line('RC2', '10000.00', account='CT2'),
+        ]
+        with mock.patch('payments.reconciliation.OutstandingPayments', side_effect=load_then_settle):
+            summary, exceptions = self.reconcile(lines)
+
+        self.assertEqual((summary['matched'], summary['exceptions']), (1, 1))
+        self.assertTrue(exceptions[1].startswith('6,RC2,'))
+        self.assertIn('already_settled', exceptions[1])
+        self.assertEqual(RentPayment.objects.get(pk=self.by_code.pk).transaction_id, 'STK1')
+        self.assertEqual(RentPayment.objects.get(pk=self.by_reference.pk).transaction_id, 'RC1')
+
+    def test_other_organizations_untouched(self):
+        other = Organization.objects.create(name='Other Org', email='other@example.com')
+        summary, _ = self.reconcile([statement_line('RC1', '10000.00', account='CT2')])
+        self.assertEqual(summary['matched'], 1)
+        summary = reconcile_statement(other, StringIO(STATEMENT_HEADER + statement_line('RC9', '10000.00',
+                                                                                      account='CT2')), StringIO())
+        self.assertEqual(summary['exceptions'], 1)
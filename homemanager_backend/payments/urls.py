@@ -5,7 +5,10 @@ from . import views
 router = DefaultRouter()
 router.register(r'rent', views.RentPaymentViewSet)
 router.register(r'mpesa', views.MpesaPaymentViewSet)
+router.register(r'late-fee-policies', views.LateFeePolicyViewSet)
 
 urlpatterns = [
+    # Before the router, whose mpesa/<pk>/ route would also match
+    path('mpesa/callback/', views.MpesaCallbackView.as_view(), name='mpesa-callback'),
     path('', include(router.urls)),
 ]
@@ -1,11 +1,17 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.urls import reverse
 from django.utils import timezone
-from .models import RentPayment, MpesaPayment
-from .serializers import RentPaymentSerializer, RentPaymentDetailSerializer, MpesaPaymentSerializer
+from organizations.context import OrganizationContextMixin
+from organizations.permissions import IsOrganizationOwnerOrAdmin
+from .models import RentPayment, MpesaPayment, LateFeePolicy
+from .callbacks import ACCEPTED, TOKEN_PARAM, callback_url_with_token, new_callback_token, receive_callback
+from .mpesa import MpesaError, config_for_property, get_client
+from .serializers import RentPaymentSerializer, RentPaymentDetailSerializer, MpesaPaymentSerializer, LateFeePolicySerializer
 
-class RentPaymentViewSet(viewsets.ModelViewSet):
+class RentPaymentViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing RentPayment instances"""
     queryset = RentPayment.objects.all()
     serializer_class = RentPaymentSerializer
@@ -31,12 +37,7 @@ class RentPaymentViewSet(viewsets.ModelViewSet):
         start_date = self.request.query_params.get('start_date', None)
         end_date = self.request.query_params.get('end_date', None)
         
-        queryset = RentPayment.objects.all()
-        
-        if user.organization:
-            queryset = queryset.filter(unit__property__organization=user.organization)
-        else:
-            return RentPayment.objects.none()
+        queryset = RentPayment.objects.for_organization(self.organization_context.organization)
         
         if status_param:
             queryset = queryset.filter(status=status_param)
@@ -84,19 +85,8 @@ class RentPaymentViewSet(viewsets.ModelViewSet):
         # Get the property for the payment
         property_obj = payment.unit.property
         
-        # Check for property-specific M-Pesa config
-        from properties.models import PropertyMpesaConfig
-        try:
-            # Try to get property-specific config
-            mpesa_config = PropertyMpesaConfig.objects.get(property=property_obj)
-            
-            # If config exists but is set to use organization config, use org config instead
-            if mpesa_config.use_organization_config:
-                mpesa_config = property_obj.organization.mpesa_config
-        except PropertyMpesaConfig.DoesNotExist:
-            # Fallback to organization config
-            mpesa_config = property_obj.organization.mpesa_config
-        
+        # Property-specific M-Pesa config, or the organization's
+        mpesa_config = config_for_property(property_obj)
         if not mpesa_config:
             return Response(
                 {"error": "No M-Pesa configuration found for this property or organization"},
@@ -107,15 +97,35 @@ class RentPaymentViewSet(viewsets.ModelViewSet):
         mpesa_payment = MpesaPayment.objects.create(
             rent_payment=payment,
             property=property_obj,
-            organization=request.user.organization,
+            organization=self.organization_context.organization,
             phone_number=phone_number,
             amount=payment.amount,
             reference=f"Rent-{payment.id}",
-            description=f"Rent payment for {payment.unit}"
+            description=f"Rent payment for {payment.unit}",
+            callback_token=new_callback_token(),
         )
         
-        # In a real implementation, we would call the M-Pesa API here using mpesa_config
-        # For now, just update the payment status
+        client = get_client(mpesa_config)
+        # Without a configured callback URL Daraja posts results back to this server
+        callback_url = client.callback_url or request.build_absolute_uri(reverse('mpesa-callback'))
+        callback_url = callback_url_with_token(callback_url, mpesa_payment.callback_token)
+        try:
+            result = client.stk_push(
+                phone_number=phone_number,
+                amount=payment.amount,
+                account_reference=mpesa_payment.reference,
+                description='Rent payment',
+                callback_url=callback_url,
+            )
+        except MpesaError as e:
+            mpesa_payment.result_description = str(e)[:255]
+            mpesa_payment.save(update_fields=['result_description', 'updated_at'])
+            return Response({'error': f'M-Pesa request failed: {e}'}, status=status.HTTP_502_BAD_GATEWAY)
+        
+        mpesa_payment.checkout_request_id = result.get('CheckoutRequestID')
+        mpesa_payment.merchant_request_id = result.get('MerchantRequestID')
+        mpesa_payment.save(update_fields=['checkout_request_id', 'merchant_request_id', 'updated_at'])
+        
         payment.status = 'initiated'
         payment.payment_method = 'm_pesa'
         payment.save()
@@ -123,7 +133,27 @@ class RentPaymentViewSet(viewsets.ModelViewSet):
         serializer = MpesaPaymentSerializer(mpesa_payment)
         return Response(serializer.data)
 
-class MpesaPaymentViewSet(viewsets.ReadOnlyModelViewSet):
+class MpesaCallbackView(APIView):
+    """
+    Receives STK push results from Daraja.
+    
+    Daraja does not authenticate its callbacks, so the endpoint is open;
+    a result only applies to an MpesaPayment with the same checkout request
+    ID, and a successful one only once it passes the checks in
+    payments.callbacks (callback token from the ?token= parameter, amount,
+    Daraja STK query). Repeated deliveries are acknowledged without being
+    applied again.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = []
+    
+    def post(self, request):
+        if not receive_callback(request.data, token=request.query_params.get(TOKEN_PARAM)):
+            return Response({'error': 'Not an STK push callback'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ACCEPTED)
+
+class MpesaPaymentViewSet(OrganizationContextMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing MpesaPayment instances (read-only)"""
     queryset = MpesaPayment.objects.all()
     serializer_class = MpesaPaymentSerializer
@@ -138,20 +168,37 @@ class MpesaPaymentViewSet(viewsets.ReadOnlyModelViewSet):
         # Filter by rent_payment or property if provided
         rent_payment_id = self.request.query_params.get('rent_payment', None)
         property_id = self.request.query_params.get('property', None)
-        queryset = MpesaPayment.objects.all()
+        queryset = MpesaPayment.objects.for_organization(self.organization_context.organization)
         
-        if user.organization:
-            queryset = queryset.filter(organization=user.organization)
-            
-            # Additional filters
-            if property_id:
-                queryset = queryset.filter(property_id=property_id)
-            elif rent_payment_id:
-                queryset = queryset.filter(rent_payment_id=rent_payment_id)
-        else:
-            return MpesaPayment.objects.none()
+        if property_id:
+            queryset = queryset.filter(property_id=property_id)
         
         if rent_payment_id:
             queryset = queryset.filter(rent_payment_id=rent_payment_id)
             
         return queryset.order_by('-created_at')
+
+class LateFeePolicyViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
+    """
+    Late fee policies of the user's organization: one organization-wide
+    policy plus optional per-property overrides. Applied nightly by the
+    assess_late_fees command.
+    """
+    queryset = LateFeePolicy.objects.all()
+    serializer_class = LateFeePolicySerializer
+    permission_classes = [permissions.IsAuthenticated, IsOrganizationOwnerOrAdmin]
+    
+    def get_queryset(self):
+        """Filter policies to the user's organization"""
+        organization = self.organization_context.organization
+        return LateFeePolicy.objects.for_organization(organization).select_related('property').order_by('id')
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['organization'] = self.organization_context.organization
+        return context
+    
+    def perform_create(self, serializer):
+        """Set organization when creating a policy"""
+        serializer.save(organization=self.organization_context.organization)
+
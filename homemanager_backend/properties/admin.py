@@ -7,6 +7,12 @@ class PropertyAdmin(admin.ModelAdmin):
     list_display = ('name', 'owner', 'organization', 'property_type', 'address')
     list_filter = ('property_type', 'organization')
     search_fields = ('name', 'address', 'owner__username', 'organization__name')
+    
+    def save_model(self, request, obj, form, change):
+        """Move the property's tenants, payments, ... along with it"""
+        super().save_model(request, obj, form, change)
+        if change and 'organization' in form.changed_data:
+            obj.propagate_organization()
 
 class PropertyImageInline(admin.TabularInline):
     """Inline admin for PropertyImage model"""
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0006_unit_security_deposit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unit',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
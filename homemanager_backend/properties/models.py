@@ -1,3 +1,4 @@
+from django.apps import apps
 from django.db import models
 import uuid
 import os
@@ -10,6 +11,39 @@ def property_image_path(instance, filename):
     filename = f"{uuid.uuid4()}.{ext}"
     return os.path.join('property_images', filename)
 
+class PropertyQuerySet(models.QuerySet):
+    """QuerySet with database-side unit statistics for properties"""
+    
+    def with_unit_stats(self):
+        """
+        Annotate each property with unit_count, occupied_units and
+        total_monthly_rent so serializers don't need a query per property
+        """
+        return self.annotate(
+            unit_count=models.Count('units'),
+            occupied_units=models.Count('units', filter=models.Q(units__is_occupied=True)),
+            total_monthly_rent=models.Sum('units__monthly_rent'),
+        )
+
+class UnitQuerySet(models.QuerySet):
+    """QuerySet with bulk-loading helpers for unit listings"""
+    
+    def with_tenant_and_qr(self):
+        """
+        Load each unit's QR code and active leases (with tenants) up front.
+        
+        Active leases are exposed as `active_leases` on every unit, which
+        UnitSerializer reads instead of querying per unit.
+        """
+        from tenants.models import Lease
+        return self.select_related('qr_code').prefetch_related(
+            models.Prefetch(
+                'leases',
+                queryset=Lease.objects.filter(is_active=True).select_related('tenant').order_by('id'),
+                to_attr='active_leases',
+            )
+        )
+
 class Property(models.Model):
     """Model representing a property (residential or commercial)"""
     PROPERTY_TYPES = [
@@ -28,8 +62,29 @@ class Property(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PropertyQuerySet.as_manager()
+    
     def __str__(self):
         return self.name
+    
+    def propagate_organization(self):
+        """
+        Copy the property's organization to the rows that denormalize it.
+        
+        Organization-scoped models whose organization_source runs through a
+        property (tenants, leases, rent payments, SMS messages, ticket
+        comments, notice views, ...) and M-Pesa payments are updated with
+        one UPDATE per model. Call it in the transaction that moves the
+        property to another organization.
+        """
+        for model in apps.get_models():
+            source = getattr(model, 'organization_source', None)
+            if source and source.endswith('property__organization'):
+                path = source[:-len('__organization')]
+                model._base_manager.filter(**{path: self}).update(organization_id=self.organization_id)
+        apps.get_model('payments', 'MpesaPayment')._base_manager.filter(
+            property=self
+        ).update(organization_id=self.organization_id)
 
 class PropertyImage(models.Model):
     """Model for property images"""
@@ -57,6 +112,9 @@ class Unit(models.Model):
     description = models.TextField(blank=True, null=True)
     access_code = models.CharField(max_length=20, blank=True, null=True, unique=True, 
                                   help_text="Simple code for tenant web access")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    objects = UnitQuerySet.as_manager()
     
     class Meta:
         unique_together = ('property', 'unit_number')
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class UnitCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the units of a property.
+    
+    Keyset pagination on the primary key keeps every page equally cheap,
+    however deep the client scrolls into a large building.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from organizations.context import get_organization_context
 
 
 class IsPropertyManager(permissions.BasePermission):
@@ -20,7 +21,8 @@ class IsPropertyManager(permissions.BasePermission):
             return True
             
         # Basic check - if user belongs to property's organization
-        if hasattr(obj, 'organization') and user.organization == obj.organization:
+        organization_id = get_organization_context(request).organization_id
+        if organization_id and getattr(obj, 'organization_id', None) == organization_id:
             # For simplicity, assume all users in an organization can manage properties
             # This can be refined later when role systems are implemented
             return True
@@ -49,7 +51,8 @@ class IsPropertyOwner(permissions.BasePermission):
         # Check if user is property owner flag is set
         if user.is_property_owner:
             # If they're in the same organization as the property
-            if hasattr(obj, 'organization') and user.organization == obj.organization:
+            organization_id = get_organization_context(request).organization_id
+            if organization_id and getattr(obj, 'organization_id', None) == organization_id:
                 return True
         
         # Staff users also have access
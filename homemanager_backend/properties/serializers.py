@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.db import models
 from .models import Property, PropertyImage, Unit, QRCode, MpesaConfig, PropertyMpesaConfig
 
 class PropertyImageSerializer(serializers.ModelSerializer):
@@ -30,8 +31,12 @@ class UnitSerializer(serializers.ModelSerializer):
     
     def get_tenant_name(self, obj):
         """Get the name of the current tenant, if any"""
-        # Get latest active lease for unit
-        active_lease = obj.leases.filter(is_active=True).first()
+        # Prefer active leases bulk-loaded by UnitQuerySet.with_tenant_and_qr()
+        active_leases = getattr(obj, 'active_leases', None)
+        if active_leases is not None:
+            active_lease = active_leases[0] if active_leases else None
+        else:
+            active_lease = obj.leases.filter(is_active=True).first()
         if active_lease and active_lease.tenant:
             return active_lease.tenant.name
         return None
@@ -51,25 +56,43 @@ class PropertySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'owner', 'organization', 'created_at', 'unit_count', 'occupied_units', 
                            'vacancy_rate', 'total_monthly_rent']
     
+    def _unit_stats(self, obj):
+        """
+        Return (unit_count, occupied_units, total_monthly_rent) for a property.
+        
+        Uses the annotations added by PropertyQuerySet.with_unit_stats() when
+        present and falls back to a single aggregate query otherwise (e.g. for
+        freshly created instances).
+        """
+        if not hasattr(obj, 'unit_count'):
+            stats = obj.units.aggregate(
+                unit_count=models.Count('id'),
+                occupied_units=models.Count('id', filter=models.Q(is_occupied=True)),
+                total_monthly_rent=models.Sum('monthly_rent'),
+            )
+            obj.unit_count = stats['unit_count']
+            obj.occupied_units = stats['occupied_units']
+            obj.total_monthly_rent = stats['total_monthly_rent']
+        return obj.unit_count, obj.occupied_units, obj.total_monthly_rent or 0
+    
     def get_unit_count(self, obj):
         """Get the number of units in the property"""
-        return obj.units.count()
+        return self._unit_stats(obj)[0]
     
     def get_occupied_units(self, obj):
         """Get the number of occupied units in the property"""
-        return obj.units.filter(is_occupied=True).count()
+        return self._unit_stats(obj)[1]
     
     def get_vacancy_rate(self, obj):
         """Calculate vacancy rate"""
-        unit_count = obj.units.count()
+        unit_count, occupied, _ = self._unit_stats(obj)
         if unit_count == 0:
             return 0
-        occupied = obj.units.filter(is_occupied=True).count()
         return round((unit_count - occupied) / unit_count * 100, 2)
     
     def get_total_monthly_rent(self, obj):
         """Calculate total monthly rent for the property"""
-        return sum(unit.monthly_rent for unit in obj.units.all())
+        return self._unit_stats(obj)[2]
 
 class PropertyDetailSerializer(PropertySerializer):
     """Detailed serializer for Property including units and images"""
@@ -79,6 +102,18 @@ class PropertyDetailSerializer(PropertySerializer):
     class Meta(PropertySerializer.Meta):
         fields = PropertySerializer.Meta.fields + ['units', 'images']
 
+class PropertyHeaderSerializer(PropertySerializer):
+    """
+    Property detail without nested units.
+    
+    Used when units are paginated separately so the detail response stays
+    small for large buildings.
+    """
+    images = PropertyImageSerializer(many=True, read_only=True)
+    
+    class Meta(PropertySerializer.Meta):
+        fields = PropertySerializer.Meta.fields + ['images']
+
 class MpesaConfigSerializer(serializers.ModelSerializer):
     """Serializer for the MpesaConfig model"""
     
@@ -1,3 +1,257 @@
+from datetime import date
+from decimal import Decimal
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from users.models import User
+from organizations.models import Organization
+from organizations.quotas import get_throttle_rates
+from tenants.models import Tenant, Lease
+from payments.models import RentPayment, MpesaPayment
+from sms.models import SMSMessage
+from maintenance.models import Ticket, TicketComment
+from notices.models import Notice, NoticeView
+from .models import Property, Unit, QRCode
 
-# Create your tests here.
+
+class PropertyListQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.organization = Organization.objects.create(
+            name='Test Organization',
+            email='test@example.com'
+        )
+        self.other_organization = Organization.objects.create(
+            name='Other Organization',
+            email='other@example.com'
+        )
+
+        self.user = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='securepassword',
+            organization=self.organization
+        )
+        self.client.force_authenticate(user=self.user)
+        # Resolve the plan's API rate limits up front so query counts cover the view only
+        get_throttle_rates(self.organization.pk)
+
+    def create_properties(self, organization, count, units_per_property):
+        """Seed properties with units, half of them occupied"""
+        for i in range(count):
+            prop = Property.objects.create(
+                owner=self.user,
+                organization=organization,
+                name=f'{organization.name} Property {i}',
+                address='Nairobi',
+                property_type='residential'
+            )
+            Unit.objects.bulk_create([
+                Unit(
+                    property=prop,
+                    unit_number=str(n),
+                    monthly_rent=Decimal('10000.00'),
+                    is_occupied=n % 2 == 0
+                )
+                for n in range(units_per_property)
+            ])
+
+    def test_property_list_unit_stats(self):
+        """Annotated unit statistics match the seeded units"""
+        self.create_properties(self.organization, 2, 4)
+        self.create_properties(self.other_organization, 1, 3)
+
+        response = self.client.get(reverse('property-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+
+        for item in response.data['results']:
+            self.assertEqual(item['unit_count'], 4)
+            self.assertEqual(item['occupied_units'], 2)
+            self.assertEqual(item['vacancy_rate'], 50.0)
+            self.assertEqual(item['total_monthly_rent'], Decimal('40000.00'))
+
+    def test_property_list_query_count_is_constant(self):
+        """Listing properties does not issue a query per property or unit"""
+        self.create_properties(self.organization, 3, 5)
+        self.create_properties(self.other_organization, 2, 5)
+        url = reverse('property-list')
+
+        # Context (membership + organization), pagination count + annotated page query
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.data['count'], 3)
+
+        self.create_properties(self.organization, 10, 20)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.data['count'], 13)
+
+
+class UnitFixturesMixin:
+    """Organization, user and property shared by the unit listing tests"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.organization = Organization.objects.create(
+            name='Test Organization',
+            email='test@example.com'
+        )
+        self.user = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='securepassword',
+            organization=self.organization
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.property = Property.objects.create(
+            owner=self.user,
+            organization=self.organization,
+            name='Tower',
+            address='Nairobi',
+            property_type='residential'
+        )
+        # Resolve the plan's API rate limits up front so query counts cover the view only
+        get_throttle_rates(self.organization.pk)
+
+    def create_units(self, count):
+        """Seed occupied units, each with a QR code and an active lease"""
+        units = Unit.objects.bulk_create([
+            Unit(
+                property=self.property,
+                unit_number=f'{self.property.units.count() + n}',
+                monthly_rent=Decimal('10000.00'),
+                is_occupied=True
+            )
+            for n in range(count)
+        ])
+        for unit in units:
+            QRCode.objects.create(unit=unit)
+            tenant = Tenant.objects.create(
+                name=f'Tenant {unit.unit_number}',
+                phone_number='0700000000',
+                unit=unit,
+                move_in_date=date(2024, 1, 1)
+            )
+            Lease.objects.create(
+                unit=unit,
+                tenant=tenant,
+                start_date=date(2024, 1, 1),
+                end_date=date(2025, 1, 1)
+            )
+
+
+class PropertyDetailUnitsTests(UnitFixturesMixin, TestCase):
+    def test_paginated_units_detail(self):
+        """Detail mode returns the first page of units and a cursor to the rest"""
+        self.create_units(25)
+        url = reverse('property-detail', kwargs={'pk': self.property.pk})
+
+        response = self.client.get(url, {'paginate_units': 'true', 'page_size': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unit_count'], 25)
+        self.assertEqual(len(response.data['units']), 10)
+        self.assertEqual(response.data['units'][0]['tenant_name'], 'Tenant 0')
+        self.assertIsNotNone(response.data['units'][0]['qr_code'])
+        self.assertIn(
+            reverse('property-units', kwargs={'pk': self.property.pk}),
+            response.data['units_next']
+        )
+
+        seen = [unit['id'] for unit in response.data['units']]
+        next_url = response.data['units_next']
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(unit['id'] for unit in response.data['results'])
+            next_url = response.data['next']
+        self.assertEqual(sorted(seen), list(self.property.units.values_list('id', flat=True).order_by('id')))
+
+    def test_paginated_units_detail_query_count_is_constant(self):
+        """The first page costs the same number of queries for any building size"""
+        url = reverse('property-detail', kwargs={'pk': self.property.pk})
+        params = {'paginate_units': 'true', 'page_size': 5}
+
+        self.create_units(5)
+        # Context (membership + organization), property + images, unit page
+        # with QR codes, active leases with tenants
+        with self.assertNumQueries(6):
+            self.client.get(url, params)
+
+        self.create_units(30)
+        with self.assertNumQueries(6):
+            response = self.client.get(url, params)
+        self.assertEqual(len(response.data['units']), 5)
+
+    def test_full_detail_prefetches_units(self):
+        """The default detail response still nests every unit, loaded in bulk"""
+        self.create_units(3)
+        url = reverse('property-detail', kwargs={'pk': self.property.pk})
+
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['units']), 3)
+        self.assertNotIn('units_next', response.data)
+
+
+class UnitListQueryTests(UnitFixturesMixin, TestCase):
+    def test_unit_list_query_count_is_constant(self):
+        """A page of units reads tenant names and QR codes from bulk loads"""
+        url = reverse('unit-list')
+
+        self.create_units(3)
+        # Context (membership + organization), pagination count, unit page
+        # with QR codes, active leases with tenants
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(response.data['count'], 3)
+
+        self.create_units(30)
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(response.data['results'][0]['tenant_name'], 'Tenant 0')
+
+    def test_available_units_query_count_is_constant(self):
+        """The available action uses the same bulk-loaded queryset"""
+        self.create_units(3)
+        Unit.objects.bulk_create([
+            Unit(property=self.property, unit_number=f'V{n}', monthly_rent=Decimal('5000.00'))
+            for n in range(25)
+        ])
+
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('unit-available'))
+        self.assertEqual(response.data['count'], 25)
+        self.assertIsNone(response.data['results'][0]['tenant_name'])
+
+
+class PropertyOrganizationMoveTests(UnitFixturesMixin, TestCase):
+    def test_propagate_organization(self):
+        """Rows that denormalize the organization follow a moved property"""
+        self.create_units(1)
+        unit = self.property.units.get()
+        tenant = unit.tenants.get()
+        payment = RentPayment.objects.create(unit=unit, tenant=tenant, amount=Decimal('10000.00'),
+                                             due_date=date(2024, 1, 1))
+        MpesaPayment.objects.create(rent_payment=payment, phone_number='254700000000',
+                                    amount=Decimal('10000.00'), reference='Rent-1', description='Rent')
+        SMSMessage.objects.create(tenant=tenant, phone_number='0700000000', message_content='Hello')
+        ticket = Ticket.objects.create(property=self.property, unit=unit, tenant=tenant,
+                                       title='Leak', description='Leak')
+        TicketComment.objects.create(ticket=ticket, author_name='Owner', comment='On it')
+        notice = Notice.objects.create(property=self.property, title='Water', content='Off',
+                                       start_date=date(2024, 1, 1))
+        NoticeView.objects.create(notice=notice, tenant=tenant)
+
+        other = Organization.objects.create(name='Other Organization', email='other@example.com')
+        self.property.organization = other
+        self.property.save()
+        self.property.propagate_organization()
+
+        for model in (Tenant, Lease, RentPayment, MpesaPayment, SMSMessage, TicketComment, NoticeView):
+            self.assertEqual(set(model._base_manager.values_list('organization_id', flat=True)),
+                             {other.pk}, model.__name__)
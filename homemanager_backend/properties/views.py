@@ -1,16 +1,20 @@
 from rest_framework import viewsets, permissions, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from django.shortcuts import get_object_or_404
-from django.db import models
+from django.db import models, transaction
 from .models import Property, PropertyImage, Unit, QRCode, MpesaConfig, PropertyMpesaConfig
 from users.models import User
 from .serializers import (
-    PropertySerializer, PropertyDetailSerializer, PropertyImageSerializer,
+    PropertySerializer, PropertyDetailSerializer, PropertyHeaderSerializer, PropertyImageSerializer,
     UnitSerializer, QRCodeSerializer, MpesaConfigSerializer, PropertyMpesaConfigSerializer
 )
+from .pagination import UnitCursorPagination
+from organizations.quotas import consume_quota, release_quota
+from organizations.context import OrganizationContextMixin
 
-class PropertyViewSet(viewsets.ModelViewSet):
+class PropertyViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing Property instances"""
     queryset = Property.objects.all()
     serializer_class = PropertySerializer
@@ -19,46 +23,104 @@ class PropertyViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         """Return a different serializer for retrieve action"""
         if self.action == 'retrieve':
+            if self._paginate_units():
+                return PropertyHeaderSerializer
             return PropertyDetailSerializer
         return PropertySerializer
     
+    def _paginate_units(self):
+        """Whether the client asked for units to be paginated (?paginate_units=true)"""
+        return self.request.query_params.get('paginate_units', '').lower() == 'true'
+    
     def get_queryset(self):
         """
         Filter properties to only show those in the user's organization
-        unless the user is a superuser
+        unless the user is a superuser.
+        
+        Unit statistics are annotated in the database so listing properties
+        costs a fixed number of queries regardless of portfolio size.
         """
         user = self.request.user
         if user.is_superuser:
             queryset = Property.objects.all()
-            print(f"DEBUG: Returning all {queryset.count()} properties for superuser")
-            return queryset
-        if user.organization:
-            queryset = Property.objects.filter(organization=user.organization)
-            print(f"DEBUG: Filtered properties for organization '{user.organization.name}': {queryset.count()} properties")
-            return queryset
-        print("DEBUG: User has no organization, returning empty queryset")
-        return Property.objects.none()    
+        elif self.organization_context.organization_id:
+            queryset = Property.objects.filter(organization_id=self.organization_context.organization_id)
+        else:
+            return Property.objects.none()
+        queryset = queryset.with_unit_stats().order_by('id')
+        
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related('images')
+            if not self._paginate_units():
+                queryset = queryset.prefetch_related(
+                    models.Prefetch('units', queryset=Unit.objects.with_tenant_and_qr())
+                )
+        return queryset
+    
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Return a property.
+        
+        With ?paginate_units=true the response contains only the first page
+        of units plus a `units_next` cursor link to the `units` action.
+        """
+        if not self._paginate_units():
+            return super().retrieve(request, *args, **kwargs)
+        
+        instance = self.get_object()
+        data = self.get_serializer(instance).data
+        
+        paginator = UnitCursorPagination()
+        page = paginator.paginate_queryset(
+            instance.units.with_tenant_and_qr(), request, view=self
+        )
+        # Point the cursor at the units action rather than this detail URL
+        paginator.base_url = reverse('property-units', kwargs={'pk': instance.pk}, request=request)
+        data['units'] = UnitSerializer(page, many=True, context=self.get_serializer_context()).data
+        data['units_next'] = paginator.get_next_link()
+        return Response(data)
+    
+    @action(detail=True, methods=['get'])
+    def units(self, request, pk=None):
+        """Cursor-paginated units of a property with tenant and QR code data"""
+        property_obj = self.get_object()
+        paginator = UnitCursorPagination()
+        page = paginator.paginate_queryset(
+            property_obj.units.with_tenant_and_qr(), request, view=self
+        )
+        serializer = UnitSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
     
     def perform_create(self, serializer):
         """Set owner and organization when creating a new property"""
         user = self.request.user
         
         # Ensure the user has an organization
-        if not user.organization:
+        organization = self.organization_context.organization
+        if not organization:
             raise serializers.ValidationError(
                 "You must belong to an organization to create a property"
             )
             
         # Set both owner and organization consistently
-        serializer.save(
-            owner=user,
-            organization=user.organization
-        )
+        with transaction.atomic():
+            consume_quota(organization.pk, 'properties')
+            serializer.save(
+                owner=user,
+                organization=organization
+            )
         
         print(f"Created property: {serializer.instance.name}")
         print(f"Owner: {serializer.instance.owner.username}")
         print(f"Organization: {serializer.instance.organization.name}")
     
+    def perform_destroy(self, instance):
+        """Delete the property and release its (and its units') quota"""
+        with transaction.atomic():
+            unit_count = instance.units.count()
+            instance.delete()
+            release_quota(instance.organization_id, properties=1, units=unit_count)
+    
     def perform_update(self, serializer):
         """
         Ensure property ownership stays consistent with organization
@@ -66,9 +128,10 @@ class PropertyViewSet(viewsets.ModelViewSet):
         """
         instance = self.get_object()
         data = serializer.validated_data
+        moved = 'organization' in data and data['organization'] != instance.organization
         
         # If organization is being changed, update the owner
-        if 'organization' in data and data['organization'] != instance.organization:
+        if moved:
             new_org = data['organization']
             user = self.request.user
             
@@ -97,7 +160,18 @@ class PropertyViewSet(viewsets.ModelViewSet):
             print(f"Changing property organization from {instance.organization.name} to {new_org.name}")
             print(f"Changing property owner from {instance.owner.username} to {new_owner.username}")
             
-        serializer.save()
+        with transaction.atomic():
+            old_organization_id = instance.organization_id
+            serializer.save()
+            if moved:
+                # Tenants, leases, payments, ... and the quota follow the property
+                serializer.instance.propagate_organization()
+                unit_count = instance.units.count()
+                new_organization_id = serializer.instance.organization_id
+                consume_quota(new_organization_id, 'properties')
+                if unit_count:
+                    consume_quota(new_organization_id, 'units', unit_count)
+                release_quota(old_organization_id, properties=1, units=unit_count)
     
     @action(detail=True, methods=['get'])
     def rent_stats(self, request, pk=None):
@@ -130,7 +204,7 @@ class PropertyViewSet(viewsets.ModelViewSet):
             'total_units': units.count(),
         })
 
-class PropertyImageViewSet(viewsets.ModelViewSet):
+class PropertyImageViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing PropertyImage instances"""
     queryset = PropertyImage.objects.all()
     serializer_class = PropertyImageSerializer
@@ -142,35 +216,78 @@ class PropertyImageViewSet(viewsets.ModelViewSet):
         if user.is_superuser:
             return PropertyImage.objects.all()
         
-        if user.organization:
-            return PropertyImage.objects.filter(property__organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            return PropertyImage.objects.filter(property__organization=organization)
         return PropertyImage.objects.none()
 
-class UnitViewSet(viewsets.ModelViewSet):
+class UnitViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing Unit instances"""
     queryset = Unit.objects.all()
     serializer_class = UnitSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        """Filter units to only show those for properties in the user's organization"""
+        """
+        Filter units to only show those for properties in the user's organization.
+        
+        Active leases, tenants and QR codes are loaded in bulk so a page of
+        units costs a constant number of queries.
+        """
         user = self.request.user
         if user.is_superuser:
-            return Unit.objects.all()
+            return Unit.objects.with_tenant_and_qr().order_by('id')
         
         # Filter by property parameter if provided
         property_id = self.request.query_params.get('property', None)
-        queryset = Unit.objects.all()
+        queryset = Unit.objects.with_tenant_and_qr()
         
-        if user.organization:
-            queryset = queryset.filter(property__organization=user.organization)
+        organization_id = self.organization_context.organization_id
+        if organization_id:
+            queryset = queryset.filter(property__organization_id=organization_id)
         else:
             return Unit.objects.none()
             
         if property_id:
             queryset = queryset.filter(property_id=property_id)
         
-        return queryset
+        return queryset.order_by('id')
+    
+    def _check_property(self, property_obj):
+        """Units can only be added to the requesting organization's properties"""
+        if self.request.user.is_superuser:
+            return
+        organization_id = self.organization_context.organization_id
+        if organization_id is None or property_obj.organization_id != organization_id:
+            raise serializers.ValidationError(
+                {'property': "You can only add units to your organization's properties"}
+            )
+    
+    def perform_create(self, serializer):
+        """Count the new unit against its organization's quota"""
+        property_obj = serializer.validated_data['property']
+        self._check_property(property_obj)
+        with transaction.atomic():
+            consume_quota(property_obj.organization_id, 'units')
+            serializer.save()
+    
+    def perform_update(self, serializer):
+        """Move the unit's quota when it moves to another organization's property"""
+        old_organization_id = serializer.instance.property.organization_id
+        property_obj = serializer.validated_data.get('property', serializer.instance.property)
+        self._check_property(property_obj)
+        with transaction.atomic():
+            serializer.save()
+            if property_obj.organization_id != old_organization_id:
+                consume_quota(property_obj.organization_id, 'units')
+                release_quota(old_organization_id, units=1)
+    
+    def perform_destroy(self, instance):
+        """Delete the unit and release its quota"""
+        with transaction.atomic():
+            organization_id = instance.property.organization_id
+            instance.delete()
+            release_quota(organization_id, units=1)
     
     @action(detail=False, methods=['get'])
     def available(self, request):
@@ -371,7 +488,7 @@ class UnitViewSet(viewsets.ModelViewSet):
             serializer = QRCodeSerializer(qr_code)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class QRCodeViewSet(viewsets.ReadOnlyModelViewSet):
+class QRCodeViewSet(OrganizationContextMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing QRCode instances (read-only)"""
     queryset = QRCode.objects.all()
     serializer_class = QRCodeSerializer
@@ -383,11 +500,12 @@ class QRCodeViewSet(viewsets.ReadOnlyModelViewSet):
         if user.is_superuser:
             return QRCode.objects.all()
         
-        if user.organization:
-            return QRCode.objects.filter(unit__property__organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            return QRCode.objects.filter(unit__property__organization=organization)
         return QRCode.objects.none()
 
-class MpesaConfigViewSet(viewsets.ModelViewSet):
+class MpesaConfigViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing MpesaConfig instances"""
     queryset = MpesaConfig.objects.all()
     serializer_class = MpesaConfigSerializer
@@ -398,11 +516,12 @@ class MpesaConfigViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if user.is_superuser:
             return MpesaConfig.objects.all()
-        if user.organization:
-            return MpesaConfig.objects.filter(organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            return MpesaConfig.objects.filter(organization=organization)
         return MpesaConfig.objects.none()
 
-class PropertyMpesaConfigViewSet(viewsets.ModelViewSet):
+class PropertyMpesaConfigViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing PropertyMpesaConfig instances"""
     queryset = PropertyMpesaConfig.objects.all()
     serializer_class = PropertyMpesaConfigSerializer
@@ -413,8 +532,9 @@ class PropertyMpesaConfigViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if user.is_superuser:
             return PropertyMpesaConfig.objects.all()
-        if user.organization:
-            return PropertyMpesaConfig.objects.filter(property__organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            return PropertyMpesaConfig.objects.filter(property__organization=organization)
         return PropertyMpesaConfig.objects.none()
     
     def perform_create(self, serializer):
@@ -422,7 +542,7 @@ class PropertyMpesaConfigViewSet(viewsets.ModelViewSet):
         property_id = self.request.data.get('property')
         if property_id:
             property_obj = get_object_or_404(Property, id=property_id)
-            if property_obj.organization != self.request.user.organization:
+            if property_obj.organization_id != self.organization_context.organization_id:
                 raise serializers.ValidationError("Property must belong to your organization")
         serializer.save()
         
@@ -436,7 +556,7 @@ class PropertyMpesaConfigViewSet(viewsets.ModelViewSet):
         property_obj = get_object_or_404(Property, id=property_id)
         
         # Check if user has access to this property
-        if property_obj.organization != request.user.organization and not request.user.is_superuser:
+        if property_obj.organization_id != self.organization_context.organization_id and not request.user.is_superuser:
             return Response({"error": "You don't have access to this property"}, 
                            status=status.HTTP_403_FORBIDDEN)
         
@@ -6,6 +6,7 @@ import qrcode
 import base64
 from io import BytesIO
 
+from organizations.context import get_organization_context
 from .models import Property, Unit
 from .permissions import IsPropertyManager, IsPropertyOwner
 
@@ -36,12 +37,13 @@ def bulk_qr_codes(request):
         )
       # Get units that user has access to
     user = request.user
+    organization = get_organization_context(request).organization
     
     if user.is_superuser:
         user_properties = Property.objects.all().values_list('id', flat=True)
-    elif user.organization:
+    elif organization:
         user_properties = Property.objects.filter(
-            organization=user.organization
+            organization=organization
         ).values_list('id', flat=True)
     else:
         user_properties = []
@@ -107,7 +109,7 @@ def property_qr_codes(request, pk):
     if request.user.is_superuser:
         # Superusers have access to all properties
         pass
-    elif not request.user.organization or property.organization != request.user.organization:
+    elif property.organization_id is None or property.organization_id != get_organization_context(request).organization_id:
         return Response(
             {"error": "You don't have access to this property"},
             status=status.HTTP_403_FORBIDDEN
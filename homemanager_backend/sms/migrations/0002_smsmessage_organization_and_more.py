@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0006_make_base_role_required'),
+        ('sms', '0001_initial'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='smsmessage',
+            name='organization',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)ss', to='organizations.organization'),
+        ),
+        migrations.AddIndex(
+            model_name='smsmessage',
+            index=models.Index(fields=['organization'], name='sms_smsmess_organiz_b92f83_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0002_smsmessage_organization_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='smsmessage',
+            index=models.Index(fields=['organization', 'sent_at'], name='sms_message_org_sent_at'),
+        ),
+    ]
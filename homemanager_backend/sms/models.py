@@ -14,8 +14,10 @@ class SMSTemplate(OrganizationModel):
         return self.name
 
 
-class SMSMessage(models.Model):
+class SMSMessage(OrganizationModel):
     """Records sent SMS messages for tracking and reporting"""
+    organization_source = 'tenant__unit__property__organization'
+    
     tenant = models.ForeignKey(
         'tenants.Tenant',
         on_delete=models.CASCADE,
@@ -31,6 +33,13 @@ class SMSMessage(models.Model):
     delivery_status = models.CharField(max_length=20, blank=True, null=True)
     delivery_time = models.DateTimeField(blank=True, null=True)
     
+    class Meta(OrganizationModel.Meta):
+        indexes = [
+            *OrganizationModel.Meta.indexes,
+            # The dashboard counts an organization's messages of the last 30 days
+            models.Index(fields=['organization', 'sent_at'], name='sms_message_org_sent_at'),
+        ]
+    
     def __str__(self):
         return f"SMS to {self.phone_number} at {self.sent_at}"
 
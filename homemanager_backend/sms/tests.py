@@ -1,3 +1,25 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
+from .utils import sms_segment_count
 
-# Create your tests here.
+
+class SMSSegmentCountTests(SimpleTestCase):
+    def test_gsm7_messages(self):
+        """GSM-7 text fits 160 septets, or 153 per part once split"""
+        self.assertEqual(sms_segment_count('a' * 160), 1)
+        self.assertEqual(sms_segment_count('a' * 161), 2)
+        self.assertEqual(sms_segment_count('a' * 306), 2)
+        self.assertEqual(sms_segment_count('a' * 307), 3)
+
+    def test_gsm7_extension_characters(self):
+        """Extension characters such as the euro sign take two septets"""
+        self.assertEqual(sms_segment_count('€' * 80), 1)
+        self.assertEqual(sms_segment_count('€' * 81), 2)
+
+    def test_ucs2_messages(self):
+        """Any character outside GSM-7 switches the message to UCS-2"""
+        self.assertEqual(sms_segment_count('ф' * 70), 1)
+        self.assertEqual(sms_segment_count('ф' * 71), 2)
+        self.assertEqual(sms_segment_count('a' * 69 + '😀'), 2)
+        self.assertEqual(sms_segment_count('ф' * 134), 2)
+        # ESC is the extension prefix, not a character that can be sent
+        self.assertEqual(sms_segment_count('a' * 70 + '\x1b'), 2)
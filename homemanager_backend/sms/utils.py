@@ -2,6 +2,42 @@ from django.utils import timezone
 from .models import SMSMessage
 from tenants.models import Tenant
 
+# GSM 03.38 basic character set; each costs one septet. ESC (0x1B) is left
+# out: it only prefixes extension characters and cannot be sent on its own
+GSM7_BASIC_CHARS = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# GSM 03.38 extension table; each costs an escape plus one septet
+GSM7_EXTENDED_CHARS = frozenset("^{}\\[~]|€\f")
+
+GSM7_SINGLE_SEGMENT, GSM7_MULTIPART_SEGMENT = 160, 153
+UCS2_SINGLE_SEGMENT, UCS2_MULTIPART_SEGMENT = 70, 67
+
+
+def sms_segment_count(text):
+    """
+    Count the SMS segments a message is billed as.
+    
+    Messages using only the GSM-7 alphabet are measured in septets (extension
+    characters take two); anything else is sent as UCS-2 and measured in
+    UTF-16 code units. Multipart messages lose room to the concatenation header.
+    """
+    if not text:
+        return 1
+    
+    chars = set(text)
+    if chars <= GSM7_BASIC_CHARS | GSM7_EXTENDED_CHARS:
+        length = len(text) + sum(text.count(char) for char in chars & GSM7_EXTENDED_CHARS)
+        single, multipart = GSM7_SINGLE_SEGMENT, GSM7_MULTIPART_SEGMENT
+    else:
+        length = len(text.encode('utf-16-le')) // 2
+        single, multipart = UCS2_SINGLE_SEGMENT, UCS2_MULTIPART_SEGMENT
+    
+    if length <= single:
+        return 1
+    return -(-length // multipart)
+
 
 def send_notice_sms(notice, send_sms_flag=False):
     """
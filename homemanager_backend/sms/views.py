@@ -5,8 +5,9 @@ from django.utils import timezone
 from .models import SMSTemplate, SMSMessage, SMSProvider
 from .serializers import SMSTemplateSerializer, SMSMessageSerializer, SMSProviderSerializer
 from tenants.models import Tenant
+from organizations.context import OrganizationContextMixin
 
-class SMSTemplateViewSet(viewsets.ModelViewSet):
+class SMSTemplateViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing SMSTemplate instances"""
     queryset = SMSTemplate.objects.all()
     serializer_class = SMSTemplateSerializer
@@ -18,19 +19,21 @@ class SMSTemplateViewSet(viewsets.ModelViewSet):
         if user.is_superuser:
             return SMSTemplate.objects.all()
         
-        if user.organization:
-            return SMSTemplate.objects.filter(organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            return SMSTemplate.objects.filter(organization=organization)
         return SMSTemplate.objects.none()
     
     def perform_create(self, serializer):
         """Set organization when creating a template"""
-        serializer.save(organization=self.request.user.organization)
+        serializer.save(organization=self.organization_context.organization)
 
-class SMSMessageViewSet(viewsets.ModelViewSet):
+class SMSMessageViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing SMSMessage instances"""
     queryset = SMSMessage.objects.all()
     serializer_class = SMSMessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    organization_throttle_scopes = {'send_bulk': 'bulk'}
     
     def get_queryset(self):
         """Filter messages to only show those for the user's organization"""
@@ -44,12 +47,7 @@ class SMSMessageViewSet(viewsets.ModelViewSet):
         start_date = self.request.query_params.get('start_date', None)
         end_date = self.request.query_params.get('end_date', None)
         
-        queryset = SMSMessage.objects.all()
-        
-        if user.organization:
-            queryset = queryset.filter(tenant__unit__property__organization=user.organization)
-        else:
-            return SMSMessage.objects.none()
+        queryset = SMSMessage.objects.for_organization(self.organization_context.organization)
         
         if tenant_id:
             queryset = queryset.filter(tenant_id=tenant_id)
@@ -81,7 +79,7 @@ class SMSMessageViewSet(viewsets.ModelViewSet):
             tenant = Tenant.objects.get(id=tenant_id)
             
             # Ensure tenant belongs to the user's organization
-            if tenant.unit.property.organization != request.user.organization:
+            if tenant.unit.property.organization_id != self.organization_context.organization_id:
                 return Response(
                     {'error': 'Unauthorized tenant'}, 
                     status=status.HTTP_403_FORBIDDEN
@@ -129,7 +127,7 @@ class SMSMessageViewSet(viewsets.ModelViewSet):
                 tenant = Tenant.objects.get(id=tenant_id)
                 
                 # Ensure tenant belongs to the user's organization
-                if tenant.unit.property.organization != request.user.organization:
+                if tenant.unit.property.organization_id != self.organization_context.organization_id:
                     continue
                 
                 # Create the SMS message
@@ -161,7 +159,7 @@ class SMSMessageViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(messages, many=True)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class SMSProviderViewSet(viewsets.ModelViewSet):
+class SMSProviderViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing SMSProvider instances"""
     queryset = SMSProvider.objects.all()
     serializer_class = SMSProviderSerializer
@@ -173,10 +171,11 @@ class SMSProviderViewSet(viewsets.ModelViewSet):
         if user.is_superuser:
             return SMSProvider.objects.all()
         
-        if user.organization:
-            return SMSProvider.objects.filter(organization=user.organization)
+        organization = self.organization_context.organization
+        if organization:
+            return SMSProvider.objects.filter(organization=organization)
         return SMSProvider.objects.none()
     
     def perform_create(self, serializer):
         """Set organization when creating a provider"""
-        serializer.save(organization=self.request.user.organization)
+        serializer.save(organization=self.organization_context.organization)
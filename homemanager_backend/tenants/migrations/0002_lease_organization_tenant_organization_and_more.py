@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0006_make_base_role_required'),
+        ('properties', '0007_unit_updated_at'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lease',
+            name='organization',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)ss', to='organizations.organization'),
+        ),
+        migrations.AddField(
+            model_name='tenant',
+            name='organization',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)ss', to='organizations.organization'),
+        ),
+        migrations.AddIndex(
+            model_name='lease',
+            index=models.Index(fields=['organization'], name='tenants_lea_organiz_9f1224_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(fields=['organization'], name='tenants_ten_organiz_86b16a_idx'),
+        ),
+    ]
@@ -3,6 +3,7 @@ import os
 import uuid
 from django.conf import settings
 from properties.models import Unit
+from organizations.models import OrganizationModel
 
 def document_upload_path(instance, filename):
     """Define upload path for documents"""
@@ -10,8 +11,10 @@ def document_upload_path(instance, filename):
     filename = f"{uuid.uuid4()}.{ext}"
     return os.path.join('documents', filename)
 
-class Tenant(models.Model):
+class Tenant(OrganizationModel):
     """Model representing a tenant (no login required)"""
+    organization_source = 'unit__property__organization'
+    
     name = models.CharField(max_length=200)
     phone_number = models.CharField(max_length=15)  # Primary contact method, required
     email = models.EmailField(blank=True, null=True)  # Optional
@@ -26,8 +29,10 @@ class Tenant(models.Model):
 
 
 
-class Lease(models.Model):
+class Lease(OrganizationModel):
     """Model representing a lease agreement"""
+    organization_source = 'unit__property__organization'
+    
     unit = models.ForeignKey(Unit, on_delete=models.CASCADE, related_name='leases')
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='leases')
     start_date = models.DateField()
@@ -4,8 +4,9 @@ from .serializers import TenantSerializer, TenantDetailSerializer, LeaseSerializ
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
+from organizations.context import OrganizationContextMixin
 
-class TenantViewSet(viewsets.ModelViewSet):
+class TenantViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing Tenant instances"""
     queryset = Tenant.objects.all()
     serializer_class = TenantSerializer
@@ -28,12 +29,7 @@ class TenantViewSet(viewsets.ModelViewSet):
         # Filter by unit or property if provided
         property_id = self.request.query_params.get('property', None)
         unit_id = self.request.query_params.get('unit', None)
-        queryset = Tenant.objects.all()
-        
-        if user.organization:
-            queryset = queryset.filter(unit__property__organization=user.organization)
-        else:
-            return Tenant.objects.none()
+        queryset = Tenant.objects.for_organization(self.organization_context.organization)
         
         if property_id:
             queryset = queryset.filter(unit__property_id=property_id)
@@ -133,7 +129,7 @@ class TenantViewSet(viewsets.ModelViewSet):
         return Response(response_data, status=status.HTTP_200_OK)
     
 
-class LeaseViewSet(viewsets.ModelViewSet):
+class LeaseViewSet(OrganizationContextMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing Lease instances"""
     queryset = Lease.objects.all()
     serializer_class = LeaseSerializer
@@ -153,12 +149,7 @@ class LeaseViewSet(viewsets.ModelViewSet):
         property_id = self.request.query_params.get('property', None)
         is_active = self.request.query_params.get('active', None)
         
-        queryset = Lease.objects.all()
-        
-        if user.organization:
-            queryset = queryset.filter(unit__property__organization=user.organization)
-        else:
-            return Lease.objects.none()
+        queryset = Lease.objects.for_organization(self.organization_context.organization)
         
         if tenant_id:
             queryset = queryset.filter(tenant_id=tenant_id)
@@ -0,0 +1,109 @@
+"""
+JWT authentication that reuses cached users while their permission stamp
+is current.
+
+simplejwt's JWTAuthentication loads the user on every request, and the
+organization context then loads the organization and membership. Access
+tokens issued by users.tokens carry a permission stamp; when it still
+matches the current stamp, the user and organization context loaded for
+an earlier request are reused from a process-local cache and the request
+runs no authentication queries.
+
+The current stamp is read from the shared cache at most once per
+AUTH_USER_CACHE_TTL seconds per user. Role, customization, membership and
+user changes bump the stamp, so the next request after that window loads
+fresh data. Stamps kept in a process-local cache cannot be bumped for
+other workers, so the user cache is off unless the default cache is
+shared (see AUTH_USER_CACHE).
+"""
+import copy
+import time
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from organizations.context import OrganizationContext, resolve_organization_context
+from organizations.role_permissions import permission_stamp
+from .tokens import ORGANIZATION_CLAIM, PERMISSION_STAMP_CLAIM
+
+# Users kept per process before the cache is cleared
+AUTH_USER_CACHE_MAX_SIZE = 10000
+
+# {user_id: (trusted_until, stamp, user, organization_context)}
+_cached_users = {}
+
+
+def _ttl():
+    return getattr(settings, 'AUTH_USER_CACHE_TTL', 5)
+
+
+# Cache backends whose entries other processes cannot see
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def user_cache_enabled():
+    enabled = getattr(settings, 'AUTH_USER_CACHE', None)
+    if enabled is None:
+        return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS
+    return enabled
+
+
+def clear_cached_users():
+    _cached_users.clear()
+
+
+class OrganizationJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that trusts cached users for tokens with a current stamp"""
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is None:
+            return None
+        user, validated_token = result
+        context = getattr(user, '_token_organization_context', None)
+        if context is not None:
+            del user._token_organization_context
+            # Seed the request's organization context (see get_organization_context)
+            http_request = getattr(request, '_request', request)
+            http_request._organization_context = OrganizationContext(
+                user, context.organization, context.membership
+            )
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        stamp = validated_token.get(PERMISSION_STAMP_CLAIM)
+        if stamp is None or not user_cache_enabled():
+            # Tokens issued before stamps were added, or stamps other workers can't bump
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        now = time.monotonic()
+        entry = _cached_users.get(user_id)
+        if entry and entry[1] == stamp and entry[0] > now:
+            return self._copy(entry[2], entry[3])
+
+        current = permission_stamp(user_id, validated_token.get(ORGANIZATION_CLAIM))
+        if entry and entry[1] == stamp == current:
+            _cached_users[user_id] = (now + _ttl(), stamp, entry[2], entry[3])
+            return self._copy(entry[2], entry[3])
+
+        user = super().get_user(validated_token)
+        context = resolve_organization_context(user)
+        if stamp == current:
+            if len(_cached_users) >= AUTH_USER_CACHE_MAX_SIZE:
+                _cached_users.clear()
+            _cached_users[user_id] = (now + _ttl(), stamp, user, context)
+            return self._copy(user, context)
+        # Stale token: serve this request from fresh data without caching it
+        user._token_organization_context = context
+        return user
+
+    def _copy(self, user, context):
+        """A per-request copy so views can't mutate the cached user"""
+        user = copy.copy(user)
+        user._token_organization_context = context
+        return user
@@ -0,0 +1,96 @@
+"""
+Startup payload for the mobile app.
+
+build_bootstrap() returns everything the app needs on launch - the user,
+their organization, membership role, effective permissions, subscription
+and quota status, and the dashboard counters - in one response. It reads
+the request's organization context (seeded by OrganizationJWTAuthentication)
+and otherwise costs at most one subscription query plus the dashboard
+summary's five queries.
+
+The payload is cached per user under their permission stamp, so role,
+membership and user changes take effect immediately; subscription details
+and counters may lag by up to BOOTSTRAP_CACHE_TIMEOUT seconds.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from analytics.summaries import cached_dashboard_summary
+from organizations.context import get_organization_context
+from organizations.models import Subscription
+from organizations.quotas import get_quota_limits, get_quota_usage
+from organizations.role_permissions import permission_stamp
+from organizations.serializers import OrganizationSerializer, SubscriptionSerializer
+from .serializers import UserSerializer
+
+BOOTSTRAP_CACHE_KEY = 'users:bootstrap:{user_id}:{stamp}'
+
+
+def _cache_timeout():
+    return getattr(settings, 'BOOTSTRAP_CACHE_TIMEOUT', 60)
+
+
+def bootstrap_data(request):
+    """Build the startup payload for the requesting user"""
+    context = get_organization_context(request)
+    organization = context.organization
+    role = context.role
+    data = {
+        'user': UserSerializer(request.user, context={'request': request}).data,
+        'organization': None,
+        'membership': None,
+        'permissions': context.permissions,
+        'is_admin': context.is_admin,
+        'subscription': None,
+        'quota': None,
+        'dashboard': None,
+    }
+    if context.membership:
+        data['membership'] = {
+            'id': context.membership.pk,
+            'role_id': role.pk if role else None,
+            'role_name': role.name if role else None,
+            'role_type': context.role_type,
+        }
+    if organization is None:
+        return data
+
+    subscription = Subscription.objects.filter(organization=organization).select_related('plan').first()
+    data.update({
+        'organization': OrganizationSerializer(organization, context={'request': request}).data,
+        'subscription': {
+            'status': organization.subscription_status,
+            'plan_name': organization.plan_name,
+            'trial_enabled': organization.trial_enabled,
+            'current': SubscriptionSerializer(subscription).data if subscription else None,
+        },
+        'quota': {
+            'limits': get_quota_limits(organization.pk),
+            'usage': get_quota_usage(organization.pk),
+        },
+        'dashboard': cached_dashboard_summary(organization),
+    })
+    return data
+
+
+def build_bootstrap(request, refresh=False):
+    """
+    Return the startup payload from the per-user cache.
+
+    A BOOTSTRAP_CACHE_TIMEOUT of 0 disables caching; refresh=True rebuilds
+    and re-caches the payload.
+    """
+    timeout = _cache_timeout()
+    if not timeout:
+        return bootstrap_data(request)
+
+    context = get_organization_context(request)
+    key = BOOTSTRAP_CACHE_KEY.format(
+        user_id=request.user.pk,
+        stamp=permission_stamp(request.user.pk, context.organization_id),
+    )
+    data = None if refresh else cache.get(key)
+    if data is None:
+        data = bootstrap_data(request)
+        cache.set(key, data, timeout)
+    return data
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.contrib.contenttypes.models import ContentType
+from organizations.role_permissions import invalidate_user_permissions
 
 class User(AbstractUser):
     """Custom user model for property owners and managers"""
@@ -17,6 +18,17 @@ class User(AbstractUser):
     
     def __str__(self):
         return self.username
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Tokens stamped before this change must reload the user
+        invalidate_user_permissions(self.pk)
+    
+    def delete(self, *args, **kwargs):
+        user_id = self.pk
+        result = super().delete(*args, **kwargs)
+        invalidate_user_permissions(user_id)
+        return result
         
     def get_organization(self):
         """Get the user's organization"""
@@ -1,9 +1,14 @@
-from django.test import TestCase
+from django.test import TestCase, RequestFactory, override_settings
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
 from .models import User
-from organizations.models import Organization
+from .authentication import OrganizationJWTAuthentication, clear_cached_users
+from organizations.models import Organization, BaseRole
+from organizations.membership_models import OrganizationRole, OrganizationMembership
+from organizations.context import get_organization_context
 
 class UserModelTests(TestCase):
     def setUp(self):
@@ -91,3 +96,128 @@ class UserAPITests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['username'], 'regularuser')
         self.assertEqual(response.data['email'], 'regular@example.com')
+
+
+@override_settings(AUTH_USER_CACHE=True)
+class OrganizationTokenTestCase(TestCase):
+    """A manager with an organization membership who logs in with a JWT"""
+
+    def setUp(self):
+        cache.clear()
+        clear_cached_users()
+        self.organization = Organization.objects.create(name='Token Org', email='token@example.com')
+        base_role = BaseRole.objects.create(name='Manager', slug='manager', description='Manager',
+                                            role_type='manager')
+        self.role = OrganizationRole.objects.create(organization=self.organization, base_role=base_role)
+        self.user = User.objects.create_user(username='tokenuser', password='securepassword',
+                                             organization=self.organization)
+        self.membership = OrganizationMembership.objects.create(
+            organization=self.organization, user=self.user, role=self.role
+        )
+        self.client = APIClient()
+
+    def obtain(self):
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'username': 'tokenuser', 'password': 'securepassword'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+
+@override_settings(AUTH_USER_CACHE_TTL=0)
+class OrganizationTokenTests(OrganizationTokenTestCase):
+    """Access tokens carry organization claims and let authentication skip queries"""
+
+    def authenticate(self, access):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        user, _ = OrganizationJWTAuthentication().authenticate(request)
+        return request, user
+
+    def test_claims(self):
+        claims = AccessToken(self.obtain()['access'])
+        self.assertEqual(claims['organization_id'], self.organization.pk)
+        self.assertEqual(claims['role'], 'manager')
+        self.assertEqual(claims['role_id'], self.role.pk)
+        self.assertIn('pv', claims.payload)
+
+    def test_cached_user_skips_queries(self):
+        access = self.obtain()['access']
+        self.authenticate(access)
+
+        with self.assertNumQueries(0):
+            request, user = self.authenticate(access)
+            request.user = user
+            context = get_organization_context(request)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(context.organization, self.organization)
+            self.assertEqual(context.role_type, 'manager')
+
+    def test_membership_change_invalidates(self):
+        tokens = self.obtain()
+        self.authenticate(tokens['access'])
+
+        self.membership.is_active = False
+        self.membership.save()
+        # User, membership and the fallback organization are loaded again
+        with self.assertNumQueries(3):
+            request, user = self.authenticate(tokens['access'])
+        request.user = user
+        self.assertIsNone(get_organization_context(request).membership)
+
+        # A refreshed token carries the new stamp and is cached again
+        refreshed = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}).data['access']
+        self.assertNotEqual(AccessToken(refreshed)['pv'], AccessToken(tokens['access'])['pv'])
+        self.assertIsNone(AccessToken(refreshed)['role'])
+        self.authenticate(refreshed)
+        with self.assertNumQueries(0):
+            self.authenticate(refreshed)
+
+    @override_settings(AUTH_USER_CACHE=None)
+    def test_process_local_cache_disables_user_cache(self):
+        """Stamps in a local memory cache can't be bumped for other workers"""
+        access = self.obtain()['access']
+        self.authenticate(access)
+
+        with self.assertNumQueries(1):
+            self.authenticate(access)
+
+
+@override_settings(AUTH_USER_CACHE_TTL=60, BOOTSTRAP_CACHE_TIMEOUT=60)
+class BootstrapTests(OrganizationTokenTestCase):
+    """The startup payload comes back in one request with a fixed query budget"""
+
+    def get_bootstrap(self, access, **params):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = self.client.get(reverse('user-bootstrap'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_bootstrap_payload(self):
+        data = self.get_bootstrap(self.obtain()['access'])
+        self.assertEqual(data['user']['username'], 'tokenuser')
+        self.assertEqual(data['organization']['id'], self.organization.pk)
+        self.assertEqual(data['organization']['user_role'], self.role.name)
+        self.assertEqual(data['membership']['role_type'], 'manager')
+        self.assertIn('can_manage_properties', data['permissions'])
+        self.assertEqual(data['subscription']['status'], self.organization.subscription_status)
+        self.assertIn('usage', data['quota'])
+        self.assertEqual(data['dashboard']['property_count'], 0)
+
+    def test_bootstrap_query_budget(self):
+        access = self.obtain()['access']
+        self.get_bootstrap(access)
+
+        # Cached payload and cached token user: no queries at all
+        with self.assertNumQueries(0):
+            self.get_bootstrap(access)
+        # Rebuilding costs the subscription plus the dashboard summary
+        with self.assertNumQueries(6):
+            self.get_bootstrap(access, refresh='true')
+
+    def test_bootstrap_without_organization(self):
+        user = User.objects.create_user(username='loner', password='securepassword')
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse('user-bootstrap'))
+        self.assertIsNone(response.data['organization'])
+        self.assertIsNone(response.data['membership'])
+        self.assertFalse(any(response.data['permissions'].values()))
@@ -0,0 +1,65 @@
+"""
+JWT tokens carrying the user's organization, role and permission stamp.
+
+Access tokens embed:
+
+* organization_id - the organization the user acts in
+* role / role_id - the role type and OrganizationRole of their membership
+* pv - the permission stamp (see organizations.role_permissions.permission_stamp)
+
+OrganizationJWTAuthentication uses the stamp to decide whether a cached
+user and organization context are still valid. Claims are recomputed
+whenever an access token is issued, so refreshing picks up changes.
+"""
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from organizations.context import resolve_organization_context
+from organizations.role_permissions import permission_stamp
+
+ORGANIZATION_CLAIM = 'organization_id'
+ROLE_CLAIM = 'role'
+ROLE_ID_CLAIM = 'role_id'
+PERMISSION_STAMP_CLAIM = 'pv'
+
+
+def organization_claims(user):
+    """Claims describing the user's organization, role and permission stamp"""
+    context = resolve_organization_context(user)
+    role = context.role
+    return {
+        ORGANIZATION_CLAIM: context.organization_id,
+        ROLE_CLAIM: context.role_type,
+        ROLE_ID_CLAIM: role.pk if role else None,
+        PERMISSION_STAMP_CLAIM: permission_stamp(user.pk, context.organization_id),
+    }
+
+
+class OrganizationAccessToken(AccessToken):
+    """Access token with organization, role and permission stamp claims"""
+
+
+class OrganizationRefreshToken(RefreshToken):
+    """Refresh token issuing OrganizationAccessTokens with current claims"""
+    access_token_class = OrganizationAccessToken
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user = get_user_model().objects.filter(
+            **{api_settings.USER_ID_FIELD: self[api_settings.USER_ID_CLAIM]}
+        ).first()
+        if user is not None:
+            for claim, value in organization_claims(user).items():
+                access[claim] = value
+        return access
+
+
+class OrganizationTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = OrganizationRefreshToken
+
+
+class OrganizationTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = OrganizationRefreshToken
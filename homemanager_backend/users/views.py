@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from .serializers import UserSerializer, UserCreateSerializer
+from .bootstrap import build_bootstrap
 
 User = get_user_model()
 
@@ -48,6 +49,16 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response({'results': [serializer.data]})
         return Response({'results': []})
     
+    @action(detail=False, methods=['get'])
+    def bootstrap(self, request):
+        """
+        Everything the mobile app loads on startup in one response: user,
+        organization, role, permissions, subscription, quota and dashboard
+        counters. Cached per user; ?refresh=true rebuilds it.
+        """
+        refresh = request.query_params.get('refresh', '').lower() == 'true'
+        return Response(build_bootstrap(request, refresh=refresh))
+    
     @action(detail=True, methods=['post'])
     def set_password(self, request, pk=None):
         """Change a user's password"""